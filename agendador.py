@@ -0,0 +1,155 @@
+"""Agendador compartilhado de chamadas a APIs externas (Document AI, OpenAI).
+
+Para cada backend: balde de tokens (limite de requisições por minuto), teto de chamadas
+simultâneas e novas tentativas com backoff exponencial e jitter para erros transitórios
+(cota, 429, 503, timeout). Expõe métricas de fila e de espera por limitação.
+"""
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class BaldeTokens:
+    """Token bucket: `taxa` tokens por segundo, acumulando no máximo `capacidade`."""
+
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade)
+        self._tokens = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> float:
+        """Bloqueia até haver um token; retorna quanto tempo esperou (segundos)."""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return esperado
+                falta = (1 - self._tokens) / self.taxa
+            time.sleep(falta)
+            esperado += falta
+
+
+@dataclass
+class ConfigBackend:
+    requisicoes_por_minuto: float = 60
+    rajada: int = 5
+    max_concorrentes: int = 4
+    tentativas: int = 5
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+    erros_retentaveis: tuple[type[BaseException], ...] = ()
+
+
+@dataclass
+class MetricasBackend:
+    chamadas: int = 0
+    sucessos: int = 0
+    falhas: int = 0
+    retentativas: int = 0
+    espera_limite_s: float = 0.0
+    espera_backoff_s: float = 0.0
+    fila: int = 0
+    fila_max: int = 0
+    em_execucao: int = 0
+    ultimo_erro: str = ""
+
+
+@dataclass
+class _Backend:
+    config: ConfigBackend
+    balde: BaldeTokens
+    semaforo: threading.BoundedSemaphore
+    metricas: MetricasBackend = field(default_factory=MetricasBackend)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class Agendador:
+    def __init__(self):
+        self._backends: dict[str, _Backend] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome: str, config: ConfigBackend):
+        with self._lock:
+            self._backends[nome] = _Backend(
+                config=config,
+                balde=BaldeTokens(config.requisicoes_por_minuto / 60.0, max(1, config.rajada)),
+                semaforo=threading.BoundedSemaphore(max(1, config.max_concorrentes)),
+            )
+
+    def _backend(self, nome: str) -> _Backend:
+        with self._lock:
+            if nome not in self._backends:
+                raise KeyError(f"Backend não registrado no agendador: {nome}")
+            return self._backends[nome]
+
+    def atraso_backoff(self, config: ConfigBackend, tentativa: int) -> float:
+        """Backoff exponencial com "full jitter": uniforme em [0, min(max, base * 2^tentativa)]."""
+        return random.uniform(0, min(config.backoff_max, config.backoff_base * (2 ** tentativa)))
+
+    def executar(self, nome: str, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        """Executa `funcao` respeitando limites do backend e refazendo-a em erros transitórios."""
+        b = self._backend(nome)
+        m = b.metricas
+        for tentativa in range(b.config.tentativas):
+            with b.lock:
+                m.fila += 1
+                m.fila_max = max(m.fila_max, m.fila)
+            b.semaforo.acquire()
+            try:
+                try:
+                    espera = b.balde.adquirir()
+                finally:
+                    with b.lock:
+                        m.fila -= 1
+                with b.lock:
+                    m.chamadas += 1
+                    m.em_execucao += 1
+                    m.espera_limite_s += espera
+                try:
+                    resultado = funcao(*args, **kwargs)
+                finally:
+                    with b.lock:
+                        m.em_execucao -= 1
+            except b.config.erros_retentaveis as e:
+                ultima = tentativa == b.config.tentativas - 1
+                atraso = 0.0 if ultima else self.atraso_backoff(b.config, tentativa)
+                with b.lock:
+                    m.ultimo_erro = f"{type(e).__name__}: {e}"
+                    if ultima:
+                        m.falhas += 1
+                    else:
+                        m.retentativas += 1
+                        m.espera_backoff_s += atraso
+                if ultima:
+                    raise
+            except Exception as e:
+                with b.lock:
+                    m.falhas += 1
+                    m.ultimo_erro = f"{type(e).__name__}: {e}"
+                raise
+            else:
+                with b.lock:
+                    m.sucessos += 1
+                return resultado
+            finally:
+                b.semaforo.release()
+            # o backoff acontece fora do semáforo, liberando a vaga para outras chamadas
+            time.sleep(atraso)
+
+    def metricas(self) -> dict[str, dict]:
+        with self._lock:
+            backends = dict(self._backends)
+        saida = {}
+        for nome, b in backends.items():
+            with b.lock:
+                saida[nome] = dict(vars(b.metricas))
+        return saida
@@ -0,0 +1,115 @@
+"""Armazenamento compacto das tabelas de uma sessão da interface.
+
+As tabelas guardadas entre as páginas (extraídas, unificadas, categorizadas, conciliadas) ficam
+em forma colunar: texto em `string[pyarrow]` (um buffer UTF-8 contíguo por coluna, em vez de um
+objeto Python por célula), colunas repetitivas (`descricao`, `unidade`, `categoria_catalogo`)
+como `category` e valores monetários como float64. `obter` devolve a própria tabela
+guardada, sem cópia: as etapas seguintes leem os mesmos buffers e criam colunas novas em
+cópias rasas.
+"""
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_object_dtype, is_string_dtype
+
+from moeda import converter_moeda_serie
+
+COLUNAS_CATEGORICAS = {"descricao", "unidade", "categoria_catalogo"}
+
+TEXTO_ARROW = pd.StringDtype("pyarrow")
+
+
+def _monetaria(coluna: str) -> bool:
+    return coluna.startswith(("valor_", "total_"))
+
+
+def compactar(df: pd.DataFrame, bruta: bool = False) -> pd.DataFrame:
+    """Versão compacta de `df` (colunas já compactas são mantidas como estão).
+
+    `bruta=True` (tabelas recém-extraídas, ainda sem nomes de coluna padronizados) só converte texto
+    para Arrow, sem categorias nem conversão monetária.
+    """
+    novas = {}
+    for col in df.columns:
+        serie = df[col]
+        nome = str(col)
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if not bruta and nome in COLUNAS_CATEGORICAS and (is_object_dtype(serie) or is_string_dtype(serie)):
+            novas[col] = serie.astype("category")
+        elif not bruta and _monetaria(nome) and not is_numeric_dtype(serie):
+            novas[col] = converter_moeda_serie(serie)
+        elif serie.dtype != TEXTO_ARROW and is_object_dtype(serie) and pd.api.types.infer_dtype(serie, skipna=True) in ("string", "empty"):
+            novas[col] = serie.astype(TEXTO_ARROW)
+    if not novas:
+        return df
+    compacta = df.copy(deep=False)
+    for col, serie in novas.items():
+        compacta[col] = serie
+    return compacta
+
+
+def _compactar_valor(valor):
+    if isinstance(valor, pd.DataFrame):
+        return compactar(valor)
+    if isinstance(valor, list):
+        # tabelas_extraidas: [{"tipo", "tabela", ...}]
+        return [
+            {**item, "tabela": compactar(item["tabela"], bruta=True)}
+            if isinstance(item, dict) and isinstance(item.get("tabela"), pd.DataFrame) else item
+            for item in valor
+        ]
+    return valor
+
+
+def _bytes(valor) -> int:
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, list):
+        return sum(_bytes(item.get("tabela")) for item in valor if isinstance(item, dict))
+    return 0
+
+
+def _linhas(valor) -> int:
+    if isinstance(valor, pd.DataFrame):
+        return len(valor)
+    if isinstance(valor, list):
+        return sum(len(item["tabela"]) for item in valor if isinstance(item, dict) and isinstance(item.get("tabela"), pd.DataFrame))
+    return 0
+
+
+class ArmazemSessao:
+    """Tabelas de uma sessão por nome, guardadas compactadas."""
+
+    def __init__(self):
+        self._tabelas: dict[str, object] = {}
+
+    def guardar(self, nome: str, valor):
+        """Guarda a versão compacta de um DataFrame (ou da lista de tabelas extraídas) e a devolve."""
+        compacto = _compactar_valor(valor)
+        self._tabelas[nome] = compacto
+        return compacto
+
+    def obter(self, nome: str, padrao=None):
+        return self._tabelas.get(nome, padrao)
+
+    def remover(self, nome: str):
+        self._tabelas.pop(nome, None)
+
+    def __contains__(self, nome: str) -> bool:
+        return nome in self._tabelas
+
+    def memoria(self) -> list[dict]:
+        """Linhas e bytes por tabela; a mesma tabela guardada sob dois nomes é contada uma vez."""
+        vistos = set()
+        relatorio = []
+        for nome, valor in self._tabelas.items():
+            repetida = id(valor) in vistos
+            vistos.add(id(valor))
+            relatorio.append({
+                "tabela": nome,
+                "linhas": _linhas(valor),
+                "bytes": 0 if repetida else _bytes(valor),
+            })
+        return relatorio
+
+    def total_bytes(self) -> int:
+        return sum(item["bytes"] for item in self.memoria())
@@ -0,0 +1,22 @@
+"""Impressões digitais (hashes de conteúdo) para invalidar caches derivados de DataFrames."""
+import hashlib
+
+import pandas as pd
+
+
+def assinatura_dataframe(df: pd.DataFrame | None) -> str:
+    """Hash estável do conteúdo, colunas e dtypes de um DataFrame (vazio/None -> "vazio")."""
+    if df is None:
+        return "vazio"
+    h = hashlib.sha1()
+    h.update(repr(list(df.columns)).encode("utf-8"))
+    h.update(repr([str(t) for t in df.dtypes]).encode("utf-8"))
+    h.update(str(df.shape).encode("utf-8"))
+    if len(df):
+        try:
+            valores = pd.util.hash_pandas_object(df, index=True).to_numpy()
+        except TypeError:
+            # células não "hasheáveis" (listas, dicts): recorre à representação textual
+            valores = pd.util.hash_pandas_object(df.astype(str), index=True).to_numpy()
+        h.update(valores.tobytes())
+    return h.hexdigest()
@@ -0,0 +1,66 @@
+"""Benchmark: `Series.apply(limpar_moeda)` x `converter_moeda_serie` nas colunas monetárias.
+
+Uso:
+    python benchmarks/bench_moeda.py --linhas 100000 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from moeda import converter_moeda_serie, limpar_moeda  # noqa: E402
+
+
+def gerar_serie(n: int, seed: int = 0) -> pd.Series:
+    """Mistura de formatos encontrados nos boletins: "R$ 1.672,00", "1672.00", "1.337,6", negativos e vazios."""
+    rng = np.random.default_rng(seed)
+    valores = rng.uniform(-5_000, 250_000, n).round(2)
+    formato = rng.integers(0, 6, n)
+    saida = np.empty(n, dtype=object)
+    for f, fmt in enumerate([
+        lambda v: f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+        lambda v: f"{v:.2f}",
+        lambda v: f"{v:,.1f}".replace(",", "X").replace(".", ",").replace("X", "."),
+        lambda v: f"-{abs(v):.2f}",
+        lambda v: "",
+        lambda v: None,
+    ]):
+        idx = np.flatnonzero(formato == f)
+        saida[idx] = [fmt(v) for v in valores[idx]]
+    return pd.Series(saida)
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} {'apply (s)':>10} {'vetorizado (s)':>15} {'ganho':>7}")
+    for n in args.linhas:
+        serie = gerar_serie(n)
+        esperado = serie.apply(limpar_moeda).astype("float64")
+        obtido = converter_moeda_serie(serie)
+        pd.testing.assert_series_equal(esperado, obtido, check_names=False)
+
+        t_apply = cronometrar(lambda: serie.apply(limpar_moeda), args.repeticoes)
+        t_vet = cronometrar(lambda: converter_moeda_serie(serie), args.repeticoes)
+        print(f"{n:>10} {t_apply:>10.3f} {t_vet:>15.3f} {t_apply / t_vet:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Benchmark por estágio do processamento, com dados sintéticos e APIs falsas (sem rede).
+
+Estágios por linhas: normalizacao, conciliacao, historico, agentes, exportacao_xlsx, exportacao_parquet, exportacao_csv.
+Estágios por páginas: fatiamento, deteccao, texto_nativo, documentai, ocr (este só com o Tesseract instalado).
+
+Uso:
+    python benchmarks/bench_pipeline.py                      # todos os estágios, 100..1M linhas e 1..500 páginas
+    python benchmarks/bench_pipeline.py --rapido             # tamanhos pequenos, para conferir rapidamente
+    python benchmarks/bench_pipeline.py --estagios conciliacao --linhas 100000 1000000
+    python benchmarks/bench_pipeline.py --comparar benchmarks/resultados/base.json
+
+Cada execução grava um JSON (ambiente, parâmetros e uma medição por estágio/tamanho) em
+benchmarks/resultados/; com `--comparar`, as medições são confrontadas com as de um JSON
+anterior e o código de saída é 1 se algum estágio ficou mais lento que a tolerância.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # noqa: E402
+from deteccao_paginas import detectar_paginas  # noqa: E402
+from exportacao import gravar_csv, gravar_excel, gravar_parquet  # noqa: E402
+from falsos import DocumentAIFalso, OpenAIFalsa  # noqa: E402
+from flags_conciliacao import mascara_flags  # noqa: E402
+from historico_cobrancas import HistoricoCobrancas  # noqa: E402
+from processamento import (  # noqa: E402
+    Recursos,
+    conciliar,
+    estruturar_boletim_conciliado,
+    extrair_paginas_pdf,
+    normalizar_colunas,
+    processar_documento,
+    processar_documento_ocr_fallback,
+)
+from sinteticos import gerar_boletim, gerar_contrato, gerar_pdf_boletim  # noqa: E402
+
+ESTAGIOS_LINHAS = ["normalizacao", "conciliacao", "historico", "agentes", "exportacao_xlsx", "exportacao_parquet", "exportacao_csv"]
+ESTAGIOS_PAGINAS = ["fatiamento", "deteccao", "texto_nativo", "documentai", "ocr"]
+DIRETORIO_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+
+class RecursosBenchmark(Recursos):
+    """Recursos com o Document AI falso e caches em diretório temporário."""
+
+    def __init__(self, diretorio: str, documentai: DocumentAIFalso):
+        super().__init__({
+            "google": {"project_id": "benchmark", "location": "us"},
+            "limites": {
+                "documentai": {"requisicoes_por_minuto": 1e6, "rajada": 1000, "max_concorrentes": 64},
+                "openai": {"requisicoes_por_minuto": 1e6, "rajada": 1000, "max_concorrentes": 64},
+            },
+            "cache": {"diretorio": os.path.join(diretorio, "extracoes")},
+            "cache_llm": {
+                "caminho": os.path.join(diretorio, "llm.sqlite3"),
+                "agentes_sem_cache": ["normalizador", "catalogador", "validador"],
+            },
+            "catalogo": {"dicionario": os.path.join(diretorio, "categorias.json")},
+            "openai": {"model": "benchmark"},
+        })
+        self._documentai = documentai
+
+    @property
+    def provedor_documentai(self):
+        return self._documentai
+
+
+def cronometrar(funcao, repeticoes: int, preparar=lambda: None) -> float:
+    """Melhor tempo de `funcao(preparar())`; a preparação fica fora da medição."""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        entrada = preparar()
+        inicio = time.perf_counter()
+        funcao(entrada)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+# =========================
+# DADOS (gerados uma vez por tamanho)
+# =========================
+
+@lru_cache(maxsize=None)
+def contrato(itens: int) -> pd.DataFrame:
+    return gerar_contrato(itens)
+
+
+@lru_cache(maxsize=2)
+def boletim_cru(linhas: int, itens_contrato: int) -> pd.DataFrame:
+    return gerar_boletim(linhas, contrato(itens_contrato))
+
+
+@lru_cache(maxsize=2)
+def boletim_normalizado(linhas: int, itens_contrato: int) -> pd.DataFrame:
+    return normalizar_colunas(boletim_cru(linhas, itens_contrato))
+
+
+@lru_cache(maxsize=2)
+def boletim_conciliado(linhas: int, itens_contrato: int) -> pd.DataFrame:
+    return estruturar_boletim_conciliado(boletim_normalizado(linhas, itens_contrato), contrato(itens_contrato))
+
+
+@lru_cache(maxsize=2)
+def pdf(paginas: int, digitalizado: bool) -> bytes:
+    return gerar_pdf_boletim(paginas, digitalizado=digitalizado)
+
+
+# =========================
+# ESTÁGIOS
+# =========================
+
+def medir_linhas(estagio: str, n: int, args, tmp: str) -> dict:
+    itens = args.itens_contrato
+    if estagio == "normalizacao":
+        cru = boletim_cru(n, itens)
+        return {"segundos": cronometrar(lambda _: normalizar_colunas(cru), args.repeticoes)}
+
+    if estagio == "conciliacao":
+        df_norm, df_contrato = boletim_normalizado(n, itens), contrato(itens)
+        resultado = {}
+
+        def conciliar_uma_vez(_):
+            resultado["df"] = estruturar_boletim_conciliado(df_norm, df_contrato)
+
+        segundos = cronometrar(conciliar_uma_vez, args.repeticoes)
+        sem_corresp = mascara_flags(resultado["df"], ["flag_sem_correspondencia_contrato"]).mean()
+        return {"segundos": segundos, "itens_contrato": itens, "fracao_sem_correspondencia": round(float(sem_corresp), 4)}
+
+    if estagio == "historico":
+        # histórico com o boletim já registrado; mede a verificação do mesmo boletim com outro id (todas as linhas repetidas)
+        df = boletim_conciliado(n, itens)
+        historico = HistoricoCobrancas(os.path.join(tempfile.mkdtemp(dir=tmp), "historico.sqlite3"))
+        inicio = time.perf_counter()
+        registradas = historico.registrar(df, "BM-ANTERIOR", "2024-01")
+        registro_s = time.perf_counter() - inicio
+        resultado = {}
+
+        def verificar(_):
+            resultado["df"] = historico.verificar(df, "BM-ATUAL", "2024-01")
+
+        segundos = cronometrar(verificar, args.repeticoes)
+        repetidas = int(resultado["df"]["boletim_duplicado"].notna().sum())
+        return {"segundos": segundos, "registro_s": round(registro_s, 4), "linhas_historico": registradas, "repetidas": repetidas}
+
+    if estagio == "agentes":
+        if n > args.max_linhas_agentes:
+            return {"pulado": f"acima de --max-linhas-agentes ({args.max_linhas_agentes})"}
+        df_norm, df_contrato = boletim_normalizado(n, itens), contrato(itens)
+        openai_falsa = OpenAIFalsa(args.latencia_openai, args.latencia_token_openai)
+
+        def preparar():
+            # dicionário de categorias vazio a cada repetição: todas as descrições vão ao LLM
+            return RecursosBenchmark(tempfile.mkdtemp(dir=tmp), DocumentAIFalso())
+
+        segundos = cronometrar(lambda rec: conciliar(rec, df_norm, df_contrato, openai_client=openai_falsa), args.repeticoes, preparar)
+        return {"segundos": segundos, "chamadas_llm": openai_falsa.chamadas // args.repeticoes, "latencia_openai": args.latencia_openai}
+
+    if estagio == "exportacao_xlsx":
+        df = boletim_conciliado(n, itens)
+        destino = os.path.join(tmp, "bench.xlsx")
+        segundos = cronometrar(lambda _: gravar_excel(df, destino), args.repeticoes)
+        return {"segundos": segundos, "bytes": os.path.getsize(destino)}
+
+    if estagio == "exportacao_parquet":
+        df = boletim_conciliado(n, itens)
+        destino = os.path.join(tmp, "bench.parquet")
+        segundos = cronometrar(lambda _: gravar_parquet(df, destino), args.repeticoes)
+        return {"segundos": segundos, "bytes": os.path.getsize(destino)}
+
+    if estagio == "exportacao_csv":
+        df = boletim_conciliado(n, itens)
+        destino = os.path.join(tmp, "bench.csv")
+        segundos = cronometrar(lambda _: gravar_csv(df, destino), args.repeticoes)
+        return {"segundos": segundos, "bytes": os.path.getsize(destino)}
+
+    raise ValueError(estagio)
+
+
+def medir_paginas(estagio: str, n: int, args, tmp: str) -> dict:
+    if estagio == "fatiamento":
+        # documento inteiro não é recortado; mede o recorte sem a primeira página (ou da única página)
+        dados = pdf(n, False)
+        inicio = 2 if n > 1 else 1
+        return {"segundos": cronometrar(lambda _: extrair_paginas_pdf(dados, inicio, n), args.repeticoes), "bytes_pdf": len(dados)}
+
+    if estagio == "deteccao":
+        # só camada de texto: o OCR rápido das páginas digitalizadas é medido no estágio "ocr"
+        dados = pdf(n, False)
+
+        def detectar(_):
+            with fitz.open(stream=dados, filetype="pdf") as doc:
+                return detectar_paginas(doc, ocr=False)
+        return {"segundos": cronometrar(detectar, args.repeticoes), "paginas_sugeridas": detectar(None).selecionadas}
+
+    if estagio == "texto_nativo":
+        dados = pdf(n, False)
+        recursos = RecursosBenchmark(tmp, DocumentAIFalso())
+        resultado = {}
+
+        def extrair(_):
+            resultado["itens"] = processar_documento(recursos, dados, "benchmark", "bench.pdf")
+
+        segundos = cronometrar(extrair, args.repeticoes)
+        linhas = sum(len(i["tabela"]) for i in resultado["itens"])
+        return {"segundos": segundos, "linhas_extraidas": linhas}
+
+    if estagio == "documentai":
+        dados = pdf(n, True)
+        falso = DocumentAIFalso(args.latencia_documentai, args.latencia_pagina_documentai)
+
+        def preparar():
+            # cache de extração novo a cada repetição: sempre passa pelo Document AI
+            return RecursosBenchmark(tempfile.mkdtemp(dir=tmp), falso)
+
+        segundos = cronometrar(lambda rec: processar_documento(rec, dados, "benchmark", "bench.pdf"), args.repeticoes, preparar)
+        return {
+            "segundos": segundos,
+            "latencia_documentai": args.latencia_documentai,
+            "latencia_pagina_documentai": args.latencia_pagina_documentai,
+        }
+
+    if estagio == "ocr":
+        if shutil.which("tesseract") is None:
+            return {"pulado": "tesseract não encontrado no PATH"}
+        dados = pdf(n, True)
+        recursos = RecursosBenchmark(tmp, DocumentAIFalso())
+        return {"segundos": cronometrar(lambda _: processar_documento_ocr_fallback(recursos, dados, "bench.pdf"), args.repeticoes)}
+
+    raise ValueError(estagio)
+
+
+# =========================
+# RESULTADOS
+# =========================
+
+def ambiente() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pymupdf": fitz.VersionBind,
+        "commit": commit,
+    }
+
+
+def comparar(atual: list[dict], base_json: Path, tolerancia: float) -> bool:
+    """Imprime atual x base por (estágio, tamanho); True se houve regressão acima da tolerância."""
+    base = {
+        (m["estagio"], m["tamanho"]): m["segundos"]
+        for m in json.loads(base_json.read_text(encoding="utf-8"))["medicoes"]
+        if "segundos" in m
+    }
+    regressao = False
+    print(f"\n{'estágio':<20} {'tamanho':>9} {'base (s)':>10} {'atual (s)':>10} {'razão':>7}")
+    for m in atual:
+        chave = (m["estagio"], m["tamanho"])
+        if "segundos" not in m or chave not in base:
+            continue
+        razao = m["segundos"] / base[chave] if base[chave] else float("inf")
+        marca = ""
+        if razao > 1 + tolerancia:
+            marca, regressao = "  <- regressão", True
+        print(f"{m['estagio']:<20} {m['tamanho']:>9} {base[chave]:>10.3f} {m['segundos']:>10.3f} {razao:>6.2f}x{marca}")
+    return regressao
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estagios", nargs="+", choices=ESTAGIOS_LINHAS + ESTAGIOS_PAGINAS, default=ESTAGIOS_LINHAS + ESTAGIOS_PAGINAS)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--itens-contrato", type=int, default=2_000)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--max-linhas-agentes", type=int, default=100_000, help="o normalizador faz ~1 chamada a cada 20 linhas")
+    parser.add_argument("--latencia-documentai", type=float, default=0.5, help="segundos por chamada")
+    parser.add_argument("--latencia-pagina-documentai", type=float, default=0.05, help="segundos por página")
+    parser.add_argument("--latencia-openai", type=float, default=0.3, help="segundos por chamada")
+    parser.add_argument("--latencia-token-openai", type=float, default=0.0005, help="segundos por token de resposta")
+    parser.add_argument("--rapido", action="store_true", help="100/1.000 linhas, 1/10 páginas e latências de 10 ms")
+    parser.add_argument("--saida", type=Path, help="JSON de resultados (padrão: benchmarks/resultados/<data>.json)")
+    parser.add_argument("--comparar", type=Path, help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora relativa aceita em --comparar")
+    args = parser.parse_args()
+    if args.rapido:
+        args.linhas, args.paginas = [100, 1_000], [1, 10]
+        args.latencia_documentai = args.latencia_openai = 0.01
+        args.latencia_pagina_documentai = args.latencia_token_openai = 0.0
+
+    medicoes = []
+    with tempfile.TemporaryDirectory(prefix="bench_medicoes_") as tmp:
+        for estagio in args.estagios:
+            por_linhas = estagio in ESTAGIOS_LINHAS
+            for n in (args.linhas if por_linhas else args.paginas):
+                medicao = (medir_linhas if por_linhas else medir_paginas)(estagio, n, args, tmp)
+                medicao = {"estagio": estagio, "tamanho": n, "unidade": "linhas" if por_linhas else "paginas", **medicao}
+                if "segundos" in medicao:
+                    medicao["por_segundo"] = n / medicao["segundos"] if medicao["segundos"] else None
+                    print(f"{estagio:<20} {n:>9} {medicao['unidade']:<8} {medicao['segundos']:>9.3f}s")
+                else:
+                    print(f"{estagio:<20} {n:>9} {medicao['unidade']:<8} pulado: {medicao['pulado']}")
+                medicoes.append(medicao)
+
+    saida = args.saida or DIRETORIO_RESULTADOS / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    parametros = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}
+    saida.write_text(
+        json.dumps({"gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"), "ambiente": ambiente(), "parametros": parametros, "medicoes": medicoes},
+                   ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    print(f"\nResultados gravados em {saida}")
+
+    if args.comparar:
+        return 1 if comparar(medicoes, args.comparar, args.tolerancia) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
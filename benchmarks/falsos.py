@@ -0,0 +1,87 @@
+"""Substitutos locais do Document AI e da OpenAI para os benchmarks, com latência configurável.
+
+Nenhum dos dois acessa a rede: o Document AI falso devolve, para cada página recebida, linhas
+de boletim sintéticas como texto plano; a OpenAI falsa reconhece o agente pelo prompt e responde
+no formato que ele espera (JSON de linhas, lista de categorias ou resumo em texto).
+"""
+import io
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import fitz
+import pandas as pd
+
+from sinteticos import gerar_boletim, linhas_texto
+
+CATEGORIAS_FALSAS = ["PROFISSIONAL", "EQUIPAMENTO", "MOB/DESMOB", "INSUMO", "OUTROS"]
+
+
+class DocumentAIFalso:
+    """Mesma interface de `ProvedorDocumentAI` usada pela extração (`process_document`, `estatisticas`).
+
+    Latência por chamada = `latencia_base` + `latencia_pagina` x páginas do PDF recebido.
+    """
+
+    def __init__(self, latencia_base: float = 0.5, latencia_pagina: float = 0.05, linhas_por_pagina: int = 40):
+        self.latencia_base = latencia_base
+        self.latencia_pagina = latencia_pagina
+        self.linhas_por_pagina = linhas_por_pagina
+        self.chamadas = 0
+        self.paginas = 0
+        self._lock = threading.Lock()
+
+    def process_document(self, request: dict):
+        with fitz.open(stream=request["raw_document"]["content"], filetype="pdf") as doc:
+            paginas = len(doc)
+        with self._lock:
+            self.chamadas += 1
+            self.paginas += paginas
+        time.sleep(self.latencia_base + self.latencia_pagina * paginas)
+        texto = "\n".join(linhas_texto(gerar_boletim(paginas * self.linhas_por_pagina, seed=paginas)))
+        return SimpleNamespace(document=SimpleNamespace(entities=[], text_styles=[], text=texto))
+
+    def estatisticas(self) -> dict:
+        return {"canais_criados": 1, "canais_reciclados": 0, "tokens_emitidos": 1, "chamadas": self.chamadas, "paginas": self.paginas}
+
+
+def _resposta(conteudo: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message={"role": "assistant", "content": conteudo})])
+
+
+class OpenAIFalsa:
+    """Imita o módulo `openai` (0.28): `cliente.ChatCompletion.create(model=..., messages=[...])`.
+
+    Latência por chamada = `latencia_base` + `latencia_token` x tokens estimados da resposta.
+    """
+
+    def __init__(self, latencia_base: float = 0.3, latencia_token: float = 0.0005):
+        self.latencia_base = latencia_base
+        self.latencia_token = latencia_token
+        self.chamadas = 0
+        self._lock = threading.Lock()
+        self.ChatCompletion = SimpleNamespace(create=self.create)
+
+    def create(self, model: str, messages: list[dict], **_params):
+        with self._lock:
+            self.chamadas += 1
+        prompt = messages[-1]["content"]
+        if "agente NORMALIZADOR" in prompt:
+            conteudo = self._normalizar(prompt)
+        elif "agente CATALOGADOR" in prompt:
+            linhas = [l for l in prompt.splitlines() if l.startswith("- ")]
+            ciclo = itertools.cycle(CATEGORIAS_FALSAS)
+            conteudo = json.dumps([next(ciclo) for _ in linhas])
+        else:
+            conteudo = "- Nenhuma redflag relevante (resposta sintética de benchmark)."
+        time.sleep(self.latencia_base + self.latencia_token * (len(conteudo) // 4))
+        return _resposta(conteudo)
+
+    @staticmethod
+    def _normalizar(prompt: str) -> str:
+        """Devolve a própria tabela do prompt como lista de registros JSON."""
+        csv = prompt.split("Tabela extraída (CSV ;):\n", 1)[-1]
+        df = pd.read_csv(io.StringIO(csv), sep=";", dtype=str, keep_default_na=False)
+        return df.to_json(orient="records", force_ascii=False)
@@ -0,0 +1,144 @@
+"""Gerador de dados sintéticos para os benchmarks: tabelas de boletim e de contrato e PDFs de boletim.
+
+As descrições vêm de um vocabulário fixo (profissionais, equipamentos, mobilização), os valores
+em formatos brasileiros variados, e uma fração das linhas do boletim tem a descrição levemente
+alterada para exercitar a correspondência aproximada com o contrato.
+"""
+import numpy as np
+import pandas as pd
+import fitz
+
+FUNCOES = [
+    "OPERADOR TÉCNICO", "SUPERVISOR", "SOLDADOR", "ELETRICISTA", "ENGENHEIRO", "AJUDANTE", "MOTORISTA",
+    "MECÂNICO", "INSPETOR", "ENCARREGADO", "GUINDASTE", "CAMINHÃO MUNCK", "COMPRESSOR", "GERADOR",
+    "BOMBA", "ANDAIME", "EMPILHADEIRA", "RETROESCAVADEIRA",
+]
+REFERENCIAS = ["PROFISSIONAL", "LOCAÇÃO DE EQUIPAMENTOS", "MOB/DESMOB", "INSUMO"]
+UNIDADES = ["DIÁRIA", "HORA", "MÊS", "EVENTO"]
+
+# Colunas na ordem em que aparecem nos boletins (mesma ordem do mapeamento best-effort da normalização)
+COLUNAS_BOLETIM = [
+    "descricao", "descricao_completa", "unidade",
+    "qtd_standby", "qtd_operacional", "qtd_dobra", "qtd_total",
+    "valor_unitario_standby", "valor_unitario_operacional", "valor_unitario_dobra",
+    "total_standby", "total_operacional", "total_dobra", "total_he", "total_cobrado",
+]
+
+
+def formatar_brl(valores: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Mistura "R$ 1.672,00", "1672.00" e "1.672,0" (e alguns vazios), como nos PDFs reais."""
+    saida = np.empty(len(valores), dtype=object)
+    formato = rng.integers(0, 10, len(valores))
+    for i, (v, f) in enumerate(zip(valores, formato)):
+        if f < 5:
+            saida[i] = "R$ " + f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        elif f < 8:
+            saida[i] = f"{v:.2f}"
+        elif f < 9:
+            saida[i] = f"{v:,.1f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        else:
+            saida[i] = ""
+    return saida
+
+
+def gerar_contrato(itens: int, seed: int = 0) -> pd.DataFrame:
+    """Tabela de preços já normalizada (descricao, descricao_completa, unidade, valor_unitario, valor_standby).
+
+    As chaves de conciliação (descricao_completa + unidade) são únicas.
+    """
+    rng = np.random.default_rng(seed)
+    funcoes = rng.choice(FUNCOES, itens)
+    valor = rng.uniform(80, 5_000, itens).round(2)
+    return pd.DataFrame({
+        "descricao": rng.choice(REFERENCIAS, itens),
+        "descricao_completa": [f"DIÁRIA DE {f} ITEM {i + 1}" for i, f in enumerate(funcoes)],
+        "unidade": rng.choice(UNIDADES, itens),
+        "valor_unitario": valor,
+        "valor_standby": (valor * 0.8).round(2),
+    })
+
+
+def gerar_boletim(linhas: int, contrato: pd.DataFrame | None = None, seed: int = 0, fracao_alterada: float = 0.1) -> pd.DataFrame:
+    """Boletim "cru" (tudo texto, como sai da extração) com `linhas` linhas.
+
+    Com `contrato`, as descrições são sorteadas dele (as chaves casam) e `fracao_alterada` delas
+    recebe um erro de digitação; sem contrato, vêm do vocabulário.
+    """
+    rng = np.random.default_rng(seed)
+    if contrato is not None and len(contrato):
+        origem = rng.integers(0, len(contrato), linhas)
+        # no boletim, a descrição do item fica em `descricao` (é ela que forma a chave de conciliação)
+        descricao = contrato["descricao_completa"].to_numpy()[origem].astype(object)
+        completa = np.array([f"{d} - MEDIÇÃO {m:02d}" for d, m in zip(descricao, rng.integers(1, 13, linhas))], dtype=object)
+        unidade = contrato["unidade"].to_numpy()[origem].astype(object)
+        alterar = np.flatnonzero(rng.random(linhas) < fracao_alterada)
+        descricao[alterar] = [d[:-2] + "X" + d[-1] if len(d) > 3 else d for d in descricao[alterar]]
+    else:
+        descricao = rng.choice(REFERENCIAS, linhas).astype(object)
+        completa = np.array([f"DIÁRIA DE {f}" for f in rng.choice(FUNCOES, linhas)], dtype=object)
+        unidade = rng.choice(UNIDADES, linhas).astype(object)
+
+    qtd = rng.integers(0, 31, (linhas, 3))
+    unit = rng.uniform(80, 5_000, (linhas, 3)).round(2)
+    totais = (qtd * unit).round(2)
+    he = rng.choice([0.0, 150.0, 320.5], linhas)
+    cobrado = totais.sum(axis=1) + he + rng.choice([0.0, 0.0, 0.0, 99.9], linhas)
+    df = pd.DataFrame({
+        "descricao": descricao,
+        "descricao_completa": completa,
+        "unidade": unidade,
+        "qtd_standby": qtd[:, 0].astype(str),
+        "qtd_operacional": qtd[:, 1].astype(str),
+        "qtd_dobra": qtd[:, 2].astype(str),
+        "qtd_total": qtd.sum(axis=1).astype(str),
+        "valor_unitario_standby": formatar_brl(unit[:, 0], rng),
+        "valor_unitario_operacional": formatar_brl(unit[:, 1], rng),
+        "valor_unitario_dobra": formatar_brl(unit[:, 2], rng),
+        "total_standby": formatar_brl(totais[:, 0], rng),
+        "total_operacional": formatar_brl(totais[:, 1], rng),
+        "total_dobra": formatar_brl(totais[:, 2], rng),
+        "total_he": formatar_brl(he, rng),
+        "total_cobrado": formatar_brl(cobrado, rng),
+    })
+    return df[COLUNAS_BOLETIM]
+
+
+def linhas_texto(df: pd.DataFrame) -> list[str]:
+    """Linhas "a;b;c" como as que a extração produz a partir do texto da página."""
+    return df.fillna("").astype(str).agg(";".join, axis=1).tolist()
+
+
+def gerar_pdf_boletim(paginas: int, linhas_por_pagina: int = 40, digitalizado: bool = False, seed: int = 0, dpi: int = 100) -> bytes:
+    """PDF de boletim em paisagem com `linhas_por_pagina` linhas de tabela por página.
+
+    `digitalizado=True` rasteriza cada página e grava só a imagem (sem camada de texto), como um
+    documento escaneado.
+    """
+    df = gerar_boletim(paginas * linhas_por_pagina, seed=seed)
+    larguras = [90, 150, 45] + [30] * 4 + [50] * 8
+    celulas = df.astype(str).to_numpy()
+    fonte = fitz.Font("helv")
+    doc = fitz.open()
+    for p in range(paginas):
+        pagina = doc.new_page(width=842, height=595)
+        escritor = fitz.TextWriter(pagina.rect)
+        for i, linha in enumerate(celulas[p * linhas_por_pagina:(p + 1) * linhas_por_pagina]):
+            x = 15
+            for valor, largura in zip(linha, larguras):
+                escritor.append((x, 30 + 13 * i), valor[:28], font=fonte, fontsize=5)
+                x += largura
+        escritor.write_text(pagina)
+    if not digitalizado:
+        dados = doc.tobytes()
+        doc.close()
+        return dados
+
+    escaneado = fitz.open()
+    for pagina in doc:
+        pix = pagina.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        nova = escaneado.new_page(width=pagina.rect.width, height=pagina.rect.height)
+        nova.insert_image(nova.rect, pixmap=pix)
+    dados = escaneado.tobytes(deflate=True)
+    escaneado.close()
+    doc.close()
+    return dados
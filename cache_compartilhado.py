@@ -0,0 +1,204 @@
+"""Cache em memória compartilhado por todas as sessões do processo (extrações e normalizações).
+
+No servidor único da equipe, dois analistas que enviam o mesmo PDF recebem o mesmo resultado
+de extração. A chave é o hash do conteúdo (mais os parâmetros da extração), então só quem
+tem os mesmos bytes chega à entrada. Chamadas simultâneas para a mesma chave esperam o
+primeiro cálculo em vez de repeti-lo. O total é limitado a `limite_bytes`, com descarte LRU,
+e cada entrada conta acessos, sessões distintas e o tempo de cálculo economizado.
+
+Isolamento entre usuários: as entradas guardam só o resultado. O nome do arquivo e os
+avisos de quem calculou não são guardados: quem consulta recebe cópias rasas, com o próprio
+nome de documento. As sessões são contadas por um hash do id, sem guardar o id.
+"""
+import contextvars
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import pandas as pd
+
+LIMITE_BYTES_PADRAO = 512 * 1024 * 1024
+
+_sessao: contextvars.ContextVar[str] = contextvars.ContextVar("sessao_cache_compartilhado", default="processo")
+
+
+def definir_sessao(identificador: str):
+    """Sessão (usuário) do contexto atual, usada só na contagem de sessões por entrada."""
+    _sessao.set(hashlib.sha1(str(identificador).encode("utf-8")).hexdigest()[:12])
+
+
+def sessao_atual() -> str:
+    """Hash da sessão do contexto atual ("processo" fora de uma sessão)."""
+    return _sessao.get()
+
+
+def tamanho_bytes(valor) -> int:
+    """Memória aproximada de DataFrames, listas/dicts deles e bytes."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return len(valor)
+    if isinstance(valor, dict):
+        return sum(tamanho_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_bytes(v) for v in valor)
+    return 64
+
+
+@dataclass
+class EntradaCompartilhada:
+    valor: Any
+    bytes: int
+    segundos_calculo: float
+    criado_em: float = field(default_factory=time.time)
+    ultimo_acesso: float = field(default_factory=time.time)
+    acessos: int = 0
+    sessoes: set[str] = field(default_factory=set)
+
+
+class _Calculo:
+    """Cálculo em andamento de uma chave: os demais interessados esperam `pronto`."""
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.valor = None
+        self.ok = False
+
+
+class CacheCompartilhado:
+    """LRU em memória limitado por bytes, com cálculo único por chave entre threads/sessões."""
+
+    def __init__(self, limite_bytes: int = LIMITE_BYTES_PADRAO):
+        self.limite_bytes = int(limite_bytes)
+        self.acertos = 0
+        self.falhas = 0
+        self.esperas = 0
+        self.descartes = 0
+        self.segundos_economizados = 0.0
+        self._entradas: OrderedDict[str, EntradaCompartilhada] = OrderedDict()
+        self._em_andamento: dict[str, _Calculo] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _registrar_acesso(self, entrada: EntradaCompartilhada):
+        entrada.acessos += 1
+        entrada.ultimo_acesso = time.time()
+        entrada.sessoes.add(_sessao.get())
+        self.acertos += 1
+        self.segundos_economizados += entrada.segundos_calculo
+
+    def obter(self, chave: str):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self._registrar_acesso(entrada)
+            return entrada.valor
+
+    def _guardar(self, chave: str, valor, segundos: float):
+        tamanho = tamanho_bytes(valor)
+        if tamanho > self.limite_bytes:
+            return
+        antiga = self._entradas.pop(chave, None)
+        if antiga is not None:
+            self._bytes -= antiga.bytes
+        self._entradas[chave] = EntradaCompartilhada(valor, tamanho, segundos, sessoes={_sessao.get()})
+        self._bytes += tamanho
+        while self._bytes > self.limite_bytes and self._entradas:
+            _, descartada = self._entradas.popitem(last=False)
+            self._bytes -= descartada.bytes
+            self.descartes += 1
+
+    def obter_ou_calcular(self, chave: str, calcular: Callable[[], Any], guardar: Callable[[Any], bool] = lambda v: True):
+        """Valor em cache ou `calcular()`; quem chega durante o cálculo da mesma chave espera o resultado.
+
+        Só valores aprovados por `guardar` entram no cache (ex.: extração sem tabelas não é guardada).
+        Devolve (valor, reaproveitado).
+        """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                self._registrar_acesso(entrada)
+                return entrada.valor, True
+            calculo = self._em_andamento.get(chave)
+            dono = calculo is None
+            if dono:
+                calculo = self._em_andamento[chave] = _Calculo()
+                self.falhas += 1
+            else:
+                self.esperas += 1
+
+        if not dono:
+            calculo.pronto.wait()
+            if calculo.ok:
+                with self._lock:
+                    entrada = self._entradas.get(chave)
+                    if entrada is not None:
+                        self._registrar_acesso(entrada)
+                return calculo.valor, True
+            # o cálculo do outro falhou ou não foi guardado: calcula por conta própria
+            return calcular(), False
+
+        try:
+            inicio = time.perf_counter()
+            valor = calcular()
+            segundos = time.perf_counter() - inicio
+            aprovado = guardar(valor)
+            with self._lock:
+                if aprovado:
+                    self._guardar(chave, valor, segundos)
+                calculo.valor, calculo.ok = valor, aprovado
+            return valor, False
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+            calculo.pronto.set()
+
+    def remover(self, chave: str):
+        with self._lock:
+            entrada = self._entradas.pop(chave, None)
+            if entrada is not None:
+                self._bytes -= entrada.bytes
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def entradas(self) -> list[dict]:
+        """Contabilidade por entrada (sem o conteúdo), da mais para a menos recente."""
+        with self._lock:
+            return [
+                {
+                    "chave": chave[:16],
+                    "bytes": e.bytes,
+                    "acessos": e.acessos,
+                    "sessoes": len(e.sessoes),
+                    "segundos_calculo": round(e.segundos_calculo, 3),
+                    "criado_em": e.criado_em,
+                    "ultimo_acesso": e.ultimo_acesso,
+                }
+                for chave, e in reversed(self._entradas.items())
+            ]
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "esperas": self.esperas,
+                "taxa_acerto": (self.acertos / consultas) if consultas else 0.0,
+                "descartes": self.descartes,
+                "segundos_economizados": self.segundos_economizados,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "limite_bytes": self.limite_bytes,
+            }
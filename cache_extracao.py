@@ -0,0 +1,133 @@
+"""Cache persistente (em disco) dos resultados de extração do Document AI.
+
+Cada entrada é identificada pelo hash SHA-256 dos bytes do PDF já recortado
+(saída de `extrair_paginas_pdf`), do ID do processor e da versão do extrator. Os
+recortes são gravados sem o `/ID` aleatório do PyMuPDF (`no_new_id=True`), então o
+mesmo intervalo do mesmo PDF sempre gera a mesma chave.
+As tabelas são gravadas em Parquet (colunar e comprimido) e o diretório é
+mantido abaixo de um limite de tamanho com descarte LRU.
+"""
+import hashlib
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Incrementar sempre que a lógica de extração/normalização mudar de forma a invalidar resultados antigos
+VERSAO_EXTRATOR = "1"
+
+ARQUIVO_META = "meta.json"
+
+
+def chave_extracao(pdf_bytes: bytes, processor_id: str, versao: str = VERSAO_EXTRATOR) -> str:
+    """Gera a chave de conteúdo para (PDF recortado, processor, versão do extrator)."""
+    h = hashlib.sha256()
+    h.update(str(versao).encode("utf-8"))
+    h.update(b"\0")
+    h.update(str(processor_id).encode("utf-8"))
+    h.update(b"\0")
+    h.update(pdf_bytes)
+    return h.hexdigest()
+
+
+class CacheExtracao:
+    """Cache LRU em disco de listas de DataFrames, limitado a `limite_bytes`."""
+
+    def __init__(self, diretorio: str | Path, limite_bytes: int = 512 * 1024 * 1024):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.limite_bytes = int(limite_bytes)
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self._lock = threading.Lock()
+
+    def _pasta(self, chave: str) -> Path:
+        return self.diretorio / chave
+
+    def obter(self, chave: str) -> list[pd.DataFrame] | None:
+        """Retorna as tabelas em cache ou None. Atualiza o instante de último acesso (LRU)."""
+        pasta = self._pasta(chave)
+        meta_path = pasta / ARQUIVO_META
+        with self._lock:
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                tabelas = [pd.read_parquet(pasta / nome) for nome in meta["tabelas"]]
+            except Exception:
+                self.falhas += 1
+                return None
+            meta["ultimo_acesso"] = time.time()
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+            self.acertos += 1
+        return tabelas
+
+    def gravar(self, chave: str, tabelas: list[pd.DataFrame]) -> bool:
+        """Grava as tabelas de uma extração. Falhas de serialização não interrompem o fluxo."""
+        pasta = self._pasta(chave)
+        tmp = self.diretorio / f".{chave}.tmp"
+        with self._lock:
+            try:
+                shutil.rmtree(tmp, ignore_errors=True)
+                tmp.mkdir(parents=True)
+                nomes = []
+                for i, df in enumerate(tabelas):
+                    nome = f"tabela_{i}.parquet"
+                    df_out = df.copy()
+                    df_out.columns = [str(c) for c in df_out.columns]
+                    df_out.to_parquet(tmp / nome, index=False, compression="zstd")
+                    nomes.append(nome)
+                tamanho = sum(p.stat().st_size for p in tmp.iterdir())
+                meta = {"tabelas": nomes, "bytes": tamanho, "criado_em": time.time(), "ultimo_acesso": time.time()}
+                (tmp / ARQUIVO_META).write_text(json.dumps(meta), encoding="utf-8")
+                shutil.rmtree(pasta, ignore_errors=True)
+                tmp.rename(pasta)
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                return False
+            self._descartar_excedente()
+        return True
+
+    def _entradas(self) -> list[tuple[float, int, Path]]:
+        entradas = []
+        for pasta in self.diretorio.iterdir():
+            meta_path = pasta / ARQUIVO_META
+            if pasta.name.startswith(".") or not meta_path.is_file():
+                continue
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                entradas.append((float(meta.get("ultimo_acesso", 0)), int(meta.get("bytes", 0)), pasta))
+            except Exception:
+                entradas.append((0.0, 0, pasta))
+        return entradas
+
+    def _descartar_excedente(self):
+        entradas = sorted(self._entradas(), key=lambda e: e[0])
+        total = sum(e[1] for e in entradas)
+        for _, tamanho, pasta in entradas:
+            if total <= self.limite_bytes:
+                break
+            shutil.rmtree(pasta, ignore_errors=True)
+            total -= tamanho
+            self.descartes += 1
+
+    def limpar(self):
+        with self._lock:
+            for _, _, pasta in self._entradas():
+                shutil.rmtree(pasta, ignore_errors=True)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            entradas = self._entradas()
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": (self.acertos / consultas) if consultas else 0.0,
+            "descartes": self.descartes,
+            "entradas": len(entradas),
+            "bytes": sum(e[1] for e in entradas),
+            "limite_bytes": self.limite_bytes,
+        }
@@ -0,0 +1,178 @@
+"""Cache persistente (SQLite) das respostas de ChatCompletion dos agentes.
+
+A chave é o hash do modelo, das mensagens e dos demais parâmetros da chamada. Entradas
+expiram por TTL e o banco é mantido abaixo de um limite de tamanho (descarte LRU).
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from agendador import Agendador
+from rastreamento import span
+
+TTL_PADRAO = 30 * 24 * 3600  # segundos
+LIMITE_BYTES_PADRAO = 64 * 1024 * 1024
+
+
+def chave_chamada(params: dict) -> str:
+    """Hash canônico dos parâmetros da chamada (modelo, mensagens, temperatura, max_tokens...)."""
+    texto = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _resposta_de_dict(dados: dict):
+    """Reconstrói um objeto com a mesma interface da resposta do SDK (`resp.choices[0].message["content"]`)."""
+    try:
+        from openai.openai_object import OpenAIObject
+
+        return OpenAIObject.construct_from(dados)
+    except Exception:
+        escolhas = [SimpleNamespace(**{**c, "message": c.get("message", {})}) for c in dados.get("choices", [])]
+        return SimpleNamespace(**{**dados, "choices": escolhas})
+
+
+def _resposta_para_dict(resp) -> dict:
+    if hasattr(resp, "to_dict_recursive"):
+        return resp.to_dict_recursive()
+    return json.loads(json.dumps(resp, default=lambda o: getattr(o, "__dict__", str(o))))
+
+
+class CacheLLM:
+    """Cache de respostas de LLM com TTL, limite de tamanho e estatísticas de uso."""
+
+    def __init__(
+        self,
+        caminho: str | Path,
+        ttl: float = TTL_PADRAO,
+        limite_bytes: int = LIMITE_BYTES_PADRAO,
+        agendador: Agendador | None = None,
+        backend: str = "openai",
+    ):
+        self.caminho = Path(caminho)
+        self.agendador = agendador
+        self.backend = backend
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.limite_bytes = int(limite_bytes)
+        self.acertos = 0
+        self.falhas = 0
+        self.segundos_economizados = 0.0
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY,
+                    modelo TEXT,
+                    resposta TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    latencia REAL NOT NULL,
+                    criado_em REAL NOT NULL,
+                    ultimo_acesso REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (ultimo_acesso)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:  # commit/rollback
+                yield con
+        finally:
+            con.close()
+
+    def obter(self, chave: str):
+        agora = time.time()
+        with self._lock, self._conectar() as con:
+            linha = con.execute(
+                "SELECT resposta, latencia, criado_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None or (self.ttl and agora - linha[2] > self.ttl):
+                if linha is not None:
+                    con.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                self.falhas += 1
+                return None
+            con.execute("UPDATE respostas SET ultimo_acesso = ? WHERE chave = ?", (agora, chave))
+            self.acertos += 1
+            self.segundos_economizados += linha[1]
+        return _resposta_de_dict(json.loads(linha[0]))
+
+    def gravar(self, chave: str, modelo: str, resp, latencia: float):
+        texto = json.dumps(_resposta_para_dict(resp), ensure_ascii=False)
+        agora = time.time()
+        with self._lock, self._conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chave, modelo, texto, len(texto.encode("utf-8")), latencia, agora, agora),
+            )
+            self._descartar(con, agora)
+
+    def _descartar(self, con: sqlite3.Connection, agora: float):
+        if self.ttl:
+            con.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.ttl,))
+        total = con.execute("SELECT COALESCE(SUM(bytes), 0) FROM respostas").fetchone()[0]
+        if total <= self.limite_bytes:
+            return
+        excedente = total - self.limite_bytes
+        remover, acumulado = [], 0
+        for chave, tamanho in con.execute("SELECT chave, bytes FROM respostas ORDER BY ultimo_acesso"):
+            remover.append((chave,))
+            acumulado += tamanho
+            if acumulado >= excedente:
+                break
+        con.executemany("DELETE FROM respostas WHERE chave = ?", remover)
+
+    def _criar(self, cliente, params: dict):
+        if self.agendador is None:
+            return cliente.ChatCompletion.create(**params)
+        return self.agendador.executar(self.backend, cliente.ChatCompletion.create, **params)
+
+    def chat_completion(self, cliente, usar_cache: bool = True, validar: Callable[[Any], bool] | None = None, **params):
+        """`cliente.ChatCompletion.create(**params)` passando pelo cache (a menos que `usar_cache=False`)
+        e, se houver, pelo agendador (limite de taxa e novas tentativas).
+
+        Se `validar` for informado, só respostas aprovadas por ele são gravadas (ex.: JSON parseável),
+        para que uma resposta truncada não fique presa no cache.
+        """
+        with span("llm", modelo=params.get("model", "")) as s:
+            if not usar_cache:
+                s.definir(cache=False)
+                return self._criar(cliente, params)
+            chave = chave_chamada(params)
+            resp = self.obter(chave)
+            s.definir(cache=resp is not None)
+            if resp is not None:
+                return resp
+            inicio = time.perf_counter()
+            resp = self._criar(cliente, params)
+            latencia = time.perf_counter() - inicio
+            try:
+                valida = validar is None or validar(resp)
+            except Exception:
+                valida = False
+            if valida:
+                self.gravar(chave, params.get("model", ""), resp, latencia)
+            return resp
+
+    def estatisticas(self) -> dict:
+        with self._lock, self._conectar() as con:
+            entradas, total = con.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM respostas").fetchone()
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": (self.acertos / consultas) if consultas else 0.0,
+            "segundos_economizados": self.segundos_economizados,
+            "entradas": entradas,
+            "bytes": total,
+            "limite_bytes": self.limite_bytes,
+        }
@@ -0,0 +1,97 @@
+"""Catálogo de preços do contrato com índice por `chave_conciliacao`.
+
+As chaves do contrato são normalizadas uma única vez; a conciliação de cada boletim
+passa a ser uma sondagem no índice hash (sem copiar nem reprocessar o contrato).
+"""
+import numpy as np
+import pandas as pd
+
+from assinaturas import assinatura_dataframe
+from correspondencia_aproximada import IndiceAproximado
+
+COLUNAS_PRECO = ["valor_unitario", "valor_standby"]
+
+
+def chave_conciliacao(df: pd.DataFrame, dcol: str, ucol: str) -> pd.Series:
+    """"DESCRIÇÃO - UNIDADE" em maiúsculas e sem espaços nas pontas."""
+    def parte(col):
+        # astype("string") aceita texto em objeto, Arrow ou categoria (fillna("") falharia numa categoria)
+        return df[col].astype("string").fillna("").str.strip().str.upper()
+    return (parte(dcol) + " - " + parte(ucol)).astype(object)
+
+
+def normalizar_chave(descricao, unidade) -> str:
+    """Versão escalar de `chave_conciliacao`, para consultas pontuais."""
+    def parte(v):
+        return "" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v).strip().upper()
+    return f"{parte(descricao)} - {parte(unidade)}"
+
+
+class CatalogoContrato:
+    """Tabela de preços do contrato indexada por `chave_conciliacao`."""
+
+    def __init__(self, df_contrato: pd.DataFrame):
+        self.assinatura = assinatura_dataframe(df_contrato)
+        tabela = df_contrato
+        # permite bases de contrato com nomes diversos
+        if "descricao_completa" not in tabela.columns and "DESCRICAO_COMPLETA" in tabela.columns:
+            tabela = tabela.rename(columns={"DESCRICAO_COMPLETA": "descricao_completa"})
+        chaves = chave_conciliacao(tabela, "descricao_completa", "unidade")
+        self.tabela = tabela.assign(chave_conciliacao=chaves.to_numpy()).reset_index(drop=True)
+        self.indice = pd.Index(self.tabela["chave_conciliacao"])
+        self.chaves_unicas = self.indice.is_unique
+        # linha extra toda NaN ao final: destino das chaves sem correspondência em `juntar`
+        valores = self.tabela.drop(columns="chave_conciliacao")
+        # (reindex preserva os dtypes das colunas, inclusive texto Arrow e categorias, no concat)
+        self._valores_com_vazio = pd.concat([valores, valores.iloc[:0].reindex([len(valores)])])
+        self._indice_aproximado = None
+
+    def __len__(self) -> int:
+        return len(self.tabela)
+
+    def valido_para(self, df_contrato: pd.DataFrame) -> bool:
+        return assinatura_dataframe(df_contrato) == self.assinatura
+
+    def buscar(self, descricao, unidade) -> dict | None:
+        """Consulta O(1) dos preços de um item; None se a chave não existe no contrato."""
+        chave = normalizar_chave(descricao, unidade)
+        if chave not in self.indice:
+            return None
+        pos = self.indice.get_loc(chave)
+        if not isinstance(pos, (int, np.integer)):
+            pos = np.flatnonzero(pos)[0] if isinstance(pos, np.ndarray) else pos.start
+        linha = self.tabela.iloc[pos]
+        return {c: linha.get(c) for c in ["chave_conciliacao", *COLUNAS_PRECO]}
+
+    @property
+    def indice_aproximado(self) -> IndiceAproximado:
+        """Índice de trigramas das descrições do contrato (construído no primeiro uso)."""
+        if self._indice_aproximado is None:
+            self._indice_aproximado = IndiceAproximado(self.tabela["descricao_completa"], self.tabela["unidade"])
+        return self._indice_aproximado
+
+    def sugerir(self, descricoes: pd.Series, unidades: pd.Series) -> pd.DataFrame:
+        """Item do contrato mais parecido com cada (descrição, unidade): posição, chave e similaridade."""
+        sugestoes = self.indice_aproximado.corresponder(descricoes, unidades)
+        chaves = self.tabela["chave_conciliacao"].to_numpy()
+        sugestoes["chave_contrato_sugerida"] = [chaves[p] if p >= 0 else None for p in sugestoes["posicao"]]
+        return sugestoes
+
+    def juntar(self, df_boletim: pd.DataFrame, coluna_chave: str = "chave_conciliacao") -> pd.DataFrame:
+        """Equivalente a `df_boletim.merge(contrato, on=coluna_chave, how="left", suffixes=("", "_contrato"))`.
+
+        Com chaves únicas no contrato, resolve por sondagem no índice (`get_indexer`) em vez de `merge`.
+        """
+        if not self.chaves_unicas:
+            return df_boletim.merge(
+                self.tabela.rename(columns={"chave_conciliacao": coluna_chave}),
+                on=coluna_chave,
+                how="left",
+                suffixes=("", "_contrato"),
+            )
+        posicoes = self.indice.get_indexer(df_boletim[coluna_chave])
+        posicoes[posicoes < 0] = len(self.tabela)
+        direita = self._valores_com_vazio.iloc[posicoes]
+        sobrepostas = set(direita.columns) & set(df_boletim.columns)
+        direita = direita.rename(columns={c: f"{c}_contrato" for c in sobrepostas}).reset_index(drop=True)
+        return pd.concat([df_boletim.reset_index(drop=True), direita], axis=1)
@@ -0,0 +1,118 @@
+"""Classificação local (memória + regras) das linhas do boletim em categorias de catálogo.
+
+Descrições já vistas são resolvidas por um dicionário persistido em disco; as demais
+passam por regras de palavras-chave. Só o que nenhuma das duas camadas resolve é
+enviado ao LLM, em lotes, e as respostas voltam para o dicionário.
+"""
+import json
+import os
+import re
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+from correspondencia_aproximada import normalizar_texto
+
+CATEGORIAS = ["PROFISSIONAL", "EQUIPAMENTO", "MOB/DESMOB", "INSUMO", "OUTROS"]
+
+# Palavras-chave por categoria (texto sem acentos, maiúsculo); descrição que casa com mais de uma
+# categoria (ex.: "OPERADOR DE GUINDASTE") é ambígua e fica para o LLM
+REGRAS_PALAVRAS_CHAVE = [
+    (re.compile(r"\b(MOBILIZACAO|DESMOBILIZACAO|MOB|DESMOB)\b"), "MOB/DESMOB"),
+    (re.compile(r"\b(EQUIPAMENTO|GUINDASTE|CAMINHAO|MUNCK|COMPRESSOR|GERADOR|BOMBA|ANDAIME|EMPILHADEIRA|RETROESCAVADEIRA|VEICULO|LOCACAO)\b"), "EQUIPAMENTO"),
+    (re.compile(r"\b(OPERADOR|SUPERVISOR|TECNICO|SOLDADOR|ELETRICISTA|ENGENHEIRO|AJUDANTE|MOTORISTA|MECANICO|INSPETOR|PROFISSIONAL|ENCARREGADO|MAO DE OBRA)\b"), "PROFISSIONAL"),
+    (re.compile(r"\b(PRODUTO QUIMICO|MATERIAL|MATERIAIS|INSUMO|INSUMOS|COMBUSTIVEL|DIESEL|CONSUMIVEIS)\b"), "INSUMO"),
+]
+
+
+def classificar_por_regras(texto_normalizado: str) -> str | None:
+    """Categoria das regras que casam com o texto; None se nenhuma casar ou se casarem categorias diferentes."""
+    categorias = {categoria for padrao, categoria in REGRAS_PALAVRAS_CHAVE if padrao.search(texto_normalizado)}
+    return categorias.pop() if len(categorias) == 1 else None
+
+
+class DicionarioCategorias:
+    """Mapa persistido descrição normalizada -> categoria (respostas do LLM e ajustes manuais)."""
+
+    def __init__(self, caminho: str | Path):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        try:
+            self._mapa: dict[str, str] = json.loads(self.caminho.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._mapa = {}
+
+    def __len__(self) -> int:
+        return len(self._mapa)
+
+    def get(self, chave: str) -> str | None:
+        return self._mapa.get(chave)
+
+    def atualizar(self, novos: dict[str, str]):
+        """Acrescenta entradas e grava o arquivo de forma atômica."""
+        if not novos:
+            return
+        with self._lock:
+            self._mapa.update(novos)
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.caminho.with_suffix(self.caminho.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._mapa, ensure_ascii=False, indent=0, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.caminho)
+
+
+def classificar_linhas(
+    linhas: list[str],
+    dicionario: DicionarioCategorias,
+    classificar_lote: Callable[[list[str]], list[str]] | None = None,
+    tamanho_lote: int = 100,
+) -> tuple[list[str], dict]:
+    """Categoria de cada linha + contagem de quantas linhas vieram de cada camada.
+
+    `classificar_lote` recebe até `tamanho_lote` descrições inéditas e deve devolver uma categoria
+    por descrição, na mesma ordem; lotes com resposta inválida ficam como "OUTROS" e não são memorizados.
+    """
+    chaves = [normalizar_texto(l) for l in linhas]
+    resolvidas: dict[str, str] = {}
+    origem: dict[str, str] = {}
+    ineditas = []
+    for chave in dict.fromkeys(chaves):
+        categoria = dicionario.get(chave)
+        if categoria is not None:
+            resolvidas[chave], origem[chave] = categoria, "dicionario"
+            continue
+        categoria = classificar_por_regras(chave)
+        if categoria is not None:
+            resolvidas[chave], origem[chave] = categoria, "regras"
+            continue
+        ineditas.append(chave)
+
+    # textos originais (não normalizados) dão mais contexto ao LLM
+    exemplo = {}
+    for linha, chave in zip(linhas, chaves):
+        exemplo.setdefault(chave, linha)
+
+    novos = {}
+    if classificar_lote is not None:
+        for i in range(0, len(ineditas), tamanho_lote):
+            lote = ineditas[i:i + tamanho_lote]
+            try:
+                respostas = classificar_lote([exemplo[c] for c in lote])
+            except Exception:
+                respostas = None
+            validas = (
+                isinstance(respostas, list)
+                and len(respostas) == len(lote)
+                and all(str(r).strip().upper() in CATEGORIAS for r in respostas)
+            )
+            if validas:
+                for chave, resposta in zip(lote, respostas):
+                    novos[chave] = str(resposta).strip().upper()
+                    origem[chave] = "llm"
+        dicionario.atualizar(novos)
+    resolvidas.update(novos)
+
+    categorias = [resolvidas.get(c, "OUTROS") for c in chaves]
+    contagem = {"dicionario": 0, "regras": 0, "llm": 0, "sem_classificacao": 0}
+    for c in chaves:
+        contagem[origem.get(c, "sem_classificacao")] += 1
+    return categorias, contagem
@@ -0,0 +1,106 @@
+"""Pool de credenciais e cliente do Document AI compartilhado pelo processo.
+
+O cliente gRPC (canal + handshake TLS) e o token OAuth são criados sob demanda uma
+única vez e reaproveitados entre documentos, sessões e reruns do Streamlit. O token
+é renovado antes de expirar e o canal é recriado (na próxima tentativa) quando o servidor o derruba.
+"""
+import datetime as dt
+import threading
+
+from google.api_core import exceptions as gexc
+from google.auth.transport.requests import Request
+from google.cloud import documentai_v1 as documentai
+from google.oauth2 import service_account
+
+ESCOPOS = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# Renova o token quando faltar menos que isto para expirar
+MARGEM_RENOVACAO = dt.timedelta(minutes=5)
+
+# Erros que indicam canal quebrado (conexão encerrada, GOAWAY, etc.)
+ERROS_CANAL = (gexc.ServiceUnavailable, gexc.Unknown)
+
+
+class ProvedorDocumentAI:
+    """Mantém uma credencial e um `DocumentProcessorServiceClient` reaproveitáveis."""
+
+    def __init__(self, info_service_account: dict):
+        self._info = dict(info_service_account)
+        self._lock = threading.Lock()
+        self._credenciais = None
+        self._cliente = None
+        self.canais_criados = 0
+        self.tokens_emitidos = 0
+        self.canais_reciclados = 0
+
+    def _token_expirando(self) -> bool:
+        cred = self._credenciais
+        if not cred.token or cred.expiry is None:
+            return True
+        # google-auth usa datetimes "naive" em UTC
+        agora = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        return cred.expiry - agora <= MARGEM_RENOVACAO
+
+    @property
+    def credenciais(self) -> service_account.Credentials:
+        """Credencial com token válido, emitindo um novo apenas quando necessário."""
+        with self._lock:
+            if self._credenciais is None:
+                self._credenciais = service_account.Credentials.from_service_account_info(self._info, scopes=ESCOPOS)
+            if self._token_expirando():
+                self._credenciais.refresh(Request())
+                self.tokens_emitidos += 1
+            return self._credenciais
+
+    @property
+    def cliente(self) -> documentai.DocumentProcessorServiceClient:
+        credenciais = self.credenciais
+        with self._lock:
+            if self._cliente is None:
+                self._cliente = documentai.DocumentProcessorServiceClient(credentials=credenciais)
+                self.canais_criados += 1
+            return self._cliente
+
+    def reciclar_canal(self):
+        """Descarta o cliente atual; o próximo acesso abre um novo canal."""
+        with self._lock:
+            cliente, self._cliente = self._cliente, None
+            if cliente is not None:
+                self.canais_reciclados += 1
+                try:
+                    cliente.transport.close()
+                except Exception:
+                    pass
+
+    def process_document(self, request: dict):
+        """Executa `process_document`; com o canal quebrado, descarta-o e repassa o erro.
+
+        Não tenta de novo aqui: quem repete (com backoff e respeitando o limite de taxa) é o
+        `Agendador`, e a próxima tentativa já sai pelo canal novo.
+        """
+        try:
+            return self.cliente.process_document(request=request)
+        except ERROS_CANAL:
+            self.reciclar_canal()
+            raise
+
+    def estatisticas(self) -> dict:
+        return {
+            "canais_criados": self.canais_criados,
+            "canais_reciclados": self.canais_reciclados,
+            "tokens_emitidos": self.tokens_emitidos,
+        }
+
+
+_provedores: dict[tuple, ProvedorDocumentAI] = {}
+_lock_provedores = threading.Lock()
+
+
+def obter_provedor(info_service_account: dict) -> ProvedorDocumentAI:
+    """Retorna o provedor do processo para esta service account (criado na primeira chamada)."""
+    chave = (info_service_account.get("client_email"), info_service_account.get("private_key_id"))
+    with _lock_provedores:
+        provedor = _provedores.get(chave)
+        if provedor is None:
+            provedor = _provedores[chave] = ProvedorDocumentAI(info_service_account)
+        return provedor
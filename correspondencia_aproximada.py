@@ -0,0 +1,116 @@
+"""Correspondência aproximada (fuzzy) entre descrições do boletim e itens do contrato.
+
+Para não comparar cada linha com todo o contrato, os itens são agrupados por unidade
+(blocagem) e indexados por trigramas de caracteres (índice invertido). Os candidatos
+de uma descrição saem da contagem de trigramas em comum nas listas de postagem; só os
+melhores recebem o cálculo exato do coeficiente de Dice.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Trigramas presentes em mais que esta fração do bloco não ajudam a discriminar candidatos
+FRACAO_MAX_POSTAGEM = 0.25
+MIN_POSTAGEM_IGNORADA = 50
+CANDIDATOS_EXATOS = 10
+
+
+def normalizar_texto(valor) -> str:
+    """Remove acentos e pontuação, converte para maiúsculas e colapsa espaços."""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return ""
+    s = unicodedata.normalize("NFKD", str(valor))
+    s = "".join(c for c in s if not unicodedata.combining(c)).upper()
+    s = re.sub(r"[^0-9A-Z]+", " ", s)
+    return " ".join(s.split())
+
+
+def trigramas(texto: str) -> set[str]:
+    if not texto:
+        return set()
+    s = f"  {texto} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def similaridade(a: str, b: str) -> float:
+    """Coeficiente de Dice entre os trigramas de dois textos já normalizados."""
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+class _Bloco:
+    """Índice invertido trigrama -> itens de um mesmo grupo de unidade."""
+
+    def __init__(self, posicoes: list[int], textos: list[str]):
+        self.posicoes = np.asarray(posicoes, dtype=np.int64)
+        self.textos = textos
+        self.grams = [trigramas(t) for t in textos]
+        postagens = defaultdict(list)
+        for i, grams in enumerate(self.grams):
+            for g in grams:
+                postagens[g].append(i)
+        limite = max(MIN_POSTAGEM_IGNORADA, int(len(textos) * FRACAO_MAX_POSTAGEM))
+        self.postagens = {g: np.asarray(ids, dtype=np.int64) for g, ids in postagens.items()}
+        self.frequentes = {g for g, ids in postagens.items() if len(ids) > limite}
+
+    def melhor(self, texto: str) -> tuple[int, float]:
+        grams = trigramas(texto)
+        if not grams:
+            return -1, 0.0
+        uteis = [self.postagens[g] for g in grams if g in self.postagens and g not in self.frequentes]
+        if not uteis:
+            uteis = [self.postagens[g] for g in grams if g in self.postagens]
+        if not uteis:
+            return -1, 0.0
+        contagem = np.bincount(np.concatenate(uteis), minlength=len(self.textos))
+        k = min(CANDIDATOS_EXATOS, int((contagem > 0).sum()))
+        candidatos = np.argpartition(-contagem, k - 1)[:k]
+        melhor_i, melhor_s = -1, 0.0
+        for i in candidatos:
+            cg = self.grams[i]
+            s = 2 * len(grams & cg) / (len(grams) + len(cg))
+            if s > melhor_s:
+                melhor_i, melhor_s = int(i), s
+        return (int(self.posicoes[melhor_i]) if melhor_i >= 0 else -1), melhor_s
+
+
+class IndiceAproximado:
+    """Índice de descrições do contrato, blocado por unidade normalizada."""
+
+    def __init__(self, descricoes: pd.Series | list, unidades: pd.Series | list):
+        textos = [normalizar_texto(d) for d in descricoes]
+        grupos = defaultdict(list)
+        for pos, unidade in enumerate(unidades):
+            grupos[normalizar_texto(unidade)].append(pos)
+        self._textos = textos
+        self._blocos = {u: _Bloco(ps, [textos[p] for p in ps]) for u, ps in grupos.items()}
+        self._todos = None
+
+    def melhor_correspondencia(self, descricao, unidade) -> tuple[int, float]:
+        """Posição (no contrato) do melhor candidato e similaridade em [0, 1]; (-1, 0.0) se nenhum."""
+        texto = normalizar_texto(descricao)
+        bloco = self._blocos.get(normalizar_texto(unidade))
+        if bloco is not None:
+            pos, score = bloco.melhor(texto)
+            if pos >= 0:
+                return pos, score
+        # unidade ausente no contrato (ou grafada de outro jeito): procura em todos os itens
+        if self._todos is None:
+            self._todos = _Bloco(list(range(len(self._textos))), self._textos)
+        return self._todos.melhor(texto)
+
+    def corresponder(self, descricoes: pd.Series, unidades: pd.Series) -> pd.DataFrame:
+        """Melhor candidato para cada linha; pares (descrição, unidade) repetidos são resolvidos uma vez."""
+        pares = pd.DataFrame({"d": list(descricoes), "u": list(unidades)}, index=descricoes.index).fillna("")
+        unicos = pares.drop_duplicates()
+        resolvidos = {
+            (d, u): self.melhor_correspondencia(d, u)
+            for d, u in zip(unicos["d"], unicos["u"])
+        }
+        resultado = [resolvidos[(d, u)] for d, u in zip(pares["d"], pares["u"])]
+        return pd.DataFrame(resultado, columns=["posicao", "similaridade"], index=descricoes.index)
@@ -0,0 +1,136 @@
+"""Detecção automática das páginas com tabelas de medição.
+
+Antes do envio ao Document AI, cada página é pontuada pelo texto que já tem: termos de
+cabeçalho de tabela ("QTD", "VALOR UNITÁRIO", "UNIDADE"...) e valores monetários
+("1.234,56"). Páginas sem camada de texto passam por um OCR rápido em baixa resolução
+(opcional). As páginas que atingem `LIMIAR` viram os intervalos sugeridos, que o usuário
+pode alterar antes de processar.
+"""
+import re
+from dataclasses import dataclass, field
+
+import fitz
+
+from ingestao import Intervalo, formatar_intervalos
+from ocr_paralelo import ocr_paginas
+from texto_nativo import pagina_tem_texto
+
+# resolução do OCR de detecção: basta para ler cabeçalhos e números, custa uma fração do OCR de extração
+DPI_DETECCAO = 100
+TIMEOUT_PAGINA_DETECCAO = 30  # segundos
+
+# pontos mínimos para a página ser considerada parte de uma tabela de medição
+LIMIAR = 8
+PESO_CABECALHO = 3
+MAX_PONTOS_VALORES = 20
+# páginas não marcadas entre duas marcadas (ex.: página de continuação sem valores) entram no intervalo
+LACUNA_MAXIMA = 1
+
+CABECALHOS = {
+    "quantidade": r"\bQTDE?\.?\b|\bQUANT(?:IDADE)?\.?\b",
+    "valor_unitario": r"VALOR\s*UNIT|V\.\s*UNIT|VL\.?\s*UNIT|PRE[ÇC]O\s*UNIT",
+    "valor_total": r"VALOR\s*TOTAL|VL\.?\s*TOTAL|\bSUBTOTAL\b",
+    "unidade": r"\bUNID(?:ADE)?\.?\b|\bUND\b|\bUN\b",
+    "descricao": r"DESCRI[ÇC][ÃA]O|\bDISCRIMINA[ÇC][ÃA]O\b",
+    "item": r"\bITEM\b|\bC[ÓO]D(?:IGO)?\.?\b",
+    "medicao": r"MEDI[ÇC][ÃA]O|\bBM\b",
+    "horas": r"\bSTAND\s*-?\s*BY\b|\bHORAS?\b|\bDI[ÁA]RIAS?\b",
+}
+_CABECALHOS = {nome: re.compile(padrao) for nome, padrao in CABECALHOS.items()}
+_VALOR = re.compile(r"(?<![\d,.])(?:R\$\s*)?\d{1,3}(?:\.\d{3})*,\d{2}(?![\d,])")
+
+
+@dataclass
+class PaginaPontuada:
+    numero: int  # 1-based
+    pontos: int
+    cabecalhos: list[str] = field(default_factory=list)
+    valores: int = 0
+    via: str = "texto"  # "texto", "ocr" ou "sem_texto"
+
+    @property
+    def relevante(self) -> bool:
+        return self.pontos >= LIMIAR
+
+
+@dataclass
+class DeteccaoPaginas:
+    paginas: list[PaginaPontuada]
+    intervalos: list[Intervalo]
+
+    @property
+    def total(self) -> int:
+        return len(self.paginas)
+
+    @property
+    def selecionadas(self) -> int:
+        return sum(f - i + 1 for i, f in self.intervalos)
+
+    @property
+    def paginas_ocr(self) -> int:
+        return sum(1 for p in self.paginas if p.via == "ocr")
+
+    @property
+    def paginas_sem_texto(self) -> int:
+        return sum(1 for p in self.paginas if p.via == "sem_texto")
+
+    def resumo(self) -> str:
+        if not self.intervalos:
+            return f"nenhuma página com tabela detectada em {self.total}"
+        return f"{formatar_intervalos(self.intervalos)} ({self.selecionadas} de {self.total} páginas)"
+
+
+def pontuar_texto(numero: int, texto: str, via: str = "texto") -> PaginaPontuada:
+    """Pontos da página: `PESO_CABECALHO` por termo de cabeçalho distinto + um por valor monetário (até `MAX_PONTOS_VALORES`)."""
+    maiusculo = texto.upper()
+    cabecalhos = [nome for nome, padrao in _CABECALHOS.items() if padrao.search(maiusculo)]
+    valores = len(_VALOR.findall(texto))
+    pontos = PESO_CABECALHO * len(cabecalhos) + min(valores, MAX_PONTOS_VALORES)
+    return PaginaPontuada(numero, pontos, cabecalhos, valores, via)
+
+
+def propor_intervalos(paginas: list[PaginaPontuada], lacuna_maxima: int = LACUNA_MAXIMA) -> list[Intervalo]:
+    """Intervalos das páginas relevantes, unindo as separadas por até `lacuna_maxima` páginas."""
+    intervalos: list[list[int]] = []
+    for pagina in paginas:
+        if not pagina.relevante:
+            continue
+        if intervalos and pagina.numero - intervalos[-1][1] - 1 <= lacuna_maxima:
+            intervalos[-1][1] = pagina.numero
+        else:
+            intervalos.append([pagina.numero, pagina.numero])
+    return [(i, f) for i, f in intervalos]
+
+
+def _ocr_rapido(doc: fitz.Document, indices: list[int], dpi: int) -> dict[int, str]:
+    """Texto das páginas `indices` (0-based) por OCR em baixa resolução, no pool de OCR."""
+    with fitz.open() as recorte:
+        for i in indices:
+            recorte.insert_pdf(doc, from_page=i, to_page=i)
+        pdf_bytes = recorte.tobytes()
+    textos = {}
+    for pagina in ocr_paginas(pdf_bytes, dpi=dpi, tons_cinza=True, timeout_pagina=TIMEOUT_PAGINA_DETECCAO):
+        if not pagina.erro:
+            textos[indices[pagina.numero - 1]] = pagina.texto
+    return textos
+
+
+def detectar_paginas(doc: fitz.Document, ocr: bool = True, dpi: int = DPI_DETECCAO) -> DeteccaoPaginas:
+    """Pontua todas as páginas de `doc` e propõe os intervalos com tabelas de medição."""
+    textos, sem_texto = {}, []
+    for i, pagina in enumerate(doc):
+        if pagina_tem_texto(pagina):
+            textos[i] = pagina.get_text("text")
+        else:
+            sem_texto.append(i)
+    textos_ocr = _ocr_rapido(doc, sem_texto, dpi) if ocr and sem_texto else {}
+
+    paginas = []
+    for i in range(len(doc)):
+        if i in textos:
+            paginas.append(pontuar_texto(i + 1, textos[i]))
+        elif i in textos_ocr:
+            paginas.append(pontuar_texto(i + 1, textos_ocr[i], via="ocr"))
+        else:
+            paginas.append(PaginaPontuada(i + 1, 0, via="sem_texto"))
+    return DeteccaoPaginas(paginas, propor_intervalos(paginas))
@@ -0,0 +1,57 @@
+"""Execução concorrente e limitada de tarefas de I/O (ex.: chamadas ao Document AI).
+
+Os resultados são devolvidos na mesma ordem das entradas, independentemente da
+ordem de conclusão, para que o processamento em lote seja determinístico.
+"""
+import contextvars
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class ResultadoTarefa:
+    indice: int
+    item: Any
+    valor: Any = None
+    erro: BaseException | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.erro is None
+
+
+def executar_em_lote(
+    itens: Iterable[Any],
+    funcao: Callable[[Any], Any],
+    max_concorrencia: int = 4,
+    ao_concluir: Callable[[ResultadoTarefa, int, int], None] | None = None,
+    inicializador: Callable[[], None] | None = None,
+) -> list[ResultadoTarefa]:
+    """Aplica `funcao` a cada item com no máximo `max_concorrencia` execuções simultâneas.
+
+    `ao_concluir(resultado, concluidos, total)` é chamado na thread que invocou esta função,
+    à medida que cada tarefa termina (útil para barras de progresso). Exceções de uma tarefa
+    não interrompem as demais: ficam registradas em `ResultadoTarefa.erro`.
+    """
+    itens = list(itens)
+    total = len(itens)
+    resultados: list[ResultadoTarefa | None] = [None] * total
+    if not itens:
+        return []
+
+    max_concorrencia = max(1, min(int(max_concorrencia), total))
+    with ThreadPoolExecutor(max_workers=max_concorrencia, initializer=inicializador) as pool:
+        # cada tarefa roda numa cópia do contexto de quem chamou (ex.: span corrente do rastreamento)
+        futuros = {pool.submit(contextvars.copy_context().run, funcao, item): i for i, item in enumerate(itens)}
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            try:
+                res = ResultadoTarefa(i, itens[i], valor=futuro.result())
+            except Exception as e:
+                res = ResultadoTarefa(i, itens[i], erro=e)
+            resultados[i] = res
+            if ao_concluir is not None:
+                ao_concluir(res, concluidos, total)
+    return resultados
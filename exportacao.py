@@ -0,0 +1,213 @@
+"""Exportação da base conciliada: Excel em modo de memória constante, Parquet e CSV.
+
+O Excel é escrito linha a linha pelo XlsxWriter com `constant_memory` (cada linha vai para disco
+assim que a seguinte começa), em vez de montar a planilha inteira em memória como o
+`pd.ExcelWriter`. `CacheExportacao` guarda os bytes já gerados por (assinatura dos dados,
+formato, abas), para que os reruns da página (ex.: digitar o nome do arquivo) não refaçam o
+arquivo.
+"""
+import io
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from flags_conciliacao import FLAGS, contar_flags, expandir_flags, mascara_flags
+from rastreamento import atual, rastrear, span
+
+# Abas disponíveis no Excel, na ordem em que aparecem
+ABAS = {
+    "todas": "Conciliação",
+    "divergencias": "Divergências",
+    "flags": "Resumo por flag",
+}
+
+FORMATOS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "csv": ("csv", "text/csv"),
+}
+
+LINHAS_POR_BLOCO = 10_000
+LARGURA_MAXIMA_COLUNA = 60
+
+
+def linhas_com_divergencia(df: pd.DataFrame) -> np.ndarray:
+    """Máscara das linhas com ao menos uma divergência (flags informativas não contam)."""
+    return mascara_flags(df)
+
+
+def resumo_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """Uma linha por flag: quantas linhas marcadas, % do total e os valores cobrado/recalculado envolvidos."""
+    total = len(df)
+    linhas = []
+    for nome, marcadas in contar_flags(df).items():
+        mascara = mascara_flags(df, None if nome == "qualquer" else [nome])
+        linha = {
+            "flag": FLAGS.get(nome, "Qualquer divergência"),
+            "linhas": marcadas,
+            "percentual": round(100 * marcadas / total, 2) if total else 0.0,
+        }
+        for col in ("total_cobrado", "total_recalculado"):
+            if col in df.columns:
+                linha[col] = float(pd.to_numeric(df.loc[mascara, col], errors="coerce").sum())
+        if {"total_cobrado", "total_recalculado"}.issubset(linha):
+            linha["diferenca"] = round(linha["total_cobrado"] - linha["total_recalculado"], 2)
+        linhas.append(linha)
+    return pd.DataFrame(linhas, columns=["flag", "linhas", "percentual", "total_cobrado", "total_recalculado", "diferenca"]).dropna(axis=1, how="all")
+
+
+# =========================
+# EXCEL
+# =========================
+
+def _escrever_aba(workbook, nome: str, df: pd.DataFrame, formato_cabecalho):
+    """Cabeçalho + linhas em ordem, em blocos de `LINHAS_POR_BLOCO` (exigência do modo de memória constante)."""
+    ws = workbook.add_worksheet(nome[:31])
+    for i, col in enumerate(df.columns):
+        ws.set_column(i, i, min(max(len(str(col)) + 2, 12), LARGURA_MAXIMA_COLUNA))
+    ws.write_row(0, 0, [str(c) for c in df.columns], formato_cabecalho)
+    ws.freeze_panes(1, 0)
+    if len(df.columns):
+        ws.autofilter(0, 0, len(df), len(df.columns) - 1)
+
+    # colunas numéricas vão direto para write_number; as demais como texto (sem a inferência de tipo de `write`)
+    numericas = [pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t) for t in df.dtypes]
+    linha = 1
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        bloco = df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+        colunas = [
+            bloco.iloc[:, i].to_numpy(dtype=float, na_value=np.nan).tolist() if numerica
+            else bloco.iloc[:, i].astype(object).where(bloco.iloc[:, i].notna(), None).tolist()
+            for i, numerica in enumerate(numericas)
+        ]
+        for registro in zip(*colunas):
+            for col, (valor, numerica) in enumerate(zip(registro, numericas)):
+                if numerica:
+                    if valor == valor:  # NaN fica em branco
+                        ws.write_number(linha, col, valor)
+                elif valor is not None:
+                    ws.write_string(linha, col, valor if isinstance(valor, str) else str(valor))
+            linha += 1
+
+
+@rastrear("exportacao.excel")
+def gravar_excel(df: pd.DataFrame, caminho, abas=tuple(ABAS)) -> None:
+    """Grava o Excel direto em `caminho`, sem manter a planilha em memória."""
+    atual().definir(linhas=len(df), abas=len(abas))
+    with xlsxwriter.Workbook(str(caminho), {"constant_memory": True, "nan_inf_to_errors": True}) as workbook:
+        cabecalho = workbook.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+        for aba in abas:
+            if aba == "todas":
+                dados = expandir_flags(df)
+            elif aba == "divergencias":
+                dados = expandir_flags(df[linhas_com_divergencia(df)])
+            elif aba == "flags":
+                dados = resumo_flags(df)
+            else:
+                raise ValueError(f"Aba desconhecida: {aba}")
+            _escrever_aba(workbook, ABAS[aba], dados, cabecalho)
+
+
+def gerar_excel(df: pd.DataFrame, abas=tuple(ABAS)) -> bytes:
+    with tempfile.TemporaryDirectory(prefix="exportacao_") as pasta:
+        caminho = Path(pasta) / "conciliacao.xlsx"
+        gravar_excel(df, caminho, abas)
+        return caminho.read_bytes()
+
+
+# =========================
+# PARQUET / CSV
+# =========================
+
+def _para_arquivo(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas de texto com tipos mistos vão como string (o Arrow não aceita objetos heterogêneos)."""
+    cols_objeto = df.columns[df.dtypes == object]
+    if not len(cols_objeto):
+        return df
+    return df.assign(**{col: df[col].astype("string") for col in cols_objeto})
+
+
+@rastrear("exportacao.parquet")
+def gravar_parquet(df: pd.DataFrame, caminho) -> None:
+    """Parquet (zstd), com as flags como colunas booleanas; `caminho` pode ser um arquivo ou um buffer."""
+    atual().definir(linhas=len(df))
+    _para_arquivo(expandir_flags(df, rotulos=None)).to_parquet(caminho, index=False, compression="zstd")
+
+
+def gerar_parquet(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    gravar_parquet(df, buffer)
+    return buffer.getvalue()
+
+
+@rastrear("exportacao.csv")
+def gravar_csv(df: pd.DataFrame, caminho) -> None:
+    """CSV UTF-8, separador vírgula e ponto decimal (para ferramentas de dados, não para o Excel)."""
+    atual().definir(linhas=len(df))
+    expandir_flags(df).to_csv(caminho, index=False, encoding="utf-8")
+
+
+def gerar_csv(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    gravar_csv(df, buffer)
+    return buffer.getvalue()
+
+
+def gerar(df: pd.DataFrame, formato: str, abas=tuple(ABAS)) -> bytes:
+    if formato == "xlsx":
+        return gerar_excel(df, abas)
+    if formato == "parquet":
+        return gerar_parquet(df)
+    if formato == "csv":
+        return gerar_csv(df)
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+
+# =========================
+# CACHE
+# =========================
+
+class CacheExportacao:
+    """Cache LRU em memória dos arquivos gerados, limitado a `limite_bytes`.
+
+    A chave é a assinatura dos dados (ex.: `assinatura_dataframe` ou a chave da memoização da
+    conciliação), o formato e as abas; o DataFrame só é lido quando a chave não está no cache.
+    """
+
+    def __init__(self, limite_bytes: int = 256 * 1024 * 1024):
+        self.limite_bytes = int(limite_bytes)
+        self.acertos = 0
+        self.falhas = 0
+        self._itens: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter_ou_gerar(self, assinatura: str, df: pd.DataFrame, formato: str, abas=tuple(ABAS)) -> bytes:
+        chave = (assinatura, formato, tuple(abas) if formato == "xlsx" else ())
+        with self._lock:
+            dados = self._itens.get(chave)
+            if dados is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return dados
+            self.falhas += 1
+        with span("exportacao", formato=formato, cache=False):
+            dados = gerar(df, formato, abas)
+        with self._lock:
+            self._itens[chave] = dados
+            while len(self._itens) > 1 and sum(map(len, self._itens.values())) > self.limite_bytes:
+                self._itens.popitem(last=False)
+        return dados
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "entradas": len(self._itens),
+                "bytes": sum(map(len, self._itens.values())),
+            }
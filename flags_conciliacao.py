@@ -0,0 +1,98 @@
+"""Flags da conciliação guardadas como máscara de bits numa única coluna `flags` (uint8).
+
+Cada flag é um bit: filtrar por qualquer combinação de flags é um `&` vetorizado sobre a coluna,
+e as contagens por flag saem de uma passada só (`np.unpackbits`). Os rótulos "Sim"/"Não" só
+aparecem em `expandir_flags`, usada na exibição e na exportação.
+"""
+import numpy as np
+import pandas as pd
+
+COLUNA_FLAGS = "flags"
+
+# nome da coluna expandida -> rótulo curto (a ordem define o bit de cada flag; só acrescentar ao final)
+FLAGS = {
+    "flag_sem_correspondencia_contrato": "Sem correspondência no contrato",
+    "flag_valor_divergente": "Valor unitário acima do contrato",
+    "flag_total_recalculado_diferente": "Total recalculado menor que o cobrado",
+    "flag_descricao_duplicada": "Descrição duplicada",
+    "flag_valor_hora_operacional_suporte": "Valor-hora operacional diferente do suporte",
+    "flag_valor_hora_standby_suporte": "Valor-hora standby diferente do suporte",
+    "flag_cobranca_repetida_historico": "Já cobrada em boletim anterior",
+}
+POSICOES = {nome: i for i, nome in enumerate(FLAGS)}
+BITS = {nome: 1 << i for nome, i in POSICOES.items()}
+
+# flags que só são avaliadas quando a coluna indicada existe (ex.: comparação com a documentação suporte)
+REQUER_COLUNA = {
+    "flag_valor_hora_operacional_suporte": "valor_unitario_operacional_suporte",
+    "flag_valor_hora_standby_suporte": "valor_unitario_standby_suporte",
+    "flag_cobranca_repetida_historico": "boletim_duplicado",
+}
+
+# flags informativas: contadas e filtráveis, mas fora de "qualquer" e das divergências
+# (sem correspondência é o esperado com a base de contrato padrão ou com um contrato parcial)
+INFORMATIVAS = {"flag_sem_correspondencia_contrato"}
+DIVERGENCIAS = [nome for nome in FLAGS if nome not in INFORMATIVAS]
+
+
+def marcar(df: pd.DataFrame, nome: str, condicao) -> None:
+    """Liga o bit de `nome` nas linhas em que `condicao` é verdadeira (NaN conta como falso)."""
+    valores = pd.Series(condicao, index=df.index).to_numpy(dtype=bool, na_value=False)
+    atual = df[COLUNA_FLAGS].to_numpy() if COLUNA_FLAGS in df.columns else np.zeros(len(df), dtype=np.uint8)
+    df[COLUNA_FLAGS] = atual | (valores.astype(np.uint8) * np.uint8(BITS[nome]))
+
+
+def desmarcar(df: pd.DataFrame, nome: str) -> None:
+    """Desliga o bit de `nome` em todas as linhas (para reavaliar uma flag sobre o mesmo DataFrame)."""
+    if COLUNA_FLAGS in df.columns:
+        df[COLUNA_FLAGS] = df[COLUNA_FLAGS].to_numpy() & np.uint8(~BITS[nome] & 0xFF)
+
+
+def flags_avaliadas(df: pd.DataFrame) -> list[str]:
+    """Flags que fazem sentido para `df` (as de suporte só existem quando houve suporte)."""
+    if COLUNA_FLAGS not in df.columns:
+        return []
+    return [nome for nome in FLAGS if REQUER_COLUNA.get(nome, COLUNA_FLAGS) in df.columns]
+
+
+def mascara_flags(df: pd.DataFrame, flags=None, todas: bool = False) -> np.ndarray:
+    """Linhas com alguma das `flags` (ou todas, com `todas=True`); sem `flags`, qualquer divergência."""
+    if COLUNA_FLAGS not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    bits = np.uint8(sum(BITS[nome] for nome in (flags or DIVERGENCIAS)))
+    valores = df[COLUNA_FLAGS].to_numpy() & bits
+    return valores == bits if todas else valores != 0
+
+
+def contar_flags(df: pd.DataFrame) -> dict[str, int]:
+    """Linhas marcadas por flag avaliada, mais "qualquer" (linhas com ao menos uma divergência)."""
+    avaliadas = flags_avaliadas(df)
+    if not avaliadas:
+        return {}
+    valores = df[COLUNA_FLAGS].to_numpy(dtype=np.uint8)
+    por_bit = np.unpackbits(valores[:, None], axis=1, bitorder="little").sum(axis=0, dtype=np.int64)
+    contagem = {nome: int(por_bit[POSICOES[nome]]) for nome in avaliadas}
+    contagem["qualquer"] = int(np.count_nonzero(mascara_flags(df)))
+    return contagem
+
+
+def expandir_flags(df: pd.DataFrame, rotulos: tuple[str, str] | None = ("Não", "Sim")) -> pd.DataFrame:
+    """Troca a coluna `flags` por uma coluna `flag_*` por flag avaliada, no mesmo lugar.
+
+    Com `rotulos` (padrão "Não"/"Sim") as colunas são categorias com esses rótulos; com
+    `rotulos=None`, booleanas (para Parquet).
+    """
+    if COLUNA_FLAGS not in df.columns:
+        return df
+    valores = df[COLUNA_FLAGS].to_numpy()
+    colunas = {}
+    for nome in flags_avaliadas(df):
+        marcada = (valores & np.uint8(BITS[nome])) != 0
+        colunas[nome] = (
+            pd.Categorical.from_codes(marcada.astype(np.int8), categories=list(rotulos))
+            if rotulos is not None else marcada
+        )
+    posicao = df.columns.get_loc(COLUNA_FLAGS)
+    antes, depois = df.iloc[:, :posicao], df.iloc[:, posicao + 1:]
+    meio = pd.DataFrame(colunas, index=df.index)
+    return pd.concat([antes, meio, depois], axis=1, copy=False)
@@ -0,0 +1,168 @@
+"""Histórico persistente das linhas conciliadas, para detectar cobranças repetidas entre boletins.
+
+Cada linha vira uma chave de 64 bits: o hash da descrição normalizada, da unidade, da
+competência (período de referência do boletim, "AAAA-MM") e do valor cobrado em centavos.
+As chaves ficam numa tabela SQLite indexada, então a consulta de um boletim novo é uma
+sondagem no índice por linha e não percorre o histórico. Cada acerto informa o boletim
+anterior em que a mesma cobrança apareceu.
+"""
+import datetime as dt
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from correspondencia_aproximada import normalizar_texto
+
+COLUNA_BOLETIM_DUPLICADO = "boletim_duplicado"
+COLUNA_DUPLICADO_EM = "boletim_duplicado_em"
+
+
+def competencia(valor) -> str:
+    """date/datetime/"AAAA-MM"/"AAAA-MM-DD"/"MM/AAAA" -> "AAAA-MM"."""
+    if isinstance(valor, (dt.date, dt.datetime)):
+        return f"{valor.year:04d}-{valor.month:02d}"
+    texto = str(valor).strip()
+    encontrado = re.fullmatch(r"(\d{4})-(\d{1,2})(?:-\d{1,2})?", texto) or re.fullmatch(r"(\d{1,2})/(\d{4})", texto)
+    if encontrado is None:
+        raise ValueError(f"Competência inválida: '{texto}' (use AAAA-MM).")
+    ano, mes = encontrado.groups() if "-" in texto else encontrado.groups()[::-1]
+    if not 1 <= int(mes) <= 12:
+        raise ValueError(f"Competência inválida: '{texto}' (mês {mes}).")
+    return f"{int(ano):04d}-{int(mes):02d}"
+
+
+def _normalizada(serie: pd.Series) -> pd.Series:
+    """`normalizar_texto` calculado uma vez por valor distinto."""
+    texto = serie.astype("string").fillna("")
+    unicos = pd.unique(texto.to_numpy(dtype=object))
+    mapa = {v: normalizar_texto(v) for v in unicos}
+    return texto.map(mapa).astype(object)
+
+
+def chaves_cobranca(df: pd.DataFrame, periodo: str) -> tuple[np.ndarray, np.ndarray]:
+    """(chaves int64, válidas) de cada linha; linhas sem descrição ou sem valor cobrado não são indexadas."""
+    vazia = pd.Series("", index=df.index, dtype=object)
+    # as mesmas colunas de descrição da flag de duplicidade dentro do boletim
+    descricao = (_normalizada(df["descricao"]) if "descricao" in df.columns else vazia).str.cat(
+        _normalizada(df["descricao_completa"]) if "descricao_completa" in df.columns else vazia, sep="|"
+    )
+    unidade = _normalizada(df["unidade"]) if "unidade" in df.columns else vazia
+    valor = pd.to_numeric(df["total_cobrado"], errors="coerce") if "total_cobrado" in df.columns else pd.Series(np.nan, index=df.index)
+    centavos = np.round(valor.to_numpy(dtype=float) * 100)
+    validas = (descricao.to_numpy() != "|") & np.isfinite(centavos)
+    partes = pd.DataFrame({
+        "descricao": descricao.to_numpy(),
+        "unidade": unidade.to_numpy(),
+        "periodo": str(periodo),
+        "centavos": np.where(validas, centavos, 0).astype(np.int64),
+    })
+    chaves = pd.util.hash_pandas_object(partes, index=False).to_numpy().view(np.int64)
+    return chaves, validas
+
+
+class HistoricoCobrancas:
+    """Linhas de boletins já conciliados, indexadas por chave de cobrança (SQLite)."""
+
+    def __init__(self, caminho: str | Path):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cobrancas (
+                    chave INTEGER NOT NULL,
+                    boletim TEXT NOT NULL,
+                    periodo TEXT NOT NULL,
+                    linha INTEGER NOT NULL,
+                    descricao TEXT,
+                    unidade TEXT,
+                    valor REAL,
+                    registrado_em REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_cobrancas_chave ON cobrancas (chave)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_cobrancas_boletim ON cobrancas (boletim)")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:  # commit/rollback
+                yield con
+        finally:
+            con.close()
+
+    def verificar(self, df: pd.DataFrame, boletim: str, periodo: str) -> pd.DataFrame:
+        """Para cada linha de `df`, o boletim anterior (outro que não `boletim`) com a mesma cobrança.
+
+        Devolve um DataFrame alinhado a `df` com `boletim_duplicado` e `boletim_duplicado_em`
+        (data de registro); linhas sem correspondência ficam vazias. Havendo vários, vale o mais antigo.
+        """
+        chaves, validas = chaves_cobranca(df, periodo)
+        resultado = pd.DataFrame(
+            {COLUNA_BOLETIM_DUPLICADO: pd.Series(pd.NA, index=df.index, dtype="string"),
+             COLUNA_DUPLICADO_EM: pd.Series(pd.NA, index=df.index, dtype="string")},
+        )
+        posicoes = np.flatnonzero(validas)
+        if not len(posicoes):
+            return resultado
+        with self._lock, self._conectar() as con:
+            con.execute("CREATE TEMP TABLE consulta (posicao INTEGER, chave INTEGER)")
+            con.executemany("INSERT INTO consulta VALUES (?, ?)", zip(posicoes.tolist(), chaves[posicoes].tolist()))
+            # uma sondagem no índice por linha do boletim; nunca percorre o histórico
+            acertos = con.execute(
+                """
+                SELECT q.posicao, c.boletim, MIN(c.registrado_em)
+                FROM consulta q JOIN cobrancas c INDEXED BY idx_cobrancas_chave ON c.chave = q.chave
+                WHERE c.boletim <> ?
+                GROUP BY q.posicao
+                """,
+                (boletim,),
+            ).fetchall()
+            con.execute("DROP TABLE consulta")
+        if acertos:
+            linhas = np.array([a[0] for a in acertos])
+            resultado.iloc[linhas, 0] = [a[1] for a in acertos]
+            resultado.iloc[linhas, 1] = [time.strftime("%Y-%m-%d", time.localtime(a[2])) for a in acertos]
+        return resultado
+
+    def registrar(self, df: pd.DataFrame, boletim: str, periodo: str) -> int:
+        """Grava as linhas de `boletim` (substituindo um registro anterior do mesmo boletim); devolve quantas."""
+        chaves, validas = chaves_cobranca(df, periodo)
+        posicoes = np.flatnonzero(validas)
+        descricao = df["descricao"].astype("string").fillna("").to_numpy(dtype=object) if "descricao" in df.columns else None
+        unidade = df["unidade"].astype("string").fillna("").to_numpy(dtype=object) if "unidade" in df.columns else None
+        valor = pd.to_numeric(df["total_cobrado"], errors="coerce").to_numpy(dtype=float) if "total_cobrado" in df.columns else None
+        agora = time.time()
+        linhas = [
+            (
+                int(chaves[i]), boletim, str(periodo), int(i),
+                None if descricao is None else descricao[i],
+                None if unidade is None else unidade[i],
+                None if valor is None else float(valor[i]),
+                agora,
+            )
+            for i in posicoes
+        ]
+        with self._lock, self._conectar() as con:
+            con.execute("DELETE FROM cobrancas WHERE boletim = ?", (boletim,))
+            con.executemany("INSERT INTO cobrancas VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+        return len(linhas)
+
+    def remover(self, boletim: str):
+        with self._lock, self._conectar() as con:
+            con.execute("DELETE FROM cobrancas WHERE boletim = ?", (boletim,))
+
+    def estatisticas(self) -> dict:
+        with self._lock, self._conectar() as con:
+            linhas, boletins = con.execute("SELECT COUNT(*), COUNT(DISTINCT boletim) FROM cobrancas").fetchone()
+        return {"linhas": linhas, "boletins": boletins, "bytes": self.caminho.stat().st_size if self.caminho.exists() else 0}
@@ -0,0 +1,218 @@
+"""Ingestão dos PDFs enviados: bytes sem cópia, documentos abertos em cache e recorte de páginas.
+
+`envolver_upload` expõe o buffer de um upload do Streamlit (um `BytesIO`) como `memoryview`, e
+`abrir_arquivo` mapeia um PDF em disco com `mmap`; em nenhum dos casos o conteúdo é copiado.
+`CacheDocumentos` mantém os documentos já abertos por hash de conteúdo, e `recortar` monta o PDF
+com os intervalos pedidos numa única chamada `insert_pdf` por intervalo — ou devolve os próprios
+bytes, sem recorte, quando os intervalos cobrem o documento inteiro. Os recortes são
+determinísticos, e `identidade` dá a chave estável de um recorte (hash do envio + intervalos
+normalizados) para os caches que vêm depois.
+"""
+import hashlib
+import mmap
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import fitz
+
+Intervalo = tuple[int, int]
+
+
+@dataclass(frozen=True)
+class DocumentoEnviado:
+    nome: str
+    dados: memoryview
+    hash: str
+
+    @property
+    def tamanho(self) -> int:
+        return self.dados.nbytes
+
+
+def hash_conteudo(dados) -> str:
+    return hashlib.sha256(dados).hexdigest()
+
+
+def envolver_upload(arquivo) -> DocumentoEnviado:
+    """Upload (`UploadedFile`/`BytesIO`) -> visão do buffer interno, sem `read()`."""
+    dados = arquivo.getbuffer() if hasattr(arquivo, "getbuffer") else memoryview(arquivo.read())
+    return DocumentoEnviado(getattr(arquivo, "name", "documento.pdf"), dados, hash_conteudo(dados))
+
+
+def abrir_arquivo(caminho: str | Path) -> DocumentoEnviado:
+    """PDF em disco mapeado em memória (somente leitura)."""
+    caminho = Path(caminho)
+    with open(caminho, "rb") as f:
+        if caminho.stat().st_size == 0:
+            dados = memoryview(b"")
+        else:
+            dados = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return DocumentoEnviado(caminho.name, dados, hash_conteudo(dados))
+
+
+# =========================
+# INTERVALOS DE PÁGINAS
+# =========================
+
+def interpretar_intervalos(spec: str) -> list[Intervalo]:
+    """"1-3, 7, 10-12" -> [(1, 3), (7, 7), (10, 12)] (1-based); vazio ou "todas" -> [] (documento inteiro)."""
+    texto = str(spec or "").strip().lower()
+    if texto in ("", "todas", "tudo"):
+        return []
+    intervalos = []
+    for parte in re.split(r"[,;]", texto):
+        parte = parte.strip()
+        if not parte:
+            continue
+        m = re.fullmatch(r"(\d+)\s*(?:-\s*(\d+))?", parte)
+        inicio, fim = (int(m.group(1)), int(m.group(2) or m.group(1))) if m else (0, 0)
+        if inicio < 1 or fim < inicio:
+            raise ValueError(f"Intervalo de páginas inválido: {parte!r} (use 'inicio-fim', 1-based)")
+        intervalos.append((inicio, fim))
+    return intervalos
+
+
+def formatar_intervalos(intervalos: list[Intervalo]) -> str:
+    if not intervalos:
+        return "todas"
+    return ", ".join(str(i) if i == f else f"{i}-{f}" for i, f in intervalos)
+
+
+def normalizar_intervalos(intervalos: list[Intervalo], total_paginas: int) -> list[Intervalo]:
+    """Ordena, funde sobreposições e corta no fim do documento; [] -> o documento inteiro."""
+    if not intervalos:
+        return [(1, total_paginas)] if total_paginas else []
+    resultado: list[list[int]] = []
+    for inicio, fim in sorted(intervalos):
+        if inicio > total_paginas:
+            continue
+        fim = min(fim, total_paginas)
+        if resultado and inicio <= resultado[-1][1] + 1:
+            resultado[-1][1] = max(resultado[-1][1], fim)
+        else:
+            resultado.append([inicio, fim])
+    return [(i, f) for i, f in resultado]
+
+
+def _montar_recorte(doc: fitz.Document, intervalos: list[Intervalo]) -> bytes:
+    with fitz.open() as recorte:
+        for inicio, fim in intervalos:
+            recorte.insert_pdf(doc, from_page=inicio - 1, to_page=fim - 1)
+        # sem /ID aleatório: o mesmo recorte gera sempre os mesmos bytes (e a mesma chave de cache)
+        return recorte.tobytes(no_new_id=True)
+
+
+def recortar_pdf(dados, intervalos: list[Intervalo]):
+    """Recorte avulso (sem cache); intervalos que cobrem o documento inteiro devolvem `dados`."""
+    with fitz.open(stream=dados, filetype="pdf") as doc:
+        normalizados = normalizar_intervalos(intervalos, len(doc))
+        if not normalizados:
+            raise ValueError("Nenhuma página do intervalo existe no documento.")
+        if normalizados == [(1, len(doc))]:
+            return dados
+        return _montar_recorte(doc, normalizados)
+
+
+# =========================
+# CACHE DE DOCUMENTOS ABERTOS
+# =========================
+
+class _Aberto:
+    def __init__(self, enviado: DocumentoEnviado):
+        self.enviado = enviado
+        self.doc = fitz.open(stream=enviado.dados, filetype="pdf")
+        self.lock = threading.Lock()  # um fitz.Document não deve ser usado por duas threads ao mesmo tempo
+        self.recortes: OrderedDict[tuple, bytes] = OrderedDict()
+        self.analises: dict = {}
+
+
+class CacheDocumentos:
+    """Documentos abertos por hash de conteúdo (LRU), com os últimos recortes de cada um."""
+
+    def __init__(self, max_documentos: int = 8, max_recortes: int = 4):
+        self.max_documentos = int(max_documentos)
+        self.max_recortes = int(max_recortes)
+        self.aberturas = 0
+        self.reaproveitados = 0
+        self.recortes_reaproveitados = 0
+        self._abertos: OrderedDict[str, _Aberto] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _obter(self, enviado: DocumentoEnviado) -> _Aberto:
+        with self._lock:
+            aberto = self._abertos.get(enviado.hash)
+            if aberto is not None:
+                self._abertos.move_to_end(enviado.hash)
+                self.reaproveitados += 1
+                return aberto
+            aberto = _Aberto(enviado)
+            self.aberturas += 1
+            self._abertos[enviado.hash] = aberto
+            while len(self._abertos) > self.max_documentos:
+                # sem fechar explicitamente: outra thread pode estar usando o documento; fecha quando sair de uso
+                self._abertos.popitem(last=False)
+            return aberto
+
+    def paginas(self, enviado: DocumentoEnviado) -> int:
+        aberto = self._obter(enviado)
+        with aberto.lock:
+            return len(aberto.doc)
+
+    @staticmethod
+    def _normalizar(aberto: _Aberto, intervalos: list[Intervalo]) -> list[Intervalo]:
+        total = len(aberto.doc)
+        normalizados = normalizar_intervalos(intervalos, total)
+        if not normalizados:
+            raise ValueError(f"Nenhuma página de {formatar_intervalos(intervalos)} existe no documento ({total} páginas).")
+        return normalizados
+
+    def identidade(self, enviado: DocumentoEnviado, intervalos: list[Intervalo]) -> str:
+        """Identidade estável do recorte: hash do envio + intervalos normalizados ("<hash>:3-7, 10").
+
+        Não depende dos bytes do recorte, então vale entre processos e depois que o recorte sai do cache.
+        """
+        aberto = self._obter(enviado)
+        with aberto.lock:
+            normalizados = self._normalizar(aberto, intervalos)
+            if normalizados == [(1, len(aberto.doc))]:
+                return enviado.hash
+            return f"{enviado.hash}:{formatar_intervalos(normalizados)}"
+
+    def recortar(self, enviado: DocumentoEnviado, intervalos: list[Intervalo]):
+        """PDF só com as páginas de `intervalos`; sem intervalos (ou cobrindo tudo), os próprios dados de `enviado`."""
+        aberto = self._obter(enviado)
+        with aberto.lock:
+            normalizados = self._normalizar(aberto, intervalos)
+            if normalizados == [(1, len(aberto.doc))]:
+                return enviado.dados
+            chave = tuple(normalizados)
+            dados = aberto.recortes.get(chave)
+            if dados is not None:
+                aberto.recortes.move_to_end(chave)
+                self.recortes_reaproveitados += 1
+                return dados
+            dados = _montar_recorte(aberto.doc, normalizados)
+            aberto.recortes[chave] = dados
+            while len(aberto.recortes) > self.max_recortes:
+                aberto.recortes.popitem(last=False)
+            return dados
+
+    def analisar(self, enviado: DocumentoEnviado, chave, funcao):
+        """`funcao(doc)` sobre o documento aberto, calculada uma vez por documento e `chave`."""
+        aberto = self._obter(enviado)
+        with aberto.lock:
+            if chave not in aberto.analises:
+                aberto.analises[chave] = funcao(aberto.doc)
+            return aberto.analises[chave]
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "documentos": len(self._abertos),
+                "aberturas": self.aberturas,
+                "reaproveitados": self.reaproveitados,
+                "recortes_reaproveitados": self.recortes_reaproveitados,
+            }
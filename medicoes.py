@@ -1,17 +1,36 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import fitz
-from google.cloud import documentai_v1 as documentai
-from google.oauth2 import service_account
-import io
-from PIL import Image
-import pytesseract
-import re
 import ssl
+import datetime as dt
 import json
 import time
 
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from armazem_sessao import ArmazemSessao
+from assinaturas import assinatura_dataframe
+from cache_compartilhado import definir_sessao, sessao_atual
+from catalogo_contrato import CatalogoContrato
+from exportacao import ABAS, FORMATOS, CacheExportacao
+from flags_conciliacao import FLAGS, INFORMATIVAS, contar_flags, expandir_flags, mascara_flags
+from historico_cobrancas import competencia
+from ingestao import DocumentoEnviado, envolver_upload, formatar_intervalos, interpretar_intervalos
+from rastreamento import Execucao, execucao
+from processamento import (
+    Recursos,
+    carregar_contrato,
+    conciliar,
+    contrato_padrao,
+    detectar_paginas_documento,
+    extrair_paginas_documento,
+    paginas_por_via,
+    processar_documento,
+    registrar_historico,
+    sem_historico,
+    unificar_tabelas,
+    verificar_historico,
+)
+
 # =========================
 # CONFIGURAÇÃO GERAL
 # =========================
@@ -23,370 +42,163 @@ try:
 except Exception:
     pass
 
-# =========================
-# FUNÇÕES DE SUPORTE (CREDENCIAIS E PDF)
-# =========================
-
-def gerar_credenciais():
-    """Gera credenciais do Google a partir de st.secrets."""
-    try:
-        private_key = st.secrets["google"]["private_key"].replace("\\n", "\n")
-        info = {
-            "type": st.secrets["google"]["type"],
-            "project_id": st.secrets["google"]["project_id"],
-            "private_key_id": st.secrets["google"]["private_key_id"],
-            "private_key": private_key,
-            "client_email": st.secrets["google"]["client_email"],
-            "client_id": st.secrets["google"]["client_id"],
-            "auth_uri": st.secrets["google"]["auth_uri"],
-            "token_uri": st.secrets["google"]["token_uri"],
-            "auth_provider_x509_cert_url": st.secrets["google"]["auth_provider_x509_cert_url"],
-            "client_x509_cert_url": st.secrets["google"]["client_x509_cert_url"],
-            "universe_domain": st.secrets["google"].get("universe_domain", "googleapis.com"),
-        }
-        return service_account.Credentials.from_service_account_info(info)
-    except Exception as e:
-        st.error(f"Erro ao gerar credenciais: {e}")
-        st.stop()
-
-
-def extrair_paginas_pdf(file_bytes: bytes, pagina_inicio: int, pagina_fim: int) -> bytes | None:
-    """Extrai intervalo [inicio, fim] (1-based) de um PDF e retorna bytes de um PDF temporário."""
-    try:
-        with fitz.open(stream=file_bytes, filetype="pdf") as doc_original:
-            num_paginas = len(doc_original)
-            pdf_temp = fitz.open()
-            for i in range(pagina_inicio - 1, min(pagina_fim, num_paginas)):
-                pdf_temp.insert_pdf(doc_original, from_page=i, to_page=i)
-            temp_bytes = pdf_temp.write()
-            pdf_temp.close()
-        return temp_bytes
-    except Exception as e:
-        st.error(f"Erro ao extrair páginas do PDF: {e}")
-        return None
-
 
-# =========================
-# EXTRAÇÃO (Document AI + OCR FALLBACK)
-# =========================
+@st.cache_resource
+def obter_recursos() -> Recursos:
+    """Agendador, caches e provedor do Document AI do processo, configurados por st.secrets."""
+    return Recursos(st.secrets)
 
-def processar_documento_documentai(pdf_bytes: bytes, processor_id: str, nome_doc: str):
-    """Processa um PDF no Document AI e retorna lista com {documento, tabela: DataFrame}."""
-    credentials = gerar_credenciais()
-    client = documentai.DocumentProcessorServiceClient(credentials=credentials)
-    name = f"projects/{st.secrets['google']['project_id']}/locations/{st.secrets['google']['location']}/processors/{processor_id}"
-    document = {"content": pdf_bytes, "mime_type": "application/pdf"}
-    request = {"name": name, "raw_document": document}
-
-    try:
-        result = client.process_document(request=request)
-    except Exception as e:
-        st.warning(f"⚠️ Document AI falhou para '{nome_doc}'. Será utilizado OCR de fallback.\n{e}")
-        return processar_documento_ocr_fallback(pdf_bytes, nome_doc)
-
-    doc = result.document
-    campos = {}
-
-    # Tenta mapear entities -> colunas
-    if getattr(doc, "entities", None):
-        from collections import defaultdict
-        tmp = defaultdict(list)
-        for entity in doc.entities:
-            field_name = (entity.type_ or "").strip().lower()
-            value = (entity.mention_text or "").strip()
-            if field_name:
-                tmp[field_name].append(value)
-        if tmp:
-            df = pd.DataFrame.from_dict(tmp, orient="index").transpose()
-            return [{"documento": nome_doc, "tabela": df}]
-
-    # Se não há entities utilizáveis, usa texto plano
-    textos = [layout.text_anchor.content for layout in getattr(doc, "text_styles", []) if getattr(layout, "text_anchor", None)]
-    texto_concatenado = "\n".join(textos) if textos else getattr(doc, "text", "")
-    if not texto_concatenado.strip():
-        return processar_documento_ocr_fallback(pdf_bytes, nome_doc)
-
-    df = normalizar_texto_para_dataframe(texto_concatenado)
-    return [{"documento": nome_doc, "tabela": df}]
-
-
-def processar_documento_ocr_fallback(pdf_bytes: bytes, nome_doc: str):
-    """Fallback usando PyMuPDF -> imagens -> Tesseract -> texto -> normalização -> DataFrame."""
-    try:
-        linhas = []
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            for p in doc:
-                pix = p.get_pixmap(dpi=250)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                texto = pytesseract.image_to_string(img, lang="por")
-                linhas.extend(texto.splitlines())
-        df = normalizar_linhas_para_dataframe(linhas)
-        return [{"documento": nome_doc, "tabela": df}]
-    except Exception as e:
-        st.error(f"❌ OCR fallback falhou para '{nome_doc}': {e}")
-        return []
 
+def avisar_st(mensagem: str, nivel: str = "warning"):
+    """Encaminha os avisos do núcleo para a página (st.info / st.warning / st.error)."""
+    getattr(st, nivel)(mensagem)
 
-# =========================
-# NORMALIZAÇÃO E LIMPEZAS
-# =========================
 
-COLUNAS_PADRAO = [
-    'descricao', 'descricao_completa', 'unidade',
-    'qtd_standby', 'qtd_operacional', 'qtd_dobra', 'qtd_total',
-    'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
-    'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado',
-]
-
-COLUNAS_MONETARIAS = [
-    'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
-    'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado'
-]
-
-
-def limpar_moeda(valor):
-    if pd.isna(valor):
-        return None
-    s = str(valor).upper()
-    s = re.sub(r"[^\d,\.]", "", s)
-    # normaliza último ponto como decimal
-    s = s.replace(",", ".")
-    partes = s.split(".")
-    if len(partes) > 2:
-        s = "".join(partes[:-1]) + "." + partes[-1]
-    try:
-        return float(s)
-    except Exception:
-        return None
-
-
-def normalizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [c.strip().lower() for c in df.columns]
-    for col in COLUNAS_PADRAO:
-        if col not in df.columns:
-            df[col] = None
-    df = df[COLUNAS_PADRAO]
-    for col in COLUNAS_MONETARIAS:
-        if col in df.columns:
-            df[col] = df[col].apply(limpar_moeda)
-    return df
-
-
-def normalizar_texto_para_dataframe(texto: str) -> pd.DataFrame:
-    """Heurística simples: quebra por linhas e tenta separar por ; ou múltiplos espaços."""
-    linhas = [l for l in (texto or "").splitlines() if l.strip()]
-    return normalizar_linhas_para_dataframe(linhas)
-
-
-def normalizar_linhas_para_dataframe(linhas: list[str]) -> pd.DataFrame:
-    # Tenta detectar separador
-    registros = []
-    for l in linhas:
-        if ";" in l:
-            partes = [p.strip() for p in l.split(";")]
-        else:
-            partes = re.split(r"\s{2,}", l.strip())
-        if len(partes) >= 3:
-            registros.append(partes)
-    if not registros:
-        return pd.DataFrame(columns=COLUNAS_PADRAO)
-
-    # monta DF bruto e renomeia colunas (best-effort)
-    df = pd.DataFrame(registros)
-    # mapeamento best-effort
-    mapping = {
-        0: 'descricao', 1: 'descricao_completa', 2: 'unidade',
-        3: 'qtd_standby', 4: 'qtd_operacional', 5: 'qtd_dobra', 6: 'qtd_total',
-        7: 'valor_unitario_standby', 8: 'valor_unitario_operacional', 9: 'valor_unitario_dobra',
-        10: 'total_standby', 11: 'total_operacional', 12: 'total_dobra', 13: 'total_he', 14: 'total_cobrado',
-    }
-    df = df.rename(columns={k: v for k, v in mapping.items() if k in df.columns})
-    df = normalizar_colunas(df)
-    return df
+recursos = obter_recursos()
+# [ALTERAÇÃO] tabelas da sessão guardadas compactas (Arrow/categorias) e sem cópias entre páginas
+armazem: ArmazemSessao = st.session_state.setdefault("armazem", ArmazemSessao())
+# [ALTERAÇÃO] sessão identificada (só por hash) na contagem de acessos do cache compartilhado entre sessões
+ctx_sessao = get_script_run_ctx()
+if ctx_sessao is not None:
+    definir_sessao(ctx_sessao.session_id)
 
+# Execuções rastreadas guardadas por sessão (as mais antigas são descartadas)
+LIMITE_EXECUCOES = 20
+# Intervalo de consulta ao progresso de um trabalho em segundo plano
+INTERVALO_ATUALIZACAO_S = 2
 
-# =========================
-# CONCILIAÇÃO (BOLETIM x CONTRATO)
-# =========================
 
-def estruturar_boletim_conciliado(df_boletim_raw: pd.DataFrame, df_contrato: pd.DataFrame) -> pd.DataFrame:
-    df_boletim = df_boletim_raw.copy()
-    df_contrato = df_contrato.copy()
+def guardar_execucao(ex: Execucao):
+    execucoes = st.session_state.setdefault("execucoes", [])
+    execucoes.append(ex)
+    del execucoes[:-LIMITE_EXECUCOES]
 
-    # [ALTERAÇÃO] remove linhas irrelevantes conhecidas
-    if {"descricao"}.issubset(df_boletim.columns):
-        df_boletim = df_boletim[~df_boletim["descricao"].fillna("").str.upper().str.strip().isin(["DIÁRIA (EQUIPAMENTO)", "PRODUTO QUÍMICO"])].copy()
 
-    # chaves de conciliação
-    def chave(df, dcol, ucol):
-        return df[dcol].fillna("").astype(str).str.strip().str.upper() + " - " + df[ucol].fillna("").astype(str).str.strip().str.upper()
-
-    df_boletim["chave_conciliacao"] = chave(df_boletim, "descricao", "unidade")
-    # [ALTERAÇÃO] permite bases de contrato com nomes diversos
-    if "descricao_completa" not in df_contrato.columns and "DESCRICAO_COMPLETA" in df_contrato.columns:
-        df_contrato = df_contrato.rename(columns={"DESCRICAO_COMPLETA": "descricao_completa"})
+def mostrar_execucao(ex: Execucao, chave: str):
+    """Resumo por etapa, árvore de spans e download do JSON de uma execução."""
+    st.caption(f"{ex.nome} — {ex.raiz.duracao or 0:.2f}s, iniciada às {time.strftime('%H:%M:%S', time.localtime(ex.iniciada_em))}")
+    st.dataframe(pd.DataFrame(ex.resumo()).set_index("nome"))
+    linhas = ex.linhas()
+    st.dataframe(pd.DataFrame({
+        "etapa": ["\u2003" * l["profundidade"] + l["nome"] for l in linhas],
+        "duracao_ms": [l["duracao_ms"] for l in linhas],
+        "inicio_ms": [l["inicio_ms"] for l in linhas],
+        "atributos": [json.dumps(l["atributos"], ensure_ascii=False, default=str) for l in linhas],
+        "erro": [l["erro"] for l in linhas],
+    }), hide_index=True)
+    st.download_button(
+        "⬇️ Baixar rastreamento (JSON)",
+        data=ex.para_json(),
+        file_name=f"rastreamento_{ex.nome}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(ex.iniciada_em))}.json",
+        mime="application/json",
+        key=f"baixar_rastreamento_{chave}",
+    )
 
-    df_contrato["chave_conciliacao"] = chave(df_contrato, "descricao_completa", "unidade")
 
-    df_merged = df_boletim.merge(
-        df_contrato,
-        on="chave_conciliacao",
-        how="left",
-        suffixes=("", "_contrato"),
+def trabalho_da_sessao():
+    id_trabalho = st.session_state.get("trabalho_extracao")
+    return recursos.trabalhos.obter(id_trabalho, sessao_atual()) if id_trabalho else None
+
+
+def coletar_extracao() -> bool:
+    """Guarda no armazém (uma única vez) as tabelas do trabalho de extração da sessão que já terminou."""
+    trabalho = trabalho_da_sessao()
+    if trabalho is None or not trabalho.terminado:
+        return False
+    resultados = recursos.trabalhos.coletar(trabalho.id, sessao_atual())
+    if resultados is None:
+        return False
+    tabelas = [item for r in resultados if r.ok for item in r.valor]
+    if tabelas:
+        armazem.guardar("tabelas_extraidas", tabelas)
+    if trabalho.execucao is not None:
+        guardar_execucao(trabalho.execucao)
+    st.session_state["ultima_extracao"] = {"trabalho": trabalho.id, "vias": paginas_por_via(tabelas), "tabelas": len(tabelas)}
+    return True
+
+
+def mostrar_progresso(trabalho):
+    st.progress(
+        trabalho.concluidos / max(trabalho.total, 1),
+        text=f"{trabalho.concluidos}/{trabalho.total} documentos processados — trabalho `{trabalho.id}` ({trabalho.estado})",
     )
-
-    # Conversão segura
-    colunas_float = [
-        'qtd_standby', 'qtd_operacional', 'qtd_dobra', 'qtd_total',
-        'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
-        'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado',
-        'valor_unitario', 'valor_standby'
-    ]
-    for col in colunas_float:
-        if col in df_merged.columns:
-            df_merged[col] = pd.to_numeric(df_merged[col], errors="coerce")
-
-    # total recalculado
-    df_merged["total_recalculado"] = (
-        (df_merged["qtd_total"].fillna(0) * df_merged["valor_unitario_standby"].fillna(0)) +
-        (df_merged["qtd_total"].fillna(0) * df_merged["valor_unitario_operacional"].fillna(0)) +
-        (df_merged["qtd_dobra"].fillna(0) * df_merged["valor_unitario_dobra"].fillna(0)) +
-        df_merged["total_he"].fillna(0)
+    st.dataframe(
+        pd.DataFrame([
+            {
+                "documento": d.nome, "tipo": d.tipo.upper(), "estado": d.estado, "tabelas": d.tabelas,
+                "segundos": d.segundos, "erro": d.erro, "avisos": " | ".join(d.avisos),
+            }
+            for d in trabalho.documentos
+        ]),
+        hide_index=True,
     )
 
-    # flags
-    df_merged["flag_valor_divergente"] = (
-        (np.round(df_merged["valor_unitario_standby"], 2) > np.round(df_merged.get("valor_standby", np.nan), 2)) |
-        (np.round(df_merged["valor_unitario_operacional"], 2) > np.round(df_merged.get("valor_unitario", np.nan), 2))
-    ).fillna(False).map({True: "Sim", False: "Não"})
-
-    df_merged["flag_total_recalculado_diferente"] = (
-        (df_merged["total_recalculado"].fillna(0) < df_merged["total_cobrado"].fillna(0))
-    ).map({True: "Sim", False: "Não"})
 
-    if {"descricao", "descricao_completa"}.issubset(df_merged.columns):
-        df_merged["flag_descricao_duplicada"] = df_merged.duplicated(
-            subset=["descricao", "descricao_completa"], keep=False
-        ).map({True: "Sim", False: "Não"})
+# st.fragment nas versões novas do Streamlit; experimental_fragment nas anteriores
+_fragmento = getattr(st, "fragment", None) or st.experimental_fragment
+
+
+@_fragmento(run_every=INTERVALO_ATUALIZACAO_S)
+def acompanhar_trabalho():
+    """Reexecutado sozinho a cada poucos segundos enquanto o trabalho da sessão não termina."""
+    trabalho = trabalho_da_sessao()
+    if trabalho is None:
+        return
+    mostrar_progresso(trabalho)
+    if trabalho.terminado:
+        coletar_extracao()
+        st.rerun()
+    if st.button("⏹️ Cancelar documentos ainda não iniciados", key=f"cancelar_{trabalho.id}"):
+        recursos.trabalhos.cancelar(trabalho.id, sessao_atual())
+
+
+def painel_extracao():
+    """Progresso do trabalho em andamento ou resumo da última extração coletada."""
+    trabalho = trabalho_da_sessao()
+    if trabalho is not None and not trabalho.terminado:
+        acompanhar_trabalho()
+        return
+    if trabalho is None:
+        return
+    mostrar_progresso(trabalho)
+    ultima = st.session_state.get("ultima_extracao")
+    if not ultima or ultima["trabalho"] != trabalho.id:
+        return
+    vias = ultima["vias"]
+    if trabalho.estado == "falhou":
+        st.error(f"❌ O trabalho falhou: {trabalho.erro}")
+    elif not ultima["tabelas"]:
+        st.warning("⚠️ Nenhuma tabela extraída com sucesso.")
     else:
-        df_merged["flag_descricao_duplicada"] = "Não"
-
-    return df_merged
-
-
-# =========================
-# MULTIAGENTES (NORMALIZAÇÃO → CATÁLOGO → VALIDAÇÃO → REDFLAGS)
-# =========================
-# Observação: mantemos dependência leve de LLM sem alterar seu backend. A função abaixo aceita qualquer cliente compatível
-# com a API de ChatCompletion.create(model=..., messages=[...]).
-
-
-def agente_normalizador(openai_client, nome_doc: str, df_raw: pd.DataFrame) -> pd.DataFrame:
-    """Pede ao LLM para reestruturar a tabela em COLUNAS_PADRAO. Retorna DF padronizado."""
-    try:
-        tabela_texto = df_raw.to_csv(index=False, sep=";")
-        prompt = f"""
-Você é um agente NORMALIZADOR. Reestruture a tabela OCR abaixo no JSON com colunas exatamente:
-{COLUNAS_PADRAO}
-- Use string vazia para texto ausente e 0 para números ausentes.
-- NUNCA adicione colunas extras.
-
-Documento: {nome_doc}
-Tabela extraída (CSV ;):
-{tabela_texto}
-"""
-        resp = openai_client.ChatCompletion.create(
-            model=st.secrets["openai"].get("model", "gpt-4o"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-            max_tokens=4000,
-        )
-        conteudo = resp.choices[0].message["content"].strip()
-        dados = json.loads(conteudo)
-        df = pd.DataFrame(dados)
-        return normalizar_colunas(df)
-    except Exception:
-        # fallback: usa normalização heurística
-        return normalizar_colunas(df_raw)
-
-
-def agente_catalogador(openai_client, df_norm: pd.DataFrame) -> pd.DataFrame:
-    """Gera uma coluna 'categoria_catalogo' (profissional, equipamento, mobilização etc.) para apoiar conferências."""
-    df = df_norm.copy()
-    try:
-        linhas = df[['descricao', 'descricao_completa', 'unidade']].fillna("").astype(str).agg(" | ".join, axis=1).tolist()
-        bloco = "\n".join(f"- {l}" for l in linhas[:120])  # limite de contexto
-        prompt = f"""
-Você é um agente CATALOGADOR. Para cada linha a seguir, classifique em UMA categoria entre:
-["PROFISSIONAL", "EQUIPAMENTO", "MOB/DESMOB", "INSUMO", "OUTROS"].
-Responda APENAS como JSON com uma lista de strings na mesma ordem das linhas.
-Linhas:\n{bloco}
-"""
-        resp = openai_client.ChatCompletion.create(
-            model=st.secrets["openai"].get("model", "gpt-4o"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-            max_tokens=800,
-        )
-        cats = json.loads(resp.choices[0].message["content"].strip())
-        df["categoria_catalogo"] = cats + ["OUTROS"] * max(0, len(df) - len(cats))
-    except Exception:
-        df["categoria_catalogo"] = "OUTROS"
-    return df
-
-
-def agente_validador_redflags(openai_client, df_conciliado: pd.DataFrame, df_suporte: pd.DataFrame | None = None) -> pd.DataFrame:
-    """Compara indicadores e emite redflags estruturadas, incluindo divergência de valor hora vs documentação suporte."""
-    df = df_conciliado.copy()
-
-    # [ALTERAÇÃO] regra programática de divergência de valor-hora usando documentação suporte
-    if df_suporte is not None and not df_suporte.empty:
-        # cria chave compatível
-        def chave(df, dcol, ucol):
-            return df[dcol].fillna("").astype(str).str.strip().str.upper() + " - " + df[ucol].fillna("").astype(str).str.strip().str.upper()
-        df_suporte = df_suporte.copy()
-        df_suporte["chave_conciliacao"] = chave(df_suporte, "descricao_completa", "unidade")
-        cols_map = {
-            "valor_unitario_operacional": "valor_unitario_operacional_suporte",
-            "valor_unitario_standby": "valor_unitario_standby_suporte",
-        }
-        df_sup_mini = df_suporte[["chave_conciliacao", "valor_unitario_operacional", "valor_unitario_standby"]].rename(columns=cols_map)
-        df = df.merge(df_sup_mini, on="chave_conciliacao", how="left")
-
-        # gera flag de divergência de hora (operacional e standby)
-        df["flag_valor_hora_operacional_suporte"] = (
-            np.round(df.get("valor_unitario_operacional"), 2) != np.round(df.get("valor_unitario_operacional_suporte"), 2)
-        ).fillna(False).map({True: "Sim", False: "Não"})
-        df["flag_valor_hora_standby_suporte"] = (
-            np.round(df.get("valor_unitario_standby"), 2) != np.round(df.get("valor_unitario_standby_suporte"), 2)
-        ).fillna(False).map({True: "Sim", False: "Não"})
-
-    # [ALTERAÇÃO] sumarização com LLM (opcional) para relatório objetivo
-    try:
-        resumo_prompt = {
-            "role": "user",
-            "content": (
-                "Você é um agente VALIDADOR. Dado o JSON de linhas conciliadas, aponte redflags objetivas em bullets. "
-                "Foque em: (1) valor hora divergente vs contrato e vs suporte, (2) total recalculado < total cobrado, "
-                "(3) possíveis duplicidades. Responda em 5 bullets no máximo.\n\n" +
-                df.head(60).to_json(orient="records", force_ascii=False)
-            ),
-        }
-        import openai as _openai
-        _openai.api_key = st.secrets["openai"]["OPENAI_API_KEY"]
-        resp = _openai.ChatCompletion.create(
-            model=st.secrets["openai"].get("model", "gpt-4o"),
-            messages=[{"role": "system", "content": "Você é um auditor técnico em contratos."}, resumo_prompt],
-            temperature=0.2,
-            max_tokens=900,
+        st.success(f"✅ Processamento concluído{' (cancelado em parte)' if trabalho.estado == 'cancelado' else ''}!")
+    st.caption(
+        f"📄 Páginas por caminho: {vias['texto_nativo']} texto nativo, "
+        f"{vias['cache']} cache, {vias['compartilhado']} compartilhadas entre sessões, "
+        f"{vias['documentai']} Document AI, {vias['ocr']} OCR"
+    )
+    stats = recursos.cache_extracao.estatisticas()
+    st.caption(
+        f"🗄️ Cache de extração: {stats['acertos']} acertos, {stats['falhas']} falhas, "
+        f"{stats['entradas']} entradas ({stats['bytes'] / 1024 / 1024:.1f} MB de {stats['limite_bytes'] / 1024 / 1024:.0f} MB)"
+    )
+    stats_docs = recursos.documentos.estatisticas()
+    st.caption(
+        f"📂 Documentos abertos em cache: {stats_docs['documentos']} ({stats_docs['aberturas']} aberturas, "
+        f"{stats_docs['reaproveitados']} reaproveitamentos, {stats_docs['recortes_reaproveitados']} recortes reaproveitados)"
+    )
+    if vias["documentai"]:
+        stats_pool = recursos.provedor_documentai.estatisticas()
+        st.caption(
+            f"🔌 Document AI: {stats_pool['canais_criados']} canal(is) criado(s), "
+            f"{stats_pool['canais_reciclados']} reciclado(s), {stats_pool['tokens_emitidos']} token(s) emitido(s) neste processo"
         )
-        st.session_state["resumo_validacao"] = resp.choices[0].message["content"]
-    except Exception:
-        st.session_state["resumo_validacao"] = ""
+    if trabalho.execucao is not None and trabalho.execucao.raiz.duracao is not None:
+        with st.expander(f"⏱️ Tempos desta execução ({trabalho.execucao.raiz.duracao:.1f}s)"):
+            mostrar_execucao(trabalho.execucao, "upload")
 
-    return df
 
+# trabalho de extração terminado enquanto a sessão estava em outra página: recolhe em qualquer rerun
+coletar_extracao()
 
 # =========================
 # INTERFACE
@@ -403,6 +215,63 @@ pagina = st.sidebar.radio(
     ],
 )
 
+with st.sidebar.expander("🚦 Limites de chamadas (Document AI / OpenAI)"):
+    metricas_agendador = recursos.agendador.metricas()
+    st.dataframe(pd.DataFrame(metricas_agendador).T[[
+        "chamadas", "sucessos", "falhas", "retentativas", "fila", "fila_max", "em_execucao",
+        "espera_limite_s", "espera_backoff_s",
+    ]])
+    for nome, m in metricas_agendador.items():
+        if m["ultimo_erro"]:
+            st.caption(f"{nome}: último erro — {m['ultimo_erro']}")
+
+with st.sidebar.expander("⏱️ Tempos por etapa"):
+    execucoes = st.session_state.get("execucoes", [])
+    if not execucoes:
+        st.caption("Nenhuma execução rastreada nesta sessão.")
+    else:
+        escolhida = st.selectbox(
+            "Execução",
+            options=list(range(len(execucoes)))[::-1],
+            format_func=lambda i: f"{execucoes[i].nome} ({time.strftime('%H:%M:%S', time.localtime(execucoes[i].iniciada_em))})",
+        )
+        mostrar_execucao(execucoes[escolhida], "barra_lateral")
+
+with st.sidebar.expander("💾 Memória da sessão"):
+    memoria = armazem.memoria()
+    cache_exportacao = st.session_state.get("cache_exportacao")
+    if cache_exportacao is not None:
+        stats_exportacao = cache_exportacao.estatisticas()
+        memoria.append({"tabela": "arquivos exportados", "linhas": stats_exportacao["entradas"], "bytes": stats_exportacao["bytes"]})
+    total_mb = sum(m["bytes"] for m in memoria) / 1024 / 1024
+    st.caption(f"{total_mb:.1f} MB em tabelas e arquivos desta sessão")
+    if memoria:
+        st.dataframe(
+            pd.DataFrame(memoria).assign(mb=lambda d: (d["bytes"] / 1024 / 1024).round(2)).drop(columns="bytes"),
+            hide_index=True,
+        )
+
+with st.sidebar.expander("🤝 Cache compartilhado do servidor"):
+    compartilhado = recursos.cache_compartilhado
+    if compartilhado is None:
+        st.caption("Desativado (`[cache_compartilhado] ativo = false`).")
+    else:
+        stats_compartilhado = compartilhado.estatisticas()
+        st.caption(
+            f"{stats_compartilhado['acertos']} acertos, {stats_compartilhado['falhas']} falhas, "
+            f"{stats_compartilhado['esperas']} espera(s) por cálculo em andamento, {stats_compartilhado['descartes']} descarte(s); "
+            f"~{stats_compartilhado['segundos_economizados']:.0f}s de extração economizados. "
+            f"{stats_compartilhado['bytes'] / 1024 / 1024:.1f} MB de {stats_compartilhado['limite_bytes'] / 1024 / 1024:.0f} MB"
+        )
+        entradas_compartilhadas = compartilhado.entradas()
+        if entradas_compartilhadas:
+            st.dataframe(
+                pd.DataFrame(entradas_compartilhadas)
+                .assign(mb=lambda d: (d["bytes"] / 1024 / 1024).round(2))
+                .drop(columns=["bytes", "criado_em", "ultimo_acesso"]),
+                hide_index=True,
+            )
+
 # -------------------------
 # UPLOAD
 # -------------------------
@@ -414,13 +283,7 @@ if pagina == "📄 Upload de Documentos":
         options=["Form Parser", "Document OCR", "Custom Extractor"],
     )
 
-    PROCESSOR_IDS = {
-        "Form Parser": st.secrets["google"].get("form_parser_id"),
-        "Document OCR": st.secrets["google"].get("contract_processor"),
-        "Custom Extractor": st.secrets["google"].get("custom_extractor_id", "1dc31710a97ca033"),
-    }
-
-    processor_id = PROCESSOR_IDS.get(tipo_processor)
+    processor_id = recursos.processor_ids().get(tipo_processor)
     if not processor_id:
         st.error(f"❌ Processor ID não encontrado para o tipo selecionado: `{tipo_processor}`.")
         st.stop()
@@ -433,86 +296,148 @@ if pagina == "📄 Upload de Documentos":
     with colC:
         arquivos_suporte = st.file_uploader("🧾 Documentação Suporte (ordens, e-mails, planilhas em PDF)", type=["pdf"], accept_multiple_files=True)
 
+    # [ALTERAÇÃO] uploads embrulhados uma vez por sessão (memoryview do buffer, sem read()) e reaproveitados entre cliques
+    envios = st.session_state.setdefault("envios", {})
+
+    def chave_envio(arquivo):
+        return getattr(arquivo, "file_id", None) or (arquivo.name, arquivo.size)
+
+    def envio(arquivo) -> DocumentoEnviado:
+        chave = chave_envio(arquivo)
+        if chave not in envios:
+            envios[chave] = envolver_upload(arquivo)
+        return envios[chave]
+
+    # descarta os envios de arquivos removidos dos uploaders
+    enviados_agora = {chave_envio(a) for a in [*(arquivos_boletim or []), *(arquivos_contrato or []), *(arquivos_suporte or [])]}
+    for chave in [c for c in envios if c not in enviados_agora]:
+        del envios[chave]
+
+    # [ALTERAÇÃO] sugestão automática das páginas com tabela (texto nativo ou OCR rápido); o usuário pode alterar
+    detectar = st.checkbox(
+        "🧭 Sugerir automaticamente as páginas com tabelas de medição",
+        value=bool(st.secrets.get("deteccao", {}).get("ativa", True)),
+    )
+
+    def sugerir_intervalo(arquivo) -> str:
+        if not detectar:
+            return "1"
+        with st.spinner(f"Procurando tabelas em {arquivo.name}..."):
+            deteccao = detectar_paginas_documento(recursos, envio(arquivo), avisar=avisar_st)
+        if deteccao is None:
+            return "1"
+        detalhe = f" ({deteccao.paginas_ocr} lida(s) por OCR)" if deteccao.paginas_ocr else ""
+        if deteccao.paginas_sem_texto:
+            detalhe += f" — {deteccao.paginas_sem_texto} página(s) sem texto não avaliada(s)"
+        if not deteccao.intervalos:
+            st.caption(f"🧭 {arquivo.name}: {deteccao.resumo()}{detalhe}; confira o intervalo.")
+            return "1"
+        st.caption(f"🧭 {arquivo.name}: sugerido {deteccao.resumo()}{detalhe}")
+        return formatar_intervalos(deteccao.intervalos)
+
     def montar_intervalos(label, arquivos):
         intervalos = {}
         if arquivos:
             st.subheader(label)
             for arquivo in arquivos:
-                c1, c2 = st.columns(2)
-                with c1:
-                    inicio = st.number_input(f"Início ({arquivo.name})", min_value=1, value=1, key=f"ini_{label}_{arquivo.name}")
-                with c2:
-                    fim = st.number_input(f"Fim ({arquivo.name})", min_value=inicio, value=inicio, key=f"fim_{label}_{arquivo.name}")
-                intervalos[arquivo.name] = (inicio, fim)
+                try:
+                    total = recursos.documentos.paginas(envio(arquivo))
+                except Exception as e:
+                    st.error(f"❌ `{arquivo.name}` não pôde ser aberto como PDF: {e}")
+                    continue
+                # a chave muda com a sugestão ligada/desligada; o valor digitado pelo usuário prevalece nos reruns
+                spec = st.text_input(
+                    f"Páginas de {arquivo.name} ({total} no documento)",
+                    value=sugerir_intervalo(arquivo),
+                    key=f"paginas_{label}_{arquivo.name}_{'auto' if detectar else 'manual'}",
+                    help="Intervalos separados por vírgula, ex.: 1-3, 7, 10-12. Vazio ou 'todas' = documento inteiro.",
+                )
+                try:
+                    intervalos[arquivo.name] = interpretar_intervalos(spec)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
         return intervalos
 
     intervalos_boletim = montar_intervalos("🟢 Intervalos de Páginas - Boletins", arquivos_boletim)
     intervalos_contrato = montar_intervalos("🟡 Intervalos de Páginas - Contratos", arquivos_contrato)
     intervalos_suporte = montar_intervalos("🔵 Intervalos de Páginas - Suporte", arquivos_suporte)
 
-    if st.button("🚀 Processar Documentos"):
-        st.subheader("🔎 Extração com Document AI / OCR")
-        tabelas_final = []
+    max_concorrencia = st.number_input(
+        "⚙️ Documentos processados simultaneamente",
+        min_value=1,
+        max_value=32,
+        value=int(st.secrets.get("processamento", {}).get("max_concorrencia", 4)),
+    )
 
-        todos = []
-        for a in arquivos_boletim or []:
-            todos.append((a, intervalos_boletim.get(a.name), "boletim"))
-        for a in arquivos_contrato or []:
-            todos.append((a, intervalos_contrato.get(a.name), "contrato"))
-        for a in arquivos_suporte or []:
-            todos.append((a, intervalos_suporte.get(a.name), "suporte"))
-
-        for arquivo, intervalo, tipo in todos:
-            nome_doc = arquivo.name
-            (inicio, fim) = intervalo or (1, 1)
-            with st.spinner(f"Processando {tipo.upper()}: {nome_doc}..."):
-                try:
-                    file_bytes = arquivo.read()
-                    pdf_bytes = extrair_paginas_pdf(file_bytes, inicio, fim)
-                    if not pdf_bytes:
-                        st.warning(f"⚠️ Não foi possível extrair as páginas de `{nome_doc}`.")
-                        continue
-                    res = processar_documento_documentai(pdf_bytes, processor_id, nome_doc)
-                    for item in res:
-                        item["tipo"] = tipo
-                    tabelas_final.extend(res)
-                except Exception as e:
-                    st.error(f"❌ Falha ao processar `{nome_doc}`: {e}")
+    usar_texto_nativo = st.checkbox(
+        "⚡ Extrair localmente páginas que já possuem camada de texto (sem Document AI/OCR)",
+        value=True,
+    )
 
-        if not tabelas_final:
-            st.warning("⚠️ Nenhuma tabela extraída com sucesso.")
+    # [ALTERAÇÃO] o lote roda em segundo plano (id de trabalho); reruns e troca de página não o interrompem
+    trabalho_atual = trabalho_da_sessao()
+    em_andamento = trabalho_atual is not None and not trabalho_atual.terminado
+    if st.button("🚀 Processar Documentos", disabled=em_andamento):
+        todos = []
+        for arquivos, intervalos, tipo in [
+            (arquivos_boletim, intervalos_boletim, "boletim"),
+            (arquivos_contrato, intervalos_contrato, "contrato"),
+            (arquivos_suporte, intervalos_suporte, "suporte"),
+        ]:
+            for a in arquivos or []:
+                # os bytes (memoryview do envio) são capturados agora: o trabalho não depende mais da página
+                todos.append((a.name, envio(a), intervalos.get(a.name), tipo))
+
+        def processar_arquivo(entrada, avisar):
+            nome_doc, enviado, intervalos, tipo = entrada
+            if intervalos is None:
+                raise ValueError(f"Intervalo de páginas inválido para `{nome_doc}`.")
+            pdf_bytes = extrair_paginas_documento(recursos, enviado, intervalos, avisar=avisar)
+            if not pdf_bytes:
+                raise ValueError(f"Não foi possível extrair as páginas de `{nome_doc}`.")
+            res = processar_documento(
+                recursos, pdf_bytes, processor_id, nome_doc, usar_texto_nativo=usar_texto_nativo, avisar=avisar,
+                origem=recursos.documentos.identidade(enviado, intervalos),
+            )
+            for item in res:
+                item["tipo"] = tipo
+            return res
+
+        if not todos:
+            st.warning("⚠️ Envie ao menos um documento.")
         else:
-            st.success("✅ Processamento concluído!")
-            st.session_state["tabelas_extraidas"] = tabelas_final
+            st.session_state["trabalho_extracao"] = recursos.trabalhos.submeter(
+                todos,
+                processar_arquivo,
+                [(nome, tipo) for nome, _, _, tipo in todos],
+                dono=sessao_atual(),
+                max_concorrencia=max_concorrencia,
+            )
+            st.rerun()
+
+    st.subheader("🔎 Extração com Document AI / OCR")
+    painel_extracao()
 
 # -------------------------
 # VISUALIZAÇÃO
 # -------------------------
 if pagina == "🔎 Visualização":
     st.header("🔎 Visualização das Tabelas Extraídas")
-    if "tabelas_extraidas" not in st.session_state:
+    trabalho_atual = trabalho_da_sessao()
+    if trabalho_atual is not None and not trabalho_atual.terminado:
+        st.info("⏳ Extração em andamento em segundo plano; as tabelas aparecem aqui assim que ela terminar.")
+        acompanhar_trabalho()
+    if "tabelas_extraidas" not in armazem:
         st.warning("⚠️ Nenhuma tabela foi processada ainda. Vá para '📄 Upload de Documentos' e clique em 'Processar Documentos'.")
         st.stop()
 
-    tabelas_extraidas = st.session_state["tabelas_extraidas"]
+    tabelas_extraidas = armazem.obter("tabelas_extraidas")
 
     # aplica normalização por tipo
-    agrupado: dict[str, list[pd.DataFrame]] = {"boletim": [], "contrato": [], "suporte": []}
-    for item in tabelas_extraidas:
-        nome_doc = item["documento"]
-        df_raw = item["tabela"] if isinstance(item.get("tabela"), pd.DataFrame) else pd.DataFrame()
-        if df_raw.empty:
-            continue
-        df_norm = normalizar_colunas(df_raw)
-        agrupado[item.get("tipo", "boletim")].append(df_norm)
-
-    for tipo, lista in agrupado.items():
-        if not lista:
-            continue
-        df_unificado = pd.concat(lista, ignore_index=True)
+    for tipo, df_unificado in unificar_tabelas(tabelas_extraidas, recursos.cache_compartilhado).items():
+        df_unificado = armazem.guardar(f"df_{tipo}_unificado", df_unificado)
         st.markdown(f"### 📄 {tipo.upper()}")
         st.dataframe(df_unificado)
-        st.session_state[f"df_{tipo}_unificado"] = df_unificado
 
 # -------------------------
 # CONCILIAÇÃO / VALIDAÇÃO
@@ -520,48 +445,156 @@ if pagina == "🔎 Visualização":
 if pagina == "⚖️ Conciliação":
     st.header("⚖️ Conciliação entre Boletins, Contrato e Suporte")
 
-    # Base de contrato (fallback) se usuário não carregou uma
-    if "df_contrato_unificado" not in st.session_state:
-        df_contrato = pd.DataFrame([
-            {"ID_ITEM": "1.1", "REFERENCIA": "PROFISSIONAL", "DESCRICAO": "DIÁRIA DE OPERADOR TÉCNICO", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 1672.00, "VALOR_STANDBY": 1337.60},
-            {"ID_ITEM": "1.2", "REFERENCIA": "PROFISSIONAL", "DESCRICAO": "DIÁRIA DE SUPERVISOR", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 1995.00, "VALOR_STANDBY": 1596.00},
-            {"ID_ITEM": "2.1", "REFERENCIA": "LOCAÇÃO DE EQUIPAMENTOS", "DESCRICAO": "DIÁRIA (EQUIPAMENTO)", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 475.00, "VALOR_STANDBY": 403.75},
-            {"ID_ITEM": "3.1", "REFERENCIA": "MOB/DESMOB", "DESCRICAO": "MOBILIZAÇÃO", "UNIDADE": "EVENTO", "VALOR_UNITARIO": 1850.00, "VALOR_STANDBY": 1850.00},
-        ])
-        df_contrato = df_contrato.rename(columns={
-            "REFERENCIA": "descricao",
-            "DESCRICAO": "descricao_completa",
-            "UNIDADE": "unidade",
-            "VALOR_STANDBY": "valor_standby",
-            "VALOR_UNITARIO": "valor_unitario",
-        })
-        st.session_state["df_contrato_unificado"] = normalizar_colunas(df_contrato)
-
-    if "df_boletim_unificado" not in st.session_state:
+    if "df_boletim_unificado" not in armazem:
         st.warning("⚠️ Carregue e visualize Boletins na aba anterior.")
         st.stop()
 
-    df_boletim = st.session_state["df_boletim_unificado"]
-    df_contrato = st.session_state["df_contrato_unificado"]
-    df_suporte = st.session_state.get("df_suporte_unificado", pd.DataFrame())
-
-    df_conciliado = estruturar_boletim_conciliado(df_boletim, df_contrato)
-
-    # Multiagentes (opcional) — normalizador e catalogador sobre boletim
-    try:
-        import openai as _openai
-        _openai.api_key = st.secrets["openai"]["OPENAI_API_KEY"]
-        df_norm = agente_normalizador(_openai, "BOLETIM", df_boletim)
-        df_categ = agente_catalogador(_openai, df_norm)
-        st.session_state["df_boletim_categorizado"] = df_categ
-    except Exception:
-        st.session_state["df_boletim_categorizado"] = df_boletim
-
-    # Validador + RedFlags incluindo comparação com suporte
-    df_validado = agente_validador_redflags(_openai, df_conciliado, df_suporte if not df_suporte.empty else None)
+    df_boletim = armazem.obter("df_boletim_unificado")
+    df_suporte = armazem.obter("df_suporte_unificado", pd.DataFrame())
+
+    # [ALTERAÇÃO] tabela de preços: contrato extraído nesta sessão ou versão salva no repositório (sem nova extração)
+    repositorio = recursos.repositorio_contratos
+    contratos_salvos = repositorio.contratos()
+    df_extraido = armazem.obter("df_contrato_unificado")
+    opcoes_contrato = []
+    if df_extraido is not None:
+        opcoes_contrato.append("📑 Extraído nesta sessão")
+    if contratos_salvos:
+        opcoes_contrato.append("🗄️ Repositório de contratos")
+    # base padrão só quando não há contrato extraído nem salvo
+    origem_contrato = st.radio("Tabela de preços do contrato", opcoes_contrato or ["📋 Base padrão"], horizontal=True)
+
+    if origem_contrato == "🗄️ Repositório de contratos":
+        colA, colB, colC = st.columns(3)
+        with colA:
+            nome_contrato = st.selectbox("Contrato", contratos_salvos)
+        with colB:
+            data_referencia = st.date_input("Data de referência (vigência)", value=dt.date.today(), format="DD/MM/YYYY")
+        versoes_contrato = repositorio.versoes(nome_contrato)
+        with colC:
+            versao_contrato = st.selectbox(
+                "Versão",
+                [None, *(v.versao for v in versoes_contrato)],
+                format_func=lambda v: "Vigente na data" if v is None else next(x.rotulo for x in versoes_contrato if x.versao == v),
+            )
+        try:
+            versao_usada, catalogo = carregar_contrato(recursos, nome_contrato, versao_contrato, data_referencia)
+        except KeyError as e:
+            st.error(f"❌ {e.args[0]}")
+            st.stop()
+        df_contrato = catalogo.tabela
+        st.caption(f"🗄️ Usando {versao_usada.rotulo}")
+    else:
+        df_contrato = df_extraido if df_extraido is not None else contrato_padrao()
+        # [ALTERAÇÃO] catálogo do contrato só é reconstruído quando a tabela do contrato muda
+        catalogo = st.session_state.get("catalogo_contrato")
+        if catalogo is None or not catalogo.valido_para(df_contrato):
+            catalogo = CatalogoContrato(df_contrato)
+            st.session_state["catalogo_contrato"] = catalogo
+        if df_extraido is None:
+            st.caption("📋 Nenhum contrato extraído nem salvo no repositório: usando a base padrão.")
+        else:
+            with st.expander("💾 Salvar este contrato no repositório"):
+                with st.form("salvar_contrato"):
+                    nome_novo = st.text_input("Nome do contrato", placeholder="ex.: CT-4600012345")
+                    colA, colB = st.columns(2)
+                    with colA:
+                        inicio_vigencia = st.date_input("Início da vigência", value=None, format="DD/MM/YYYY")
+                    with colB:
+                        fim_vigencia = st.date_input("Fim da vigência", value=None, format="DD/MM/YYYY")
+                    if st.form_submit_button("💾 Salvar nova versão"):
+                        try:
+                            salvo = repositorio.salvar(nome_novo, df_extraido, inicio_vigencia, fim_vigencia, origem="interface")
+                        except ValueError as e:
+                            st.error(f"❌ {e}")
+                        else:
+                            st.success(f"✅ Salvo: {salvo.rotulo}. Nas próximas revisões, escolha-o no repositório sem reenviar o PDF.")
+
+    # [ALTERAÇÃO] histórico de boletins: linhas já cobradas em outro boletim da mesma competência
+    colA, colB = st.columns(2)
+    with colA:
+        id_boletim = st.text_input("🧾 Identificação do boletim", placeholder="ex.: BM-012/2024").strip()
+    with colB:
+        texto_competencia = st.text_input("📅 Competência (AAAA-MM)", placeholder="ex.: 2024-03").strip()
+    periodo = None
+    if id_boletim and texto_competencia:
+        try:
+            periodo = competencia(texto_competencia)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+    else:
+        st.caption("Informe o boletim e a competência para comparar as linhas com os boletins anteriores do histórico.")
+
+    # [ALTERAÇÃO] memoização do estágio inteiro (conciliação + agentes): interações de UI não refazem chamadas pagas
+    config_modelo = {"model": recursos.modelo}
+    chave_memo = "|".join([
+        assinatura_dataframe(df_boletim),
+        catalogo.assinatura,
+        assinatura_dataframe(df_suporte),
+        json.dumps(config_modelo, sort_keys=True),
+    ])
+    memo = st.session_state.get("conciliacao_memo")
+    recalcular = st.button("🔄 Recalcular conciliação", help="Refaz a conciliação e as chamadas aos agentes mesmo sem mudança nos dados.")
+
+    if recalcular or memo is None or memo["chave"] != chave_memo:
+        with st.spinner("Conciliando e executando agentes..."), execucao("conciliacao", linhas_boletim=len(df_boletim)) as ex_conciliacao:
+            resultado = conciliar(
+                recursos,
+                df_boletim,
+                df_contrato,
+                df_suporte,
+                catalogo=catalogo,
+                openai_client=recursos.cliente_openai(),
+            )
+        guardar_execucao(ex_conciliacao)
+
+        # as tabelas do resultado ficam no armazém; o memo guarda só a chave e os metadados
+        armazem.guardar("df_conciliado_atual", resultado.pop("df_validado"))
+        armazem.guardar("df_boletim_categorizado", resultado.pop("df_boletim_categorizado"))
+        memo = {"chave": chave_memo, **resultado, "calculado_em": time.strftime("%H:%M:%S")}
+        st.session_state["conciliacao_memo"] = memo
+    else:
+        st.caption(f"♻️ Resultado reaproveitado da conciliação calculada às {memo['calculado_em']} (dados inalterados).")
+
+    df_validado = armazem.obter("df_conciliado_atual")
+    # [ALTERAÇÃO] histórico consultado a cada renderização (uma sondagem no índice por linha), fora do estágio
+    # memoizado: boletins registrados depois do cálculo, nesta ou em outra sessão, aparecem sem recalcular
+    df_historico = verificar_historico(recursos, df_validado, id_boletim, periodo) if periodo else sem_historico(df_validado)
+    if df_historico is not df_validado:
+        df_validado = armazem.guardar("df_conciliado_atual", df_historico)
+    st.session_state["resumo_validacao"] = memo["resumo_validacao"]
+    origem_categorias = memo["origem_categorias"]
+    if origem_categorias:
+        st.caption(
+            f"🏷️ Catálogo: {origem_categorias['dicionario']} linha(s) pelo dicionário, {origem_categorias['regras']} por regras, "
+            f"{origem_categorias['llm']} pelo LLM, {origem_categorias['sem_classificacao']} sem classificação"
+        )
+    stats_llm = recursos.cache_llm.estatisticas()
+    st.caption(
+        f"🧠 Cache de LLM: {stats_llm['acertos']} acertos, {stats_llm['falhas']} falhas, "
+        f"~{stats_llm['segundos_economizados']:.0f}s de latência economizados, {stats_llm['entradas']} respostas guardadas"
+    )
 
     st.subheader("📋 Resultado da Conciliação e Validação")
-    st.dataframe(df_validado)
+    contagem_flags = contar_flags(df_validado)
+    if contagem_flags:
+        st.caption("🚩 " + " · ".join(f"{FLAGS[nome]}: {n}" for nome, n in contagem_flags.items() if nome in FLAGS))
+    st.dataframe(expandir_flags(df_validado))
+
+    if periodo:
+        repetidas = contagem_flags.get("flag_cobranca_repetida_historico", 0)
+        if repetidas:
+            anteriores = df_validado["boletim_duplicado"].dropna().value_counts()
+            st.warning(
+                f"⚠️ {repetidas} linha(s) já cobrada(s) em boletins anteriores de {periodo}: "
+                + ", ".join(f"{b} ({n})" for b, n in anteriores.items())
+            )
+        if st.button(
+            f"🗂️ Registrar {id_boletim} no histórico",
+            help="Grava as linhas deste boletim para comparação com os próximos; registrar de novo substitui o registro anterior.",
+        ):
+            linhas_registradas = registrar_historico(recursos, df_validado, id_boletim, periodo)
+            st.success(f"✅ {linhas_registradas} linha(s) de {id_boletim} ({periodo}) registradas no histórico.")
 
     st.markdown("### 🚩 Redflags (resumo do agente)")
     resumo = st.session_state.get("resumo_validacao", "")
@@ -570,36 +603,61 @@ if pagina == "⚖️ Conciliação":
     else:
         st.info("Nenhum resumo disponível.")
 
+    # [ALTERAÇÃO] filtro por qualquer combinação de flags: uma operação sobre a coluna de bits
     if st.checkbox("🔍 Mostrar apenas divergências"):
-        cols_flags = [c for c in df_validado.columns if str(c).startswith("flag_")]
-        mask = np.any(df_validado[cols_flags].eq("Sim"), axis=1) if cols_flags else pd.Series(False, index=df_validado.index)
-        st.dataframe(df_validado[mask])
-
-    st.session_state["df_conciliado_atual"] = df_validado
+        col_flags, col_modo = st.columns([3, 1])
+        avaliadas = [nome for nome in contagem_flags if nome in FLAGS]
+        escolhidas = col_flags.multiselect(
+            "Flags",
+            avaliadas,
+            default=[nome for nome in avaliadas if nome not in INFORMATIVAS],
+            format_func=lambda nome: f"{FLAGS[nome]} ({contagem_flags[nome]})",
+        )
+        modo = col_modo.radio("Linhas com", ["qualquer uma", "todas"], horizontal=True)
+        if escolhidas:
+            filtrado = df_validado[mascara_flags(df_validado, escolhidas, todas=modo == "todas")]
+            st.caption(f"{len(filtrado)} de {len(df_validado)} linha(s)")
+            st.dataframe(expandir_flags(filtrado))
 
 # -------------------------
 # EXPORTAÇÃO
 # -------------------------
 if pagina == "📤 Exportação":
     st.header("📤 Exportação dos Resultados de Conciliação")
-    if "df_conciliado_atual" not in st.session_state:
+    if "df_conciliado_atual" not in armazem:
         st.warning("⚠️ Nenhuma conciliação disponível. Vá para a aba ⚖️ Conciliação para gerar os resultados.")
         st.stop()
 
-    df_export = st.session_state["df_conciliado_atual"]
+    df_export = armazem.obter("df_conciliado_atual")
     st.subheader("📈 Visualização Final")
-    st.dataframe(df_export)
-
-    st.subheader("📥 Baixar Resultado em Excel")
-    nome_arquivo = st.text_input("📂 Nome do arquivo Excel", value="resultado_conciliacao.xlsx")
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-        df_export.to_excel(writer, sheet_name="Conciliação", index=False)
-        # writer.save() não é necessário com context manager
+    st.dataframe(expandir_flags(df_export))
+
+    # [ALTERAÇÃO] arquivos gerados em cache pela chave da conciliação: digitar o nome do arquivo não regera o Excel
+    st.subheader("📥 Baixar Resultado")
+    col_formato, col_abas = st.columns([1, 3])
+    formato = col_formato.radio("Formato", list(FORMATOS), format_func=str.upper)
+    abas = tuple(col_abas.multiselect(
+        "Abas do Excel",
+        list(ABAS),
+        default=list(ABAS),
+        format_func=ABAS.get,
+        disabled=formato != "xlsx",
+    )) or ("todas",)
+    extensao, mime = FORMATOS[formato]
+    nome_arquivo = st.text_input("📂 Nome do arquivo", value=f"resultado_conciliacao.{extensao}")
+
+    cache_exportacao = st.session_state.setdefault("cache_exportacao", CacheExportacao())
+    # a impressão digital da própria tabela conciliada: um recálculo com outro resultado gera novos arquivos
+    assinatura = assinatura_dataframe(df_export)
+    with execucao("exportacao", linhas=len(df_export), formato=formato) as ex_exportacao:
+        dados = cache_exportacao.obter_ou_gerar(assinatura, df_export, formato, abas)
+    if ex_exportacao.raiz.filhos:
+        guardar_execucao(ex_exportacao)
     st.download_button(
-        label="📤 Baixar Arquivo Excel",
-        data=buffer.getvalue(),
+        label=f"📤 Baixar Arquivo {formato.upper()}",
+        data=dados,
         file_name=nome_arquivo,
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mime=mime,
     )
+    stats = cache_exportacao.estatisticas()
+    st.caption(f"💾 {len(dados) / 1024:,.0f} KB · cache de exportação: {stats['acertos']} acertos, {stats['falhas']} gerações")
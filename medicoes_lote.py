@@ -0,0 +1,439 @@
+"""Processamento em lote, sem interface: conciliação de diretórios inteiros de PDFs.
+
+Estrutura esperada da entrada (subpastas `contratos` e `suporte` são opcionais; sem
+contratos é usado o contrato do repositório indicado em `--contrato` ou, sem ele, a base padrão):
+
+    <entrada>/boletins/*.pdf
+    <entrada>/contratos/*.pdf
+    <entrada>/suporte/*.pdf
+
+Uso:
+    python medicoes_lote.py --entrada lote/ --saida resultado/ --trabalhadores 4 \\
+        --paginas "boletim_jan.pdf=3-7,10" --intervalos intervalos.json
+
+`intervalos.json` mapeia nome do arquivo -> "inicio-fim[, inicio-fim...]" (1-based; sem
+intervalo, o documento inteiro — ou, com `--detectar-paginas`, só as páginas em que foram
+detectadas tabelas de medição). Os documentos são extraídos em processos separados; conciliação e agentes rodam no
+processo principal. Em <saida> ficam conciliacao.xlsx / conciliacao.parquet,
+boletim_categorizado.parquet (e conciliacao.csv com `--formatos csv`) e resumo_execucao.json.
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from processamento import (
+    Recursos,
+    avisar_log,
+    carregar_contrato,
+    conciliar,
+    contrato_padrao,
+    detectar_paginas_documento,
+    extrair_paginas_documento,
+    limites_backends,
+    paginas_por_via,
+    processar_documento,
+    registrar_historico,
+    unificar_tabelas,
+)
+from exportacao import ABAS, gravar_csv, gravar_excel, gravar_parquet
+from historico_cobrancas import competencia
+from ingestao import Intervalo, abrir_arquivo, formatar_intervalos, interpretar_intervalos
+from ocr_paralelo import definir_max_processos, nucleos_disponiveis
+from rastreamento import execucao, span
+
+PASTAS = {"boletim": "boletins", "contrato": "contratos", "suporte": "suporte"}
+FORMATOS = ("xlsx", "parquet", "csv")
+PROCESSORS = {"form_parser": "Form Parser", "ocr": "Document OCR", "custom": "Custom Extractor"}
+
+logger = logging.getLogger("medicoes.lote")
+
+
+# =========================
+# CONFIGURAÇÃO
+# =========================
+
+def ler_segredos(caminho: Path) -> dict:
+    """Lê o mesmo secrets.toml usado pela interface; ausente -> configuração vazia."""
+    if not caminho.exists():
+        logger.warning("Arquivo de segredos não encontrado: %s (Document AI e LLM indisponíveis)", caminho)
+        return {}
+    with open(caminho, "rb") as f:
+        return tomllib.load(f)
+
+
+def dividir_limites(segredos: dict, processos: int) -> dict:
+    """Reparte os limites de taxa entre os processos de extração, para o lote respeitar a cota global."""
+    limites = {}
+    for nome, conf in limites_backends(segredos).items():
+        limites[nome] = {
+            **conf,
+            "requisicoes_por_minuto": float(conf["requisicoes_por_minuto"]) / processos,
+            "rajada": max(1, int(conf["rajada"]) // processos),
+            "max_concorrentes": max(1, int(conf["max_concorrentes"]) // processos),
+        }
+    return {**segredos, "limites": limites}
+
+
+def interpretar_intervalo(spec: str) -> list[Intervalo]:
+    """"3-7" -> [(3, 7)]; "1-3, 8" -> [(1, 3), (8, 8)]; "todas" -> [] (documento inteiro)."""
+    try:
+        return interpretar_intervalos(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def carregar_intervalos(arquivo: Path | None, especificacoes: list[str]) -> dict[str, list[Intervalo]]:
+    """Intervalos do JSON e de `--paginas arquivo.pdf=1-3,8` (a linha de comando prevalece)."""
+    intervalos = {}
+    if arquivo is not None:
+        for nome, spec in json.loads(arquivo.read_text(encoding="utf-8")).items():
+            intervalos[nome] = interpretar_intervalo(spec)
+    for item in especificacoes:
+        nome, sep, spec = item.rpartition("=")
+        if not sep or not nome:
+            raise argparse.ArgumentTypeError(f"Use --paginas arquivo.pdf=inicio-fim[,inicio-fim...] (recebido: {item!r})")
+        intervalos[nome] = interpretar_intervalo(spec)
+    return intervalos
+
+
+def listar_documentos(entrada: Path, intervalos: dict[str, list[Intervalo]]) -> list[tuple[str, str, list[Intervalo] | None]]:
+    """(caminho, tipo, intervalo) de cada PDF, em ordem estável (tipo, nome)."""
+    tarefas = []
+    for tipo, pasta in PASTAS.items():
+        diretorio = entrada / pasta
+        arquivos = sorted(p for p in diretorio.iterdir() if p.suffix.lower() == ".pdf") if diretorio.is_dir() else []
+        for caminho in arquivos:
+            tarefas.append((str(caminho), tipo, intervalos.get(caminho.name)))
+    return tarefas
+
+
+# =========================
+# EXTRAÇÃO (PROCESSOS DE TRABALHO)
+# =========================
+
+_recursos_trabalhador: Recursos | None = None
+
+
+def processos_ocr_por_trabalhador(trabalhadores: int) -> int:
+    """Núcleos repartidos entre os trabalhadores: cada um tem o próprio pool de OCR (também usado na detecção de páginas)."""
+    return max(1, nucleos_disponiveis() // max(1, trabalhadores))
+
+
+def _iniciar_trabalhador(segredos: dict, nivel_log: int, processos_ocr: int):
+    global _recursos_trabalhador
+    logging.basicConfig(level=nivel_log, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    definir_max_processos(processos_ocr)
+    _recursos_trabalhador = Recursos(segredos)
+
+
+def _processar_arquivo(tarefa: tuple) -> dict:
+    caminho, tipo, intervalo, processor_id, usar_texto_nativo, detectar = tarefa
+    nome_doc = Path(caminho).name
+    avisos = []
+
+    def avisar(mensagem: str, nivel: str = "warning"):
+        avisos.append(mensagem)
+        avisar_log(f"{nome_doc}: {mensagem}", nivel)
+
+    inicio = time.perf_counter()
+    enviado = abrir_arquivo(caminho)
+    detectado = None
+    if intervalo is None and detectar:
+        deteccao = detectar_paginas_documento(_recursos_trabalhador, enviado, avisar=avisar)
+        if deteccao is not None and deteccao.intervalos:
+            intervalo = detectado = deteccao.intervalos
+            avisar_log(f"{nome_doc}: páginas detectadas {deteccao.resumo()}", "info")
+        elif deteccao is not None:
+            avisar("nenhuma página com tabela detectada; documento inteiro processado")
+    # mmap do arquivo; sem intervalo (ou cobrindo tudo) o documento segue sem recorte nem cópia
+    pdf_bytes = extrair_paginas_documento(_recursos_trabalhador, enviado, intervalo or [], avisar=avisar)
+    if not pdf_bytes:
+        raise ValueError(f"Não foi possível extrair as páginas {formatar_intervalos(intervalo)} de `{nome_doc}`.")
+    tabelas = processar_documento(
+        _recursos_trabalhador, pdf_bytes, processor_id, nome_doc, usar_texto_nativo=usar_texto_nativo, avisar=avisar,
+        origem=_recursos_trabalhador.documentos.identidade(enviado, intervalo or []),
+    )
+    for item in tabelas:
+        item["tipo"] = tipo
+    saida = {"tabelas": tabelas, "avisos": avisos, "segundos": time.perf_counter() - inicio}
+    if detectado is not None:
+        saida["intervalo"] = formatar_intervalos(detectado)
+        saida["intervalo_detectado"] = True
+    return saida
+
+
+def extrair_documentos(tarefas: list[tuple], segredos: dict, trabalhadores: int) -> list[dict]:
+    """Extrai os documentos em `trabalhadores` processos; um registro por documento, na ordem de entrada."""
+    registros = [None] * len(tarefas)
+    if not tarefas:
+        return []
+    trabalhadores = max(1, min(trabalhadores, len(tarefas)))
+    with ProcessPoolExecutor(
+        max_workers=trabalhadores,
+        mp_context=mp.get_context("spawn"),
+        initializer=_iniciar_trabalhador,
+        initargs=(dividir_limites(segredos, trabalhadores), logging.getLogger().level, processos_ocr_por_trabalhador(trabalhadores)),
+    ) as pool:
+        futuros = [pool.submit(_processar_arquivo, t) for t in tarefas]
+        for i, (futuro, tarefa) in enumerate(zip(futuros, tarefas)):
+            caminho, tipo, intervalo = tarefa[:3]
+            registro = {
+                "arquivo": Path(caminho).name,
+                "tipo": tipo,
+                "intervalo": formatar_intervalos(intervalo),
+            }
+            try:
+                saida = futuro.result()
+            except Exception as e:
+                logger.error("❌ Falha ao processar %s: %s", registro["arquivo"], e)
+                registro.update({"ok": False, "erro": f"{type(e).__name__}: {e}", "tabelas": []})
+            else:
+                logger.info("✅ %s: %s (%d tabela(s))", tipo.upper(), registro["arquivo"], len(saida["tabelas"]))
+                registro.update({"ok": True, "erro": "", **saida})
+            registros[i] = registro
+    return registros
+
+
+# =========================
+# EXECUÇÃO
+# =========================
+
+def executar(args: argparse.Namespace) -> int:
+    with execucao("lote", trabalhadores=args.trabalhadores) as ex:
+        codigo, resumo = _executar_etapas(args)
+    if resumo is None:
+        return codigo
+    resumo["rastreamento"] = ex.para_dict()
+    (args.saida / "resumo_execucao.json").write_text(json.dumps(resumo, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    falhas = sum(not d["ok"] for d in resumo["documentos"])
+    logger.info(
+        "Concluído em %.1fs: %d documento(s), %d falha(s), %d linha(s) conciliada(s), %d com divergência -> %s",
+        resumo["duracao_s"], len(resumo["documentos"]), falhas, resumo["linhas"]["conciliadas"],
+        resumo["linhas"]["com_divergencia"], args.saida,
+    )
+    return codigo
+
+
+def _executar_etapas(args: argparse.Namespace) -> tuple[int, dict | None]:
+    inicio_execucao = time.time()
+    etapas = {}
+    segredos = ler_segredos(args.segredos)
+    recursos = Recursos(segredos)
+
+    processor_id = args.processor_id or recursos.processor_ids().get(PROCESSORS[args.processor])
+    if not processor_id and not args.texto_nativo:
+        logger.error("❌ Processor ID não encontrado para o tipo selecionado: %s", args.processor)
+        return 2, None
+
+    # contrato do repositório: os PDFs de contratos/ não são extraídos de novo
+    versao_contrato, catalogo = None, None
+    if args.contrato:
+        try:
+            versao_contrato, catalogo = carregar_contrato(recursos, args.contrato, args.versao_contrato, args.data_referencia)
+        except (KeyError, ValueError) as e:
+            logger.error("❌ %s", e.args[0])
+            return 2, None
+        logger.info("🗄️ Contrato do repositório: %s", versao_contrato.rotulo)
+
+    boletim, periodo = None, None
+    if args.competencia:
+        try:
+            periodo = competencia(args.competencia)
+        except ValueError as e:
+            logger.error("❌ %s", e)
+            return 2, None
+        boletim = args.boletim or args.entrada.resolve().name
+    elif args.registrar_historico:
+        logger.error("❌ --registrar-historico exige --competencia.")
+        return 2, None
+
+    intervalos = carregar_intervalos(args.intervalos, args.paginas)
+    tarefas = [
+        t + (processor_id, args.texto_nativo, args.detectar_paginas)
+        for t in listar_documentos(args.entrada, intervalos)
+        if not (catalogo is not None and t[1] == "contrato")
+    ]
+    if not any(t[1] == "boletim" for t in tarefas):
+        logger.error("❌ Nenhum boletim encontrado em %s", args.entrada / PASTAS["boletim"])
+        return 1, None
+
+    t0 = time.perf_counter()
+    with span("extracao", documentos=len(tarefas)):
+        registros = extrair_documentos(tarefas, segredos, args.trabalhadores)
+    etapas["extracao_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tabelas = [item for r in registros for item in r["tabelas"]]
+    unificado = unificar_tabelas(tabelas)
+    etapas["normalizacao_s"] = time.perf_counter() - t0
+    if "boletim" not in unificado:
+        logger.error("❌ Nenhuma tabela de boletim extraída com sucesso.")
+        return 1, None
+    usa_contrato_padrao = catalogo is None and "contrato" not in unificado
+    if catalogo is not None:
+        df_contrato = catalogo.tabela
+    elif usa_contrato_padrao:
+        logger.warning("⚠️ Nenhum contrato extraído; usando a base de contrato padrão.")
+        if args.salvar_contrato:
+            logger.error("❌ Contrato não salvo no repositório: nenhum contrato extraído de %s", args.entrada / PASTAS["contrato"])
+        df_contrato = contrato_padrao()
+    else:
+        df_contrato = unificado["contrato"]
+        if args.salvar_contrato:
+            try:
+                versao_contrato = recursos.repositorio_contratos.salvar(
+                    args.salvar_contrato, df_contrato, args.vigencia_inicio, args.vigencia_fim, origem=str(args.entrada),
+                )
+            except ValueError as e:
+                logger.error("❌ Contrato não salvo no repositório: %s", e)
+            else:
+                logger.info("💾 Contrato salvo no repositório: %s", versao_contrato.rotulo)
+
+    t0 = time.perf_counter()
+    resultado = conciliar(
+        recursos,
+        unificado["boletim"],
+        df_contrato,
+        unificado.get("suporte"),
+        catalogo=catalogo,
+        openai_client=None if args.sem_llm else recursos.cliente_openai(),
+        boletim=boletim,
+        periodo=periodo,
+    )
+    etapas["conciliacao_s"] = time.perf_counter() - t0
+
+    historico = None
+    if periodo:
+        df_conciliado = resultado["df_validado"]
+        anteriores = df_conciliado["boletim_duplicado"].dropna().value_counts()
+        historico = {
+            "boletim": boletim,
+            "competencia": periodo,
+            "repetidas": resultado["contagem_flags"].get("flag_cobranca_repetida_historico", 0),
+            "boletins_anteriores": {str(b): int(n) for b, n in anteriores.items()},
+            "registradas": None,
+        }
+        if len(anteriores):
+            logger.warning("⚠️ %d linha(s) já cobrada(s) em boletins anteriores de %s: %s", historico["repetidas"], periodo,
+                           ", ".join(f"{b} ({n})" for b, n in historico["boletins_anteriores"].items()))
+        if args.registrar_historico:
+            historico["registradas"] = registrar_historico(recursos, df_conciliado, boletim, periodo)
+            logger.info("🗂️ %d linha(s) de %s (%s) registradas no histórico.", historico["registradas"], boletim, periodo)
+
+    t0 = time.perf_counter()
+    args.saida.mkdir(parents=True, exist_ok=True)
+    df_validado = resultado["df_validado"]
+    saidas = []
+    if "xlsx" in args.formatos:
+        gravar_excel(df_validado, args.saida / "conciliacao.xlsx", args.abas)
+        saidas.append("conciliacao.xlsx")
+    if "parquet" in args.formatos:
+        gravar_parquet(df_validado, args.saida / "conciliacao.parquet")
+        gravar_parquet(resultado["df_boletim_categorizado"], args.saida / "boletim_categorizado.parquet")
+        saidas += ["conciliacao.parquet", "boletim_categorizado.parquet"]
+    if "csv" in args.formatos:
+        gravar_csv(df_validado, args.saida / "conciliacao.csv")
+        saidas.append("conciliacao.csv")
+    etapas["exportacao_s"] = time.perf_counter() - t0
+
+    contagem_flags = resultado["contagem_flags"]
+    resumo = {
+        "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(inicio_execucao)),
+        "duracao_s": time.time() - inicio_execucao,
+        "etapas": etapas,
+        "trabalhadores": args.trabalhadores,
+        "processos_ocr_por_trabalhador": processos_ocr_por_trabalhador(args.trabalhadores),
+        "documentos": [
+            {
+                "arquivo": r["arquivo"],
+                "tipo": r["tipo"],
+                "intervalo": r["intervalo"],
+                "intervalo_detectado": r.get("intervalo_detectado", False),
+                "ok": r["ok"],
+                "erro": r["erro"],
+                "tabelas": len(r["tabelas"]),
+                "paginas_por_via": paginas_por_via(r["tabelas"]),
+                "avisos": r.get("avisos", []),
+                "segundos": r.get("segundos"),
+            }
+            for r in registros
+        ],
+        "paginas_por_via": paginas_por_via(tabelas),
+        "linhas": {
+            **{tipo: len(df) for tipo, df in unificado.items()},
+            "conciliadas": len(df_validado),
+            "com_divergencia": contagem_flags.get("qualquer", 0),
+        },
+        "flags": {nome: n for nome, n in contagem_flags.items() if nome != "qualquer"},
+        "contrato_padrao": usa_contrato_padrao,
+        "contrato_repositorio": None if versao_contrato is None else {
+            "contrato": versao_contrato.contrato,
+            "versao": versao_contrato.versao,
+            "vigencia_inicio": versao_contrato.vigencia_inicio,
+            "vigencia_fim": versao_contrato.vigencia_fim,
+        },
+        "historico": historico,
+        "origem_categorias": resultado["origem_categorias"],
+        "resumo_validacao": resultado["resumo_validacao"],
+        "saidas": saidas,
+    }
+    return 0, resumo
+
+
+def montar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Conciliação em lote de boletins de medição (sem interface).")
+    parser.add_argument("--entrada", type=Path, required=True, help="diretório com as subpastas boletins/, contratos/ e suporte/")
+    parser.add_argument("--saida", type=Path, required=True, help="diretório dos resultados")
+    parser.add_argument("--segredos", type=Path, default=Path(".streamlit/secrets.toml"))
+    parser.add_argument("--processor", choices=sorted(PROCESSORS), default="form_parser", help="tipo de processor do Document AI")
+    parser.add_argument("--processor-id", help="ID do processor (sobrepõe --processor)")
+    parser.add_argument("--intervalos", type=Path, help='JSON {"arquivo.pdf": "inicio-fim[, inicio-fim...]"}')
+    parser.add_argument("--paginas", action="append", default=[], metavar="ARQUIVO=INICIO-FIM[,INICIO-FIM]")
+    parser.add_argument(
+        "--detectar-paginas", action="store_true",
+        help="arquivos sem intervalo: processa só as páginas em que forem detectadas tabelas de medição",
+    )
+    # usar um contrato do repositório dispensa a extração de contratos/, então não há o que salvar
+    origem_contrato = parser.add_mutually_exclusive_group()
+    origem_contrato.add_argument("--contrato", help="usa a tabela de preços deste contrato do repositório (sem extrair contratos/)")
+    parser.add_argument("--versao-contrato", type=int, help="versão do --contrato (padrão: a vigente em --data-referencia)")
+    parser.add_argument("--data-referencia", help="data AAAA-MM-DD para escolher a versão vigente (padrão: hoje)")
+    origem_contrato.add_argument("--salvar-contrato", metavar="NOME", help="salva o contrato extraído de contratos/ como nova versão de NOME")
+    parser.add_argument("--vigencia-inicio", help="início da vigência da versão salva (AAAA-MM-DD)")
+    parser.add_argument("--vigencia-fim", help="fim da vigência da versão salva (AAAA-MM-DD)")
+    parser.add_argument("--competencia", help="competência AAAA-MM do boletim: compara as linhas com o histórico de boletins anteriores")
+    parser.add_argument("--boletim", help="identificação do boletim no histórico (padrão: nome do diretório de entrada)")
+    parser.add_argument("--registrar-historico", action="store_true", help="grava as linhas conciliadas no histórico (exige --competencia)")
+    parser.add_argument(
+        "--trabalhadores", type=int, default=nucleos_disponiveis(),
+        help="processos de extração (os núcleos do OCR são repartidos entre eles)",
+    )
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=["xlsx", "parquet"])
+    parser.add_argument("--abas", nargs="+", choices=list(ABAS), default=list(ABAS), help="abas do Excel")
+    parser.add_argument("--sem-texto-nativo", dest="texto_nativo", action="store_false", help="envia todas as páginas ao Document AI/OCR")
+    parser.add_argument("--sem-llm", action="store_true", help="não chama os agentes de LLM")
+    parser.add_argument("-v", "--verboso", action="store_true")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = montar_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verboso else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    try:
+        return executar(args)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Conversão de valores monetários (formatos brasileiros e internacionais) para float."""
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+
+def limpar_moeda(valor):
+    if pd.isna(valor):
+        return None
+    s = str(valor).upper()
+    s = re.sub(r"[^\d,\.]", "", s)
+    # normaliza último ponto como decimal
+    s = s.replace(",", ".")
+    partes = s.split(".")
+    if len(partes) > 2:
+        s = "".join(partes[:-1]) + "." + partes[-1]
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+
+# Mantissas com até 15 dígitos são exatas em float64; acima disso cai no caminho escalar
+MAX_DIGITOS_VETORIZADO = 15
+_POTENCIAS_10 = 10.0 ** np.arange(0, 23)
+
+
+def converter_moeda_serie(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de `serie.apply(limpar_moeda)`, com a mesma semântica.
+
+    "R$ 1.672,00" -> 1672.0, "1672.00" -> 1672.0, "1.337,6" -> 1337.6, "" / None -> NaN.
+    Assim como `limpar_moeda`, ignora tudo que não for dígito, vírgula ou ponto (inclusive o
+    sinal) e trata o último separador como decimal. Os textos são lidos direto do buffer
+    UTF-8 do Arrow: a mantissa de cada valor é montada com NumPy a partir dos dígitos e
+    dividida por 10^(dígitos após o último separador), o que reproduz o arredondamento de
+    `float(str)`.
+    """
+    if is_numeric_dtype(serie) and not is_bool_dtype(serie):
+        # já numérico: equivale a str() -> limpeza -> float, que perde o sinal e descarta inf
+        valores = serie.astype("float64").abs()
+        return valores.where(np.isfinite(valores))
+
+    n = len(serie)
+    valores = serie.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(valores, skipna=True) not in ("string", "empty"):
+        # tipos mistos: str() como em limpar_moeda ("nan"/"None" não têm dígitos e viram NaN)
+        valores = serie.astype(str).to_numpy(dtype=object)
+    arr = pa.array(valores, type=pa.string(), from_pandas=True)
+    buf_offsets, buf_dados = arr.buffers()[1], arr.buffers()[2]
+    offsets = np.frombuffer(buf_offsets, dtype=np.int32)[arr.offset:arr.offset + n + 1].astype(np.int64)
+    dados = np.frombuffer(buf_dados, dtype=np.uint8)[offsets[0]:offsets[-1]] if buf_dados is not None else np.empty(0, np.uint8)
+    linha = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+
+    # posição do último separador (vírgula ou ponto) de cada valor; -1 se não houver
+    pos_sep = np.flatnonzero((dados == 44) | (dados == 46))
+    linha_sep = linha[pos_sep]
+    ultimo = np.r_[linha_sep[1:] != linha_sep[:-1], True] if len(pos_sep) else np.zeros(0, dtype=bool)
+    ultimo_sep = np.full(n, -1, dtype=np.int64)
+    ultimo_sep[linha_sep[ultimo]] = pos_sep[ultimo]
+
+    digito = dados - np.uint8(48)  # bytes fora de '0'..'9' dão valores >= 10 (aritmética uint8)
+    pos_dig = np.flatnonzero(digito < 10)
+    linha_dig = linha[pos_dig]
+    qtd_digitos = np.bincount(linha_dig, minlength=n)
+    sep_da_linha = ultimo_sep[linha_dig]
+    decimal = (sep_da_linha >= 0) & (pos_dig > sep_da_linha)
+    qtd_decimais = np.bincount(linha_dig[decimal], minlength=n)
+
+    # expoente de cada dígito na mantissa = dígitos restantes à direita dele no mesmo valor
+    digitos_da_linha = qtd_digitos[linha_dig]
+    inicio_linha = np.cumsum(qtd_digitos) - qtd_digitos
+    expoente = digitos_da_linha - (np.arange(len(pos_dig)) - inicio_linha[linha_dig]) - 1
+    longos = np.flatnonzero(qtd_digitos > MAX_DIGITOS_VETORIZADO)
+    if len(longos):
+        curtos = digitos_da_linha <= MAX_DIGITOS_VETORIZADO
+        linha_dig, pos_dig, expoente = linha_dig[curtos], pos_dig[curtos], expoente[curtos]
+    mantissa = np.bincount(linha_dig, weights=digito[pos_dig] * _POTENCIAS_10[expoente], minlength=n)
+    resultado = mantissa / _POTENCIAS_10[np.minimum(qtd_decimais, len(_POTENCIAS_10) - 1)]
+    resultado[qtd_digitos == 0] = np.nan
+    if len(longos):
+        resultado[longos] = [limpar_moeda(v) for v in valores[longos]]
+    return pd.Series(resultado, index=serie.index, name=serie.name, dtype="float64")
@@ -0,0 +1,146 @@
+"""OCR de fallback paralelo por página (PyMuPDF + Tesseract) em um pool de processos.
+
+Cada página é recortada em um PDF de uma página e enviada a um worker, que a
+rasteriza e executa o Tesseract. O pool é único no processo e dimensionado pelos
+núcleos disponíveis (ou por `definir_max_processos`, quando o próprio processo já é um
+de vários trabalhadores); os textos são devolvidos em ordem de página, à medida que
+ficam prontos.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import fitz
+import pytesseract
+from PIL import Image
+
+DPI_PADRAO = 250
+TIMEOUT_PAGINA_PADRAO = 120  # segundos
+# Folga para rasterização e troca de mensagens além do timeout do Tesseract
+FOLGA_TIMEOUT = 30
+
+
+@dataclass
+class PaginaOCR:
+    numero: int  # 1-based
+    texto: str = ""
+    erro: str | None = None
+    segundos: float = 0.0  # rasterização + Tesseract, medidos no worker
+
+
+def nucleos_disponiveis() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_pool: ProcessPoolExecutor | None = None
+_max_processos: int | None = None
+_lock_pool = threading.Lock()
+
+
+def definir_max_processos(processos: int | None):
+    """Limita o pool deste processo (None = núcleos disponíveis); vale para o próximo pool criado."""
+    global _max_processos
+    _max_processos = None if processos is None else max(1, int(processos))
+
+
+def obter_pool() -> ProcessPoolExecutor:
+    """Pool de processos compartilhado (spawn, seguro com as threads do servidor Streamlit)."""
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_max_processos or nucleos_disponiveis(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def encerrar_pool(pool: ProcessPoolExecutor | None = None):
+    """Encerra o pool compartilhado (ou apenas `pool`, se ele ainda for o pool atual)."""
+    global _pool
+    with _lock_pool:
+        if _pool is not None and (pool is None or _pool is pool):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(encerrar_pool)
+
+
+def _ocr_pagina(pagina_pdf: bytes, dpi: int, tons_cinza: bool, lang: str, timeout: float) -> tuple[str, float]:
+    """Executado no worker: rasteriza a única página do PDF e aplica o Tesseract. Retorna (texto, segundos)."""
+    inicio = time.perf_counter()
+    try:
+        with fitz.open(stream=pagina_pdf, filetype="pdf") as doc:
+            pagina = doc[0]
+            if tons_cinza:
+                pix = pagina.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+                img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+            else:
+                pix = pagina.get_pixmap(dpi=dpi, alpha=False)
+                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        return pytesseract.image_to_string(img, lang=lang, timeout=timeout or 0), time.perf_counter() - inicio
+    except Exception as e:
+        # exceções do pytesseract nem sempre são "picklable"; devolve uma exceção simples ao processo pai
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def separar_paginas(pdf_bytes: bytes) -> list[bytes]:
+    """Divide o PDF em uma lista de PDFs de uma página."""
+    paginas = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for i in range(len(doc)):
+            with fitz.open() as unica:
+                unica.insert_pdf(doc, from_page=i, to_page=i)
+                paginas.append(unica.tobytes())
+    return paginas
+
+
+def ocr_paginas(
+    pdf_bytes: bytes,
+    dpi: int = DPI_PADRAO,
+    tons_cinza: bool = False,
+    timeout_pagina: float = TIMEOUT_PAGINA_PADRAO,
+    lang: str = "por",
+) -> Iterator[PaginaOCR]:
+    """Faz OCR de todas as páginas em paralelo e produz os resultados em ordem de página.
+
+    Uma página que exceda `timeout_pagina` (ou falhe) é devolvida com texto vazio e `erro`
+    preenchido, sem interromper as demais.
+    """
+    paginas = separar_paginas(pdf_bytes)
+    try:
+        pool = obter_pool()
+        futuros = [pool.submit(_ocr_pagina, p, dpi, tons_cinza, lang, timeout_pagina) for p in paginas]
+    except BrokenProcessPool:
+        encerrar_pool(pool)
+        pool = obter_pool()
+        futuros = [pool.submit(_ocr_pagina, p, dpi, tons_cinza, lang, timeout_pagina) for p in paginas]
+
+    try:
+        for numero, futuro in enumerate(futuros, start=1):
+            try:
+                texto, segundos = futuro.result(timeout=timeout_pagina + FOLGA_TIMEOUT if timeout_pagina else None)
+                yield PaginaOCR(numero, texto, segundos=segundos)
+            except FuturoTimeout:
+                futuro.cancel()
+                yield PaginaOCR(numero, erro=f"tempo limite de {timeout_pagina}s excedido")
+            except BrokenProcessPool as e:
+                encerrar_pool(pool)
+                yield PaginaOCR(numero, erro=f"pool de OCR interrompido: {e}")
+            except Exception as e:
+                yield PaginaOCR(numero, erro=str(e))
+    finally:
+        # gerador abandonado: não deixa páginas pendentes ocupando o pool
+        for futuro in futuros:
+            futuro.cancel()
@@ -0,0 +1,984 @@
+"""Núcleo do processamento, sem dependência do Streamlit.
+
+Extração (texto nativo / Document AI / OCR) → normalização → conciliação com o contrato →
+agentes (normalizador, catalogador, validador) → exportação. Usado pela interface
+(`medicoes.py`) e pelo processamento em lote (`medicoes_lote.py`).
+
+A configuração é um mapeamento no formato do `.streamlit/secrets.toml` (`st.secrets` ou o
+TOML lido diretamente) e os recursos caros — agendador, caches, provedor do Document AI —
+são criados uma única vez por processo em `Recursos`. Avisos ao usuário saem por um
+callback `avisar(mensagem, nivel)`; por padrão vão para o logging.
+"""
+import json
+import logging
+import re
+import threading
+from collections.abc import Callable, Mapping
+from typing import Any
+
+import fitz
+import numpy as np
+import pandas as pd
+from google.api_core import exceptions as gexc
+
+from agendador import Agendador, ConfigBackend
+from cache_compartilhado import LIMITE_BYTES_PADRAO as LIMITE_COMPARTILHADO_PADRAO, CacheCompartilhado
+from cache_extracao import CacheExtracao, chave_extracao
+from cache_llm import LIMITE_BYTES_PADRAO, TTL_PADRAO, CacheLLM
+from catalogo_contrato import COLUNAS_PRECO, CatalogoContrato, chave_conciliacao
+from catalogo_local import CATEGORIAS, DicionarioCategorias, classificar_linhas
+from clientes_google import ProvedorDocumentAI, obter_provedor
+from deteccao_paginas import DPI_DETECCAO, DeteccaoPaginas, detectar_paginas
+from executor_lote import executar_em_lote
+from flags_conciliacao import contar_flags, desmarcar, expandir_flags, marcar
+from historico_cobrancas import COLUNA_BOLETIM_DUPLICADO, COLUNA_DUPLICADO_EM, HistoricoCobrancas, competencia
+from ingestao import CacheDocumentos, DocumentoEnviado, Intervalo, formatar_intervalos, recortar_pdf
+from moeda import converter_moeda_serie
+from ocr_paralelo import DPI_PADRAO, TIMEOUT_PAGINA_PADRAO, ocr_paginas
+from rastreamento import atual, rastrear, registrar, span
+from repositorio_contratos import RepositorioContratos, VersaoContrato
+from texto_nativo import ClassificacaoPaginas, classificar_paginas, extrair_linhas_documento
+from trabalhos import FilaTrabalhos
+
+logger = logging.getLogger("medicoes")
+
+Avisar = Callable[..., None]
+
+
+def avisar_log(mensagem: str, nivel: str = "warning"):
+    """Destino padrão dos avisos (`nivel` = "info" | "warning" | "error")."""
+    logger.log(logging.getLevelName(nivel.upper()), mensagem)
+
+
+# =========================
+# CONFIGURAÇÃO E RECURSOS DO PROCESSO
+# =========================
+
+def montar_info_service_account(google: Mapping) -> dict:
+    """Monta o dicionário da service account do Google a partir da seção [google] dos segredos."""
+    private_key = google["private_key"].replace("\\n", "\n")
+    return {
+        "type": google["type"],
+        "project_id": google["project_id"],
+        "private_key_id": google["private_key_id"],
+        "private_key": private_key,
+        "client_email": google["client_email"],
+        "client_id": google["client_id"],
+        "auth_uri": google["auth_uri"],
+        "token_uri": google["token_uri"],
+        "auth_provider_x509_cert_url": google["auth_provider_x509_cert_url"],
+        "client_x509_cert_url": google["client_x509_cert_url"],
+        "universe_domain": google.get("universe_domain", "googleapis.com"),
+    }
+
+
+LIMITES_PADRAO = {
+    "documentai": {"requisicoes_por_minuto": 120, "rajada": 10, "max_concorrentes": 8, "tentativas": 5},
+    "openai": {"requisicoes_por_minuto": 60, "rajada": 5, "max_concorrentes": 4, "tentativas": 5},
+}
+
+
+def limites_backends(segredos: Mapping) -> dict[str, dict]:
+    """Limites efetivos por backend: [limites.<backend>] sobre LIMITES_PADRAO."""
+    limites = segredos.get("limites", {}) or {}
+    return {nome: {**padrao, **limites.get(nome, {})} for nome, padrao in LIMITES_PADRAO.items()}
+
+
+class Recursos:
+    """Segredos + recursos compartilhados do processo, criados sob demanda (thread-safe)."""
+
+    def __init__(self, segredos: Mapping):
+        self.segredos = segredos
+        # reentrante: a fábrica de um recurso pode depender de outro (cache_llm -> agendador)
+        self._lock = threading.RLock()
+        self._criados: dict[str, Any] = {}
+
+    def secao(self, nome: str) -> Mapping:
+        return self.segredos.get(nome, {}) or {}
+
+    def _unico(self, nome: str, fabrica: Callable[[], Any]) -> Any:
+        with self._lock:
+            if nome not in self._criados:
+                self._criados[nome] = fabrica()
+            return self._criados[nome]
+
+    @property
+    def agendador(self) -> Agendador:
+        """Limites por backend em [limites.documentai] e [limites.openai]."""
+        return self._unico("agendador", self._criar_agendador)
+
+    def _criar_agendador(self) -> Agendador:
+        import openai as _openai
+
+        retentaveis = {
+            "documentai": (
+                gexc.ResourceExhausted, gexc.TooManyRequests, gexc.ServiceUnavailable,
+                gexc.DeadlineExceeded, gexc.InternalServerError,
+                gexc.Unknown,  # canal derrubado (ver clientes_google.ERROS_CANAL)
+            ),
+            "openai": (
+                _openai.error.RateLimitError, _openai.error.ServiceUnavailableError,
+                _openai.error.APIError, _openai.error.Timeout, _openai.error.APIConnectionError,
+            ),
+        }
+        agendador = Agendador()
+        for nome, conf in limites_backends(self.segredos).items():
+            agendador.registrar(nome, ConfigBackend(
+                requisicoes_por_minuto=float(conf["requisicoes_por_minuto"]),
+                rajada=int(conf["rajada"]),
+                max_concorrentes=int(conf["max_concorrentes"]),
+                tentativas=int(conf["tentativas"]),
+                erros_retentaveis=retentaveis[nome],
+            ))
+        return agendador
+
+    @property
+    def provedor_documentai(self) -> ProvedorDocumentAI:
+        """Provedor (credencial + cliente gRPC) compartilhado pelo processo."""
+        return obter_provedor(montar_info_service_account(self.secao("google")))
+
+    @property
+    def documentos(self) -> CacheDocumentos:
+        """PDFs enviados já abertos, por hash; configurável em [ingestao] max_documentos / max_recortes."""
+        def criar():
+            conf = self.secao("ingestao")
+            return CacheDocumentos(int(conf.get("max_documentos", 8)), int(conf.get("max_recortes", 4)))
+        return self._unico("documentos", criar)
+
+    @property
+    def repositorio_contratos(self) -> RepositorioContratos:
+        """Tabelas de preços versionadas; configurável em [contratos] diretorio / max_catalogos."""
+        def criar():
+            conf = self.secao("contratos")
+            return RepositorioContratos(conf.get("diretorio", "dados/contratos"), int(conf.get("max_catalogos", 8)))
+        return self._unico("repositorio_contratos", criar)
+
+    @property
+    def historico_cobrancas(self) -> HistoricoCobrancas:
+        """Linhas de boletins já conciliados, para detectar cobranças repetidas; [historico] caminho."""
+        return self._unico(
+            "historico_cobrancas",
+            lambda: HistoricoCobrancas(self.secao("historico").get("caminho", "dados/historico_cobrancas.sqlite3")),
+        )
+
+    @property
+    def cache_compartilhado(self) -> CacheCompartilhado | None:
+        """Extrações/normalizações compartilhadas entre sessões; [cache_compartilhado] ativo / limite_mb."""
+        conf = self.secao("cache_compartilhado")
+        if not conf.get("ativo", True):
+            return None
+        return self._unico(
+            "cache_compartilhado",
+            lambda: CacheCompartilhado(int(conf.get("limite_mb", LIMITE_COMPARTILHADO_PADRAO / 1024 / 1024)) * 1024 * 1024),
+        )
+
+    @property
+    def trabalhos(self) -> FilaTrabalhos:
+        """Trabalhos em segundo plano da interface; configurável em [trabalhos] diretorio / max_simultaneos."""
+        def criar():
+            conf = self.secao("trabalhos")
+            return FilaTrabalhos(conf.get("diretorio", ".cache/trabalhos"), int(conf.get("max_simultaneos", 2)))
+        return self._unico("trabalhos", criar)
+
+    @property
+    def cache_extracao(self) -> CacheExtracao:
+        """Configurável em [cache] diretorio / limite_mb."""
+        def criar():
+            conf = self.secao("cache")
+            return CacheExtracao(
+                conf.get("diretorio", ".cache/extracoes"),
+                limite_bytes=int(conf.get("limite_mb", 512)) * 1024 * 1024,
+            )
+        return self._unico("cache_extracao", criar)
+
+    @property
+    def cache_llm(self) -> CacheLLM:
+        """Configurável em [cache_llm] caminho / ttl_horas / limite_mb."""
+        def criar():
+            conf = self.secao("cache_llm")
+            return CacheLLM(
+                conf.get("caminho", ".cache/llm.sqlite3"),
+                ttl=float(conf.get("ttl_horas", TTL_PADRAO / 3600)) * 3600,
+                limite_bytes=int(conf.get("limite_mb", LIMITE_BYTES_PADRAO / 1024 / 1024)) * 1024 * 1024,
+                agendador=self.agendador,
+            )
+        return self._unico("cache_llm", criar)
+
+    @property
+    def dicionario_categorias(self) -> DicionarioCategorias:
+        """Dicionário descrição -> categoria ([catalogo] dicionario)."""
+        return self._unico(
+            "dicionario_categorias",
+            lambda: DicionarioCategorias(self.secao("catalogo").get("dicionario", ".cache/categorias.json")),
+        )
+
+    @property
+    def modelo(self) -> str:
+        return self.secao("openai").get("model", "gpt-4o")
+
+    def cache_llm_ativo(self, agente: str) -> bool:
+        """Permite desligar o cache por agente: `agentes_sem_cache = ["validador"]` em [cache_llm]."""
+        return agente not in self.secao("cache_llm").get("agentes_sem_cache", [])
+
+    def cliente_openai(self):
+        """Módulo `openai` com a chave configurada, ou None se não houver chave."""
+        chave = self.secao("openai").get("OPENAI_API_KEY")
+        if not chave:
+            return None
+        import openai as _openai
+        _openai.api_key = chave
+        return _openai
+
+    def processor_ids(self) -> dict[str, str | None]:
+        google = self.secao("google")
+        return {
+            "Form Parser": google.get("form_parser_id"),
+            "Document OCR": google.get("contract_processor"),
+            "Custom Extractor": google.get("custom_extractor_id", "1dc31710a97ca033"),
+        }
+
+
+# =========================
+# EXTRAÇÃO (TEXTO NATIVO + Document AI + OCR FALLBACK)
+# =========================
+
+@rastrear("fatiar_pdf")
+def extrair_paginas_pdf(file_bytes: bytes, pagina_inicio: int, pagina_fim: int, avisar: Avisar = avisar_log) -> bytes | None:
+    """Extrai intervalo [inicio, fim] (1-based) de um PDF e retorna bytes de um PDF temporário.
+
+    Intervalo que cobre o documento inteiro devolve `file_bytes` sem recortar.
+    """
+    atual().definir(paginas=pagina_fim - pagina_inicio + 1, bytes=len(file_bytes))
+    try:
+        return recortar_pdf(file_bytes, [(pagina_inicio, pagina_fim)])
+    except Exception as e:
+        avisar(f"Erro ao extrair páginas do PDF: {e}", "error")
+        return None
+
+
+@rastrear("fatiar_pdf")
+def extrair_paginas_documento(
+    recursos: Recursos,
+    enviado: DocumentoEnviado,
+    intervalos: list[Intervalo],
+    avisar: Avisar = avisar_log,
+):
+    """Recorte de um PDF enviado com um ou mais intervalos, usando os documentos já abertos em `recursos.documentos`.
+
+    Sem intervalos (ou cobrindo o documento inteiro) devolve os próprios bytes do envio, sem cópia.
+    """
+    atual().definir(documento=enviado.nome, intervalos=formatar_intervalos(intervalos), bytes=enviado.tamanho)
+    try:
+        return recursos.documentos.recortar(enviado, intervalos)
+    except Exception as e:
+        avisar(f"Erro ao extrair páginas de '{enviado.nome}': {e}", "error")
+        return None
+
+
+@rastrear("deteccao_paginas")
+def detectar_paginas_documento(
+    recursos: Recursos,
+    enviado: DocumentoEnviado,
+    ocr: bool | None = None,
+    avisar: Avisar = avisar_log,
+) -> DeteccaoPaginas | None:
+    """Páginas com tabela de medição no envio (uma vez por documento); configurável em [deteccao] ocr / dpi.
+
+    Devolve None se a detecção falhar — o intervalo fica a cargo do usuário.
+    """
+    conf = recursos.secao("deteccao")
+    ocr = bool(conf.get("ocr", True)) if ocr is None else ocr
+    dpi = int(conf.get("dpi", DPI_DETECCAO))
+    try:
+        deteccao = recursos.documentos.analisar(
+            enviado, ("deteccao", ocr, dpi), lambda doc: detectar_paginas(doc, ocr=ocr, dpi=dpi)
+        )
+    except Exception as e:
+        avisar(f"Não foi possível detectar as páginas com tabela de '{enviado.nome}': {e}")
+        return None
+    atual().definir(
+        documento=enviado.nome, paginas=deteccao.total, selecionadas=deteccao.selecionadas,
+        ocr=deteccao.paginas_ocr, intervalos=formatar_intervalos(deteccao.intervalos),
+    )
+    return deteccao
+
+
+@rastrear("documentai")
+def processar_documento_documentai(recursos: Recursos, pdf_bytes: bytes, processor_id: str, nome_doc: str, avisar: Avisar = avisar_log):
+    """Processa um PDF no Document AI e retorna lista com {documento, tabela: DataFrame}."""
+    # [ALTERAÇÃO] evita nova chamada paga quando o mesmo recorte já foi processado por este processor
+    cache = recursos.cache_extracao
+    chave = chave_extracao(pdf_bytes, processor_id)
+    tabelas_cache = cache.obter(chave)
+    atual().definir(documento=nome_doc, cache=tabelas_cache is not None)
+    if tabelas_cache is not None:
+        return [{"documento": nome_doc, "tabela": df, "via": "cache"} for df in tabelas_cache]
+
+    try:
+        google = recursos.secao("google")
+        provedor = recursos.provedor_documentai
+        name = f"projects/{google['project_id']}/locations/{google['location']}/processors/{processor_id}"
+        # a requisição precisa de bytes (um recorte já é bytes; o documento inteiro pode chegar como memoryview)
+        document = {"content": bytes(pdf_bytes) if not isinstance(pdf_bytes, bytes) else pdf_bytes, "mime_type": "application/pdf"}
+        request = {"name": name, "raw_document": document}
+        # [ALTERAÇÃO] cota/429/503 são refeitos com backoff antes de cair no OCR
+        with span("documentai.chamada", bytes=len(pdf_bytes)):
+            result = recursos.agendador.executar("documentai", provedor.process_document, request)
+    except Exception as e:
+        avisar(f"⚠️ Document AI falhou para '{nome_doc}'. Será utilizado OCR de fallback.\n{e}")
+        return processar_documento_ocr_fallback(recursos, pdf_bytes, nome_doc, avisar)
+
+    doc = result.document
+
+    # Tenta mapear entities -> colunas
+    if getattr(doc, "entities", None):
+        from collections import defaultdict
+        tmp = defaultdict(list)
+        for entity in doc.entities:
+            field_name = (entity.type_ or "").strip().lower()
+            value = (entity.mention_text or "").strip()
+            if field_name:
+                tmp[field_name].append(value)
+        if tmp:
+            df = pd.DataFrame.from_dict(tmp, orient="index").transpose()
+            cache.gravar(chave, [df])
+            return [{"documento": nome_doc, "tabela": df, "via": "documentai"}]
+
+    # Se não há entities utilizáveis, usa texto plano
+    textos = [layout.text_anchor.content for layout in getattr(doc, "text_styles", []) if getattr(layout, "text_anchor", None)]
+    texto_concatenado = "\n".join(textos) if textos else getattr(doc, "text", "")
+    if not texto_concatenado.strip():
+        return processar_documento_ocr_fallback(recursos, pdf_bytes, nome_doc, avisar)
+
+    df = normalizar_texto_para_dataframe(texto_concatenado)
+    cache.gravar(chave, [df])
+    return [{"documento": nome_doc, "tabela": df, "via": "documentai"}]
+
+
+@rastrear("ocr")
+def processar_documento_ocr_fallback(recursos: Recursos, pdf_bytes: bytes, nome_doc: str, avisar: Avisar = avisar_log):
+    """Fallback usando PyMuPDF -> imagens -> Tesseract (páginas em paralelo) -> texto -> normalização -> DataFrame."""
+    conf = recursos.secao("ocr")
+    try:
+        linhas = []
+        for pagina in ocr_paginas(
+            pdf_bytes,
+            dpi=int(conf.get("dpi", DPI_PADRAO)),
+            tons_cinza=bool(conf.get("tons_cinza", False)),
+            timeout_pagina=float(conf.get("timeout_pagina", TIMEOUT_PAGINA_PADRAO)),
+        ):
+            registrar("ocr.pagina", pagina.segundos, pagina=pagina.numero, erro=pagina.erro or "")
+            if pagina.erro:
+                avisar(f"⚠️ OCR da página {pagina.numero} de '{nome_doc}' falhou: {pagina.erro}")
+            linhas.extend(pagina.texto.splitlines())
+        df = normalizar_linhas_para_dataframe(linhas)
+        return [{"documento": nome_doc, "tabela": df, "via": "ocr"}]
+    except Exception as e:
+        avisar(f"❌ OCR fallback falhou para '{nome_doc}': {e}", "error")
+        return []
+
+
+@rastrear("documento")
+def processar_documento(
+    recursos: Recursos,
+    pdf_bytes: bytes,
+    processor_id: str,
+    nome_doc: str,
+    usar_texto_nativo: bool = True,
+    avisar: Avisar = avisar_log,
+    origem: str | None = None,
+):
+    """Roteia cada página: com camada de texto -> extração local; digitalizadas -> Document AI / OCR.
+
+    Cada item retornado informa o caminho usado (`via`) e quantas páginas passaram por ele (`paginas`).
+    O resultado é compartilhado entre as sessões do processo pela `origem` do recorte (hash do envio +
+    intervalos, de `CacheDocumentos.identidade`) ou, sem ela, pelo hash dos bytes (`via` "compartilhado"
+    para quem o reaproveita); extrações com avisos (falhas, OCR de fallback) não são compartilhadas.
+    """
+    # [ALTERAÇÃO] mesmo PDF enviado por outro analista (ou em paralelo): reaproveita a extração já feita
+    compartilhado = recursos.cache_compartilhado
+    if compartilhado is None:
+        return _extrair_documento(recursos, pdf_bytes, processor_id, nome_doc, usar_texto_nativo, avisar)
+
+    avisos = []
+
+    def avisar_e_anotar(mensagem: str, nivel: str = "warning"):
+        avisos.append(nivel)
+        avisar(mensagem, nivel)
+
+    def extrair():
+        itens = _extrair_documento(recursos, pdf_bytes, processor_id, nome_doc, usar_texto_nativo, avisar_e_anotar)
+        # o nome do documento é de quem enviou; não fica na entrada compartilhada
+        return [{k: v for k, v in item.items() if k != "documento"} for item in itens]
+
+    conteudo = origem.encode("utf-8") if origem else pdf_bytes
+    chave = chave_extracao(conteudo, f"documento|{processor_id}|texto_nativo={usar_texto_nativo}")
+    itens, reaproveitado = compartilhado.obter_ou_calcular(chave, extrair, guardar=lambda v: bool(v) and not avisos)
+    atual().definir(compartilhado=reaproveitado)
+    return [
+        {
+            **item,
+            "documento": nome_doc,
+            "tabela": item["tabela"].copy(deep=False),
+            "chave_compartilhada": f"{chave}:{i}",
+            **({"via": "compartilhado"} if reaproveitado else {}),
+        }
+        for i, item in enumerate(itens)
+    ]
+
+
+def _extrair_documento(
+    recursos: Recursos,
+    pdf_bytes: bytes,
+    processor_id: str,
+    nome_doc: str,
+    usar_texto_nativo: bool,
+    avisar: Avisar,
+) -> list[dict]:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        total_paginas = len(doc)
+        if not usar_texto_nativo:
+            classif = ClassificacaoPaginas(digitalizadas=list(range(total_paginas)))
+        else:
+            classif = classificar_paginas(doc)
+        atual().definir(
+            documento=nome_doc, paginas=total_paginas,
+            nativas=len(classif.nativas), digitalizadas=len(classif.digitalizadas),
+        )
+        with span("texto_nativo", paginas=len(classif.nativas)):
+            linhas_nativas = extrair_linhas_documento(doc, classif.nativas)
+        if classif.digitalizadas and classif.nativas:
+            doc.select(classif.digitalizadas)
+            # bytes estáveis entre execuções: a chave do cache de extração das páginas digitalizadas se repete
+            pdf_restante = doc.tobytes(no_new_id=True)
+        else:
+            pdf_restante = pdf_bytes if classif.digitalizadas else None
+
+    resultados = []
+    if classif.nativas:
+        df = normalizar_linhas_para_dataframe(linhas_nativas)
+        resultados.append({"documento": nome_doc, "tabela": df, "via": "texto_nativo", "paginas": len(classif.nativas)})
+    if pdf_restante is not None:
+        for item in processar_documento_documentai(recursos, pdf_restante, processor_id, nome_doc, avisar):
+            item["paginas"] = len(classif.digitalizadas)
+            resultados.append(item)
+    return resultados
+
+
+def paginas_por_via(tabelas: list[dict]) -> dict[str, int]:
+    """Quantas páginas seguiram cada caminho de extração."""
+    contagem = {"texto_nativo": 0, "cache": 0, "compartilhado": 0, "documentai": 0, "ocr": 0}
+    for item in tabelas:
+        contagem[item["via"]] = contagem.get(item["via"], 0) + item.get("paginas", 0)
+    return contagem
+
+
+# =========================
+# NORMALIZAÇÃO E LIMPEZAS
+# =========================
+
+COLUNAS_PADRAO = [
+    'descricao', 'descricao_completa', 'unidade',
+    'qtd_standby', 'qtd_operacional', 'qtd_dobra', 'qtd_total',
+    'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
+    'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado',
+]
+
+COLUNAS_MONETARIAS = [
+    'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
+    'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado'
+]
+
+
+def normalizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy(deep=False)
+    df.columns = [c.strip().lower() for c in df.columns]
+    for col in COLUNAS_PADRAO:
+        if col not in df.columns:
+            df[col] = None
+    df = df[COLUNAS_PADRAO]
+    for col in COLUNAS_MONETARIAS:
+        if col in df.columns:
+            df[col] = converter_moeda_serie(df[col])
+    return df
+
+
+def normalizar_texto_para_dataframe(texto: str) -> pd.DataFrame:
+    """Heurística simples: quebra por linhas e tenta separar por ; ou múltiplos espaços."""
+    linhas = [l for l in (texto or "").splitlines() if l.strip()]
+    return normalizar_linhas_para_dataframe(linhas)
+
+
+def normalizar_linhas_para_dataframe(linhas: list[str]) -> pd.DataFrame:
+    # Tenta detectar separador
+    registros = []
+    for l in linhas:
+        if ";" in l:
+            partes = [p.strip() for p in l.split(";")]
+        else:
+            partes = re.split(r"\s{2,}", l.strip())
+        if len(partes) >= 3:
+            registros.append(partes)
+    if not registros:
+        return pd.DataFrame(columns=COLUNAS_PADRAO)
+
+    # monta DF bruto e renomeia colunas (best-effort)
+    df = pd.DataFrame(registros)
+    # mapeamento best-effort
+    mapping = {
+        0: 'descricao', 1: 'descricao_completa', 2: 'unidade',
+        3: 'qtd_standby', 4: 'qtd_operacional', 5: 'qtd_dobra', 6: 'qtd_total',
+        7: 'valor_unitario_standby', 8: 'valor_unitario_operacional', 9: 'valor_unitario_dobra',
+        10: 'total_standby', 11: 'total_operacional', 12: 'total_dobra', 13: 'total_he', 14: 'total_cobrado',
+    }
+    df = df.rename(columns={k: v for k, v in mapping.items() if k in df.columns})
+    df = normalizar_colunas(df)
+    return df
+
+
+@rastrear("normalizacao")
+def unificar_tabelas(tabelas: list[dict], compartilhado: CacheCompartilhado | None = None) -> dict[str, pd.DataFrame]:
+    """Normaliza as tabelas extraídas e concatena por tipo (boletim / contrato / suporte).
+
+    Com `compartilhado`, a normalização de tabelas vindas de `processar_documento` é feita uma vez por processo.
+    """
+    agrupado: dict[str, list[pd.DataFrame]] = {"boletim": [], "contrato": [], "suporte": []}
+    for item in tabelas:
+        df_raw = item["tabela"] if isinstance(item.get("tabela"), pd.DataFrame) else pd.DataFrame()
+        if df_raw.empty:
+            continue
+        chave = item.get("chave_compartilhada")
+        if compartilhado is not None and chave:
+            df_norm, _ = compartilhado.obter_ou_calcular(f"normalizacao|{chave}", lambda: normalizar_colunas(df_raw))
+            df_norm = df_norm.copy(deep=False)
+        else:
+            df_norm = normalizar_colunas(df_raw)
+        agrupado[item.get("tipo", "boletim")].append(df_norm)
+    return {tipo: pd.concat(lista, ignore_index=True) for tipo, lista in agrupado.items() if lista}
+
+
+@rastrear("contrato.carregar")
+def carregar_contrato(recursos: Recursos, contrato: str, versao: int | None = None, data=None) -> tuple[VersaoContrato, CatalogoContrato]:
+    """Catálogo de uma versão do repositório de contratos (sem `versao`, a vigente em `data`)."""
+    registro, catalogo = recursos.repositorio_contratos.catalogo(contrato, versao, data)
+    atual().definir(contrato=registro.contrato, versao=registro.versao, itens=len(catalogo))
+    return registro, catalogo
+
+
+def contrato_padrao() -> pd.DataFrame:
+    """Base de contrato (fallback) usada quando nenhum contrato foi carregado nem há contrato no repositório."""
+    df_contrato = pd.DataFrame([
+        {"ID_ITEM": "1.1", "REFERENCIA": "PROFISSIONAL", "DESCRICAO": "DIÁRIA DE OPERADOR TÉCNICO", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 1672.00, "VALOR_STANDBY": 1337.60},
+        {"ID_ITEM": "1.2", "REFERENCIA": "PROFISSIONAL", "DESCRICAO": "DIÁRIA DE SUPERVISOR", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 1995.00, "VALOR_STANDBY": 1596.00},
+        {"ID_ITEM": "2.1", "REFERENCIA": "LOCAÇÃO DE EQUIPAMENTOS", "DESCRICAO": "DIÁRIA (EQUIPAMENTO)", "UNIDADE": "DIÁRIA", "VALOR_UNITARIO": 475.00, "VALOR_STANDBY": 403.75},
+        {"ID_ITEM": "3.1", "REFERENCIA": "MOB/DESMOB", "DESCRICAO": "MOBILIZAÇÃO", "UNIDADE": "EVENTO", "VALOR_UNITARIO": 1850.00, "VALOR_STANDBY": 1850.00},
+    ])
+    df_contrato = df_contrato.rename(columns={
+        "REFERENCIA": "descricao",
+        "DESCRICAO": "descricao_completa",
+        "UNIDADE": "unidade",
+        "VALOR_STANDBY": "valor_standby",
+        "VALOR_UNITARIO": "valor_unitario",
+    })
+    return normalizar_colunas(df_contrato)
+
+
+# =========================
+# CONCILIAÇÃO (BOLETIM x CONTRATO)
+# =========================
+
+# Similaridade mínima para adotar os preços do item sugerido quando a chave não casa exatamente
+LIMIAR_SIMILARIDADE_CONTRATO = 0.85
+
+
+@rastrear("conciliacao.estruturar")
+def estruturar_boletim_conciliado(
+    df_boletim_raw: pd.DataFrame,
+    df_contrato: pd.DataFrame,
+    catalogo: CatalogoContrato | None = None,
+    limiar_similaridade: float = LIMIAR_SIMILARIDADE_CONTRATO,
+) -> pd.DataFrame:
+    df_boletim = df_boletim_raw.copy(deep=False)
+    # [ALTERAÇÃO] chaves e índice do contrato vêm prontos do catálogo (reaproveitado entre boletins/reruns)
+    if catalogo is None:
+        catalogo = CatalogoContrato(df_contrato)
+
+    # [ALTERAÇÃO] remove linhas irrelevantes conhecidas
+    if {"descricao"}.issubset(df_boletim.columns):
+        df_boletim = df_boletim[~df_boletim["descricao"].astype("string").fillna("").str.upper().str.strip().isin(["DIÁRIA (EQUIPAMENTO)", "PRODUTO QUÍMICO"])].copy(deep=False)
+
+    atual().definir(linhas=len(df_boletim), itens_contrato=len(catalogo))
+    df_boletim["chave_conciliacao"] = chave_conciliacao(df_boletim, "descricao", "unidade")
+    with span("conciliacao.juntar"):
+        df_merged = catalogo.juntar(df_boletim)
+
+    # [ALTERAÇÃO] chaves sem correspondência exata: busca o item mais parecido do contrato (trigramas + blocagem por unidade)
+    sem_correspondencia = ~df_merged["chave_conciliacao"].isin(catalogo.indice)
+    df_merged["chave_contrato_sugerida"] = df_merged["chave_conciliacao"].where(~sem_correspondencia)
+    df_merged["similaridade_chave"] = np.where(sem_correspondencia, 0.0, 1.0)
+    if sem_correspondencia.any() and len(catalogo):
+        with span("conciliacao.aproximada", linhas=int(sem_correspondencia.sum())):
+            sugestoes = catalogo.sugerir(df_merged.loc[sem_correspondencia, "descricao"], df_merged.loc[sem_correspondencia, "unidade"])
+        df_merged.loc[sem_correspondencia, "chave_contrato_sugerida"] = sugestoes["chave_contrato_sugerida"]
+        df_merged.loc[sem_correspondencia, "similaridade_chave"] = sugestoes["similaridade"].round(3)
+        aceitas = sugestoes[(sugestoes["posicao"] >= 0) & (sugestoes["similaridade"] >= limiar_similaridade)]
+        for col in [c for c in COLUNAS_PRECO if c in catalogo.tabela.columns and c in df_merged.columns]:
+            df_merged.loc[aceitas.index, col] = catalogo.tabela[col].to_numpy()[aceitas["posicao"].to_numpy()]
+    marcar(df_merged, "flag_sem_correspondencia_contrato", df_merged["similaridade_chave"] < limiar_similaridade)
+
+    # Conversão segura
+    colunas_float = [
+        'qtd_standby', 'qtd_operacional', 'qtd_dobra', 'qtd_total',
+        'valor_unitario_standby', 'valor_unitario_operacional', 'valor_unitario_dobra',
+        'total_standby', 'total_operacional', 'total_dobra', 'total_he', 'total_cobrado',
+        'valor_unitario', 'valor_standby'
+    ]
+    for col in colunas_float:
+        if col in df_merged.columns:
+            df_merged[col] = pd.to_numeric(df_merged[col], errors="coerce")
+
+    # total recalculado
+    df_merged["total_recalculado"] = (
+        (df_merged["qtd_total"].fillna(0) * df_merged["valor_unitario_standby"].fillna(0)) +
+        (df_merged["qtd_total"].fillna(0) * df_merged["valor_unitario_operacional"].fillna(0)) +
+        (df_merged["qtd_dobra"].fillna(0) * df_merged["valor_unitario_dobra"].fillna(0)) +
+        df_merged["total_he"].fillna(0)
+    )
+
+    # [ALTERAÇÃO] flags como bits da coluna `flags` ("Sim"/"Não" só na exibição/exportação)
+    marcar(df_merged, "flag_valor_divergente", (
+        (np.round(df_merged["valor_unitario_standby"], 2) > np.round(df_merged.get("valor_standby", np.nan), 2)) |
+        (np.round(df_merged["valor_unitario_operacional"], 2) > np.round(df_merged.get("valor_unitario", np.nan), 2))
+    ))
+
+    marcar(df_merged, "flag_total_recalculado_diferente", (
+        df_merged["total_recalculado"].fillna(0) < df_merged["total_cobrado"].fillna(0)
+    ))
+
+    if {"descricao", "descricao_completa"}.issubset(df_merged.columns):
+        marcar(df_merged, "flag_descricao_duplicada", df_merged.duplicated(subset=["descricao", "descricao_completa"], keep=False))
+
+    return df_merged
+
+
+def sem_historico(df_conciliado: pd.DataFrame) -> pd.DataFrame:
+    """Retira as colunas e a flag de uma verificação anterior do histórico (nada muda se não houve)."""
+    if COLUNA_BOLETIM_DUPLICADO not in df_conciliado.columns:
+        return df_conciliado
+    df = df_conciliado.drop(columns=[COLUNA_BOLETIM_DUPLICADO, COLUNA_DUPLICADO_EM], errors="ignore")
+    desmarcar(df, "flag_cobranca_repetida_historico")
+    return df
+
+
+@rastrear("conciliacao.historico")
+def verificar_historico(recursos: Recursos, df_conciliado: pd.DataFrame, boletim: str, periodo) -> pd.DataFrame:
+    """Marca as linhas já cobradas em outro boletim do histórico (mesma descrição, unidade, competência e valor).
+
+    Acrescenta `boletim_duplicado` (o boletim anterior) e `boletim_duplicado_em` (quando foi registrado).
+    Pode ser refeita sobre o próprio resultado: a verificação anterior é substituída.
+    """
+    periodo = competencia(periodo)
+    df = sem_historico(df_conciliado).copy(deep=False)
+    anteriores = recursos.historico_cobrancas.verificar(df, boletim, periodo)
+    for col in anteriores.columns:
+        df[col] = anteriores[col].to_numpy()
+    repetidas = df[COLUNA_BOLETIM_DUPLICADO].notna()
+    marcar(df, "flag_cobranca_repetida_historico", repetidas)
+    atual().definir(boletim=boletim, periodo=periodo, linhas=len(df), repetidas=int(repetidas.sum()))
+    return df
+
+
+@rastrear("conciliacao.registrar_historico")
+def registrar_historico(recursos: Recursos, df_conciliado: pd.DataFrame, boletim: str, periodo) -> int:
+    """Grava as linhas do boletim no histórico (substitui um registro anterior do mesmo boletim)."""
+    boletim = str(boletim).strip()
+    if not boletim:
+        raise ValueError("Informe a identificação do boletim.")
+    linhas = recursos.historico_cobrancas.registrar(df_conciliado, boletim, competencia(periodo))
+    atual().definir(boletim=boletim, linhas=linhas)
+    return linhas
+
+
+# =========================
+# MULTIAGENTES (NORMALIZAÇÃO → CATÁLOGO → VALIDAÇÃO → REDFLAGS)
+# =========================
+# Observação: mantemos dependência leve de LLM sem alterar seu backend. As funções abaixo aceitam qualquer cliente compatível
+# com a API de ChatCompletion.create(model=..., messages=[...]).
+
+
+def _resposta_json_valida(resp) -> bool:
+    json.loads(resp.choices[0].message["content"].strip())
+    return True
+
+
+# Orçamento de saída por chamada do normalizador (max_tokens=4000, com folga para o JSON não truncar)
+ORCAMENTO_TOKENS_SAIDA = 3000
+# Cada linha vira um objeto JSON com todas as COLUNAS_PADRAO como chaves
+TOKENS_JSON_POR_LINHA = 8 * len(COLUNAS_PADRAO)
+TENTATIVAS_NORMALIZADOR = 3
+# Linhas inéditas por chamada do catalogador (resposta de ~6 tokens por linha cabe em max_tokens=800)
+TAMANHO_LOTE_CATALOGADOR = 100
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira (~4 caracteres por token), suficiente para dimensionar as partes."""
+    return len(texto) // 4 + 1
+
+
+def dividir_em_partes(df_raw: pd.DataFrame, orcamento_tokens: int = ORCAMENTO_TOKENS_SAIDA) -> list[pd.DataFrame]:
+    """Divide a tabela em blocos de linhas cuja resposta estimada cabe em `orcamento_tokens`."""
+    if df_raw.empty:
+        return [df_raw]
+    custo = [
+        TOKENS_JSON_POR_LINHA + estimar_tokens(linha)
+        for linha in df_raw.astype(str).agg(";".join, axis=1)
+    ]
+    partes, inicio, acumulado = [], 0, 0
+    for i, c in enumerate(custo):
+        if acumulado + c > orcamento_tokens and i > inicio:
+            partes.append(df_raw.iloc[inicio:i])
+            inicio, acumulado = i, 0
+        acumulado += c
+    partes.append(df_raw.iloc[inicio:])
+    return partes
+
+
+def _normalizar_parte(cache: CacheLLM, openai_client, modelo: str, usar_cache: bool, nome_doc: str, df_parte: pd.DataFrame) -> pd.DataFrame:
+    """Uma chamada do normalizador; levanta exceção se o JSON vier inválido ou vazio."""
+    tabela_texto = df_parte.to_csv(index=False, sep=";")
+    prompt = f"""
+Você é um agente NORMALIZADOR. Reestruture a tabela OCR abaixo no JSON com colunas exatamente:
+{COLUNAS_PADRAO}
+- Use string vazia para texto ausente e 0 para números ausentes.
+- NUNCA adicione colunas extras.
+
+Documento: {nome_doc}
+Tabela extraída (CSV ;):
+{tabela_texto}
+"""
+    resp = cache.chat_completion(
+        openai_client,
+        usar_cache=usar_cache,
+        validar=_resposta_json_valida,
+        model=modelo,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.0,
+        max_tokens=4000,
+    )
+    conteudo = resp.choices[0].message["content"].strip()
+    dados = json.loads(conteudo)
+    df = pd.DataFrame(dados)
+    if df.empty and not df_parte.empty:
+        raise ValueError("resposta vazia para um bloco não vazio")
+    return df
+
+
+@rastrear("agente.normalizador")
+def agente_normalizador(
+    recursos: Recursos,
+    openai_client,
+    nome_doc: str,
+    df_raw: pd.DataFrame,
+    usar_cache: bool | None = None,
+    max_concorrencia: int | None = None,
+) -> pd.DataFrame:
+    """Pede ao LLM para reestruturar a tabela em COLUNAS_PADRAO. Retorna DF padronizado.
+
+    Tabelas grandes são divididas em blocos de linhas (dimensionados pela estimativa de tokens da
+    resposta) normalizados em paralelo; só os blocos com JSON inválido são refeitos, divididos ao meio.
+    """
+    if usar_cache is None:
+        usar_cache = recursos.cache_llm_ativo("normalizador")
+    try:
+        modelo = recursos.modelo
+        if max_concorrencia is None:
+            max_concorrencia = int(recursos.secao("openai").get("max_concorrencia", 4))
+        cache = recursos.cache_llm
+    except Exception:
+        return normalizar_colunas(df_raw)
+
+    # [ALTERAÇÃO] map-reduce: blocos concorrentes, reprocessando apenas os que falharam
+    pendentes = [((i,), parte) for i, parte in enumerate(dividir_em_partes(df_raw))]
+    atual().definir(linhas=len(df_raw), partes=len(pendentes))
+    resultados: dict[tuple, pd.DataFrame] = {}
+    for tentativa in range(TENTATIVAS_NORMALIZADOR):
+        execucoes = executar_em_lote(
+            pendentes,
+            lambda item: _normalizar_parte(cache, openai_client, modelo, usar_cache, nome_doc, item[1]),
+            max_concorrencia=max_concorrencia,
+        )
+        falhas = []
+        for execucao in execucoes:
+            ordem, parte = execucao.item
+            if execucao.ok:
+                resultados[ordem] = execucao.valor
+            elif len(parte) > 1 and tentativa < TENTATIVAS_NORMALIZADOR - 1:
+                meio = len(parte) // 2
+                falhas += [(ordem + (0,), parte.iloc[:meio]), (ordem + (1,), parte.iloc[meio:])]
+            else:
+                falhas.append((ordem, parte))
+        pendentes = falhas
+        if not pendentes:
+            break
+    # blocos que esgotaram as tentativas: normalização heurística
+    for ordem, parte in pendentes:
+        resultados[ordem] = parte
+
+    partes = [normalizar_colunas(resultados[ordem]) for ordem in sorted(resultados)]
+    return pd.concat(partes, ignore_index=True) if partes else normalizar_colunas(df_raw)
+
+
+@rastrear("agente.catalogador")
+def agente_catalogador(
+    recursos: Recursos,
+    openai_client,
+    df_norm: pd.DataFrame,
+    usar_cache: bool | None = None,
+) -> tuple[pd.DataFrame, dict]:
+    """Gera uma coluna 'categoria_catalogo' (profissional, equipamento, mobilização etc.) para apoiar conferências.
+
+    Descrições conhecidas (dicionário persistido) e regras de palavras-chave resolvem a maior parte das
+    linhas localmente; só descrições inéditas vão ao LLM, em lotes, e as respostas são memorizadas.
+    Retorna o DF e a contagem de linhas por origem da categoria.
+    """
+    if usar_cache is None:
+        usar_cache = recursos.cache_llm_ativo("catalogador")
+    df = df_norm.copy(deep=False)
+    try:
+        linhas = df[['descricao', 'descricao_completa', 'unidade']].astype("string").fillna("").agg(" | ".join, axis=1).tolist()
+        cache = recursos.cache_llm
+        modelo = recursos.modelo
+    except Exception:
+        df["categoria_catalogo"] = "OUTROS"
+        return df, {}
+
+    def classificar_lote(lote: list[str]) -> list[str]:
+        bloco = "\n".join(f"- {l}" for l in lote)
+        prompt = f"""
+Você é um agente CATALOGADOR. Para cada linha a seguir, classifique em UMA categoria entre:
+{json.dumps(CATEGORIAS, ensure_ascii=False)}.
+Responda APENAS como JSON com uma lista de strings na mesma ordem das linhas.
+Linhas:\n{bloco}
+"""
+        resp = cache.chat_completion(
+            openai_client,
+            usar_cache=usar_cache,
+            validar=_resposta_json_valida,
+            model=modelo,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=800,
+        )
+        return json.loads(resp.choices[0].message["content"].strip())
+
+    # [ALTERAÇÃO] memória + regras antes do LLM; sem o antigo limite de 120 linhas
+    categorias, contagem = classificar_linhas(
+        linhas, recursos.dicionario_categorias, classificar_lote, tamanho_lote=TAMANHO_LOTE_CATALOGADOR
+    )
+    df["categoria_catalogo"] = categorias
+    atual().definir(linhas=len(df), **contagem)
+    return df, contagem
+
+
+@rastrear("agente.validador")
+def agente_validador_redflags(
+    recursos: Recursos,
+    openai_client,
+    df_conciliado: pd.DataFrame,
+    df_suporte: pd.DataFrame | None = None,
+    usar_cache: bool | None = None,
+) -> tuple[pd.DataFrame, str]:
+    """Compara indicadores e emite redflags estruturadas, incluindo divergência de valor hora vs documentação suporte.
+
+    Retorna o DF validado e o resumo do agente ("" sem cliente de LLM ou em caso de falha).
+    """
+    if usar_cache is None:
+        usar_cache = recursos.cache_llm_ativo("validador")
+    df = df_conciliado.copy(deep=False)
+
+    # [ALTERAÇÃO] regra programática de divergência de valor-hora usando documentação suporte
+    if df_suporte is not None and not df_suporte.empty:
+        df_suporte = df_suporte.copy(deep=False)
+        df_suporte["chave_conciliacao"] = chave_conciliacao(df_suporte, "descricao_completa", "unidade")
+        cols_map = {
+            "valor_unitario_operacional": "valor_unitario_operacional_suporte",
+            "valor_unitario_standby": "valor_unitario_standby_suporte",
+        }
+        df_sup_mini = df_suporte[["chave_conciliacao", "valor_unitario_operacional", "valor_unitario_standby"]].rename(columns=cols_map)
+        df = df.merge(df_sup_mini, on="chave_conciliacao", how="left")
+
+        # gera flag de divergência de hora (operacional e standby)
+        marcar(df, "flag_valor_hora_operacional_suporte", (
+            np.round(df.get("valor_unitario_operacional"), 2) != np.round(df.get("valor_unitario_operacional_suporte"), 2)
+        ))
+        marcar(df, "flag_valor_hora_standby_suporte", (
+            np.round(df.get("valor_unitario_standby"), 2) != np.round(df.get("valor_unitario_standby_suporte"), 2)
+        ))
+
+    if openai_client is None:
+        return df, ""
+
+    # [ALTERAÇÃO] sumarização com LLM (opcional) para relatório objetivo
+    try:
+        resumo_prompt = {
+            "role": "user",
+            "content": (
+                "Você é um agente VALIDADOR. Dado o JSON de linhas conciliadas, aponte redflags objetivas em bullets. "
+                "Foque em: (1) valor hora divergente vs contrato e vs suporte, (2) total recalculado < total cobrado, "
+                "(3) possíveis duplicidades, inclusive com boletins anteriores. Responda em 5 bullets no máximo.\n\n" +
+                expandir_flags(df.head(60)).to_json(orient="records", force_ascii=False)
+            ),
+        }
+        resp = recursos.cache_llm.chat_completion(
+            openai_client,
+            usar_cache=usar_cache,
+            model=recursos.modelo,
+            messages=[{"role": "system", "content": "Você é um auditor técnico em contratos."}, resumo_prompt],
+            temperature=0.2,
+            max_tokens=900,
+        )
+        return df, resp.choices[0].message["content"]
+    except Exception:
+        return df, ""
+
+
+@rastrear("conciliacao")
+def conciliar(
+    recursos: Recursos,
+    df_boletim: pd.DataFrame,
+    df_contrato: pd.DataFrame,
+    df_suporte: pd.DataFrame | None = None,
+    catalogo: CatalogoContrato | None = None,
+    openai_client=None,
+    boletim: str | None = None,
+    periodo=None,
+) -> dict:
+    """Estágio completo: conciliação com o contrato + agentes (opcionais, só com `openai_client`).
+
+    Com `boletim` e `periodo` (competência "AAAA-MM"), as linhas também são comparadas com o histórico
+    de boletins anteriores. Retorna {df_validado, df_boletim_categorizado, resumo_validacao,
+    origem_categorias, contagem_flags}.
+    """
+    df_conciliado = estruturar_boletim_conciliado(df_boletim, df_contrato, catalogo=catalogo)
+    if boletim and periodo:
+        df_conciliado = verificar_historico(recursos, df_conciliado, boletim, periodo)
+
+    # Multiagentes (opcional) — normalizador e catalogador sobre boletim
+    df_categ, origem_categorias = df_boletim, {}
+    if openai_client is not None:
+        try:
+            df_norm = agente_normalizador(recursos, openai_client, "BOLETIM", df_boletim)
+            df_categ, origem_categorias = agente_catalogador(recursos, openai_client, df_norm)
+        except Exception:
+            df_categ, origem_categorias = df_boletim, {}
+
+    # Validador + RedFlags incluindo comparação com suporte
+    tem_suporte = df_suporte is not None and not df_suporte.empty
+    df_validado, resumo = agente_validador_redflags(recursos, openai_client, df_conciliado, df_suporte if tem_suporte else None)
+    return {
+        "df_validado": df_validado,
+        "df_boletim_categorizado": df_categ,
+        "resumo_validacao": resumo,
+        "origem_categorias": origem_categorias,
+        "contagem_flags": contar_flags(df_validado),
+    }
@@ -0,0 +1,180 @@
+"""Rastreamento leve do tempo gasto por etapa: spans aninhados com atributos.
+
+`with execucao("upload") as ex:` abre a raiz de uma execução; dentro dela, `with span("documentai",
+paginas=3) as s:` cria um span filho do span corrente. O span corrente vive num `contextvars`,
+então o aninhamento acompanha as threads disparadas por `executar_em_lote` (que copia o contexto
+para cada tarefa). Fora de uma execução, `span` não registra nada e custa quase zero.
+"""
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Span:
+    nome: str
+    inicio: float  # time.perf_counter()
+    atributos: dict = field(default_factory=dict)
+    duracao: float | None = None
+    erro: str = ""
+    thread: str = ""
+    filhos: list["Span"] = field(default_factory=list)
+
+    def definir(self, **atributos):
+        """Acrescenta atributos conhecidos só durante a etapa (ex.: `cache=True`, linhas geradas)."""
+        self.atributos.update(atributos)
+
+    def percorrer(self, profundidade: int = 0) -> Iterator[tuple[int, "Span"]]:
+        yield profundidade, self
+        for filho in sorted(self.filhos, key=lambda s: s.inicio):
+            yield from filho.percorrer(profundidade + 1)
+
+
+class _SpanNulo:
+    def definir(self, **atributos):
+        pass
+
+
+_NULO = _SpanNulo()
+
+
+class Execucao:
+    """Árvore de spans de uma execução (um clique em "Processar", uma conciliação, uma exportação...)."""
+
+    def __init__(self, nome: str, **atributos):
+        self.iniciada_em = time.time()
+        self.raiz = Span(nome, time.perf_counter(), dict(atributos), thread=threading.current_thread().name)
+        self._lock = threading.Lock()
+
+    @property
+    def nome(self) -> str:
+        return self.raiz.nome
+
+    def _anexar(self, pai: Span, filho: Span):
+        with self._lock:
+            pai.filhos.append(filho)
+
+    def linhas(self) -> list[dict]:
+        """Spans achatados em ordem de início, com a profundidade para exibição indentada."""
+        with self._lock:
+            return [
+                {
+                    "profundidade": prof,
+                    "nome": s.nome,
+                    "inicio_ms": round((s.inicio - self.raiz.inicio) * 1000, 1),
+                    "duracao_ms": round(s.duracao * 1000, 1) if s.duracao is not None else None,
+                    "erro": s.erro,
+                    "thread": s.thread,
+                    "atributos": dict(s.atributos),
+                }
+                for prof, s in self.raiz.percorrer()
+            ]
+
+    def resumo(self) -> list[dict]:
+        """Agregado por nome de span: chamadas, tempo total/máximo, erros e acertos de cache."""
+        agregado: dict[str, dict] = {}
+        for linha in self.linhas():
+            a = agregado.setdefault(linha["nome"], {
+                "nome": linha["nome"], "chamadas": 0, "total_ms": 0.0, "max_ms": 0.0, "erros": 0, "acertos_cache": 0,
+            })
+            duracao = linha["duracao_ms"] or 0.0
+            a["chamadas"] += 1
+            a["total_ms"] = round(a["total_ms"] + duracao, 1)
+            a["max_ms"] = max(a["max_ms"], duracao)
+            a["erros"] += bool(linha["erro"])
+            a["acertos_cache"] += linha["atributos"].get("cache") is True
+        return sorted(agregado.values(), key=lambda a: -a["total_ms"])
+
+    def para_dict(self) -> dict:
+        def converter(s: Span) -> dict:
+            return {
+                "nome": s.nome,
+                "inicio_ms": round((s.inicio - self.raiz.inicio) * 1000, 1),
+                "duracao_ms": round(s.duracao * 1000, 1) if s.duracao is not None else None,
+                "erro": s.erro,
+                "thread": s.thread,
+                "atributos": s.atributos,
+                "filhos": [converter(f) for f in sorted(s.filhos, key=lambda f: f.inicio)],
+            }
+
+        with self._lock:
+            arvore = converter(self.raiz)
+        return {
+            "execucao": self.nome,
+            "iniciada_em": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.iniciada_em)),
+            "spans": arvore,
+            "resumo": self.resumo(),
+        }
+
+    def para_json(self) -> str:
+        return json.dumps(self.para_dict(), ensure_ascii=False, indent=2, default=str)
+
+
+_atual: contextvars.ContextVar[tuple[Execucao, Span] | None] = contextvars.ContextVar("span_atual", default=None)
+
+
+@contextmanager
+def execucao(nome: str, **atributos) -> Iterator[Execucao]:
+    """Raiz de uma execução rastreada; os `span` abertos dentro dela são seus descendentes."""
+    ex = Execucao(nome, **atributos)
+    token = _atual.set((ex, ex.raiz))
+    try:
+        yield ex
+    except BaseException as e:
+        ex.raiz.erro = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        ex.raiz.duracao = time.perf_counter() - ex.raiz.inicio
+        _atual.reset(token)
+
+
+@contextmanager
+def span(nome: str, **atributos) -> Iterator[Span | _SpanNulo]:
+    atual = _atual.get()
+    if atual is None:
+        yield _NULO
+        return
+    ex, pai = atual
+    s = Span(nome, time.perf_counter(), atributos, thread=threading.current_thread().name)
+    ex._anexar(pai, s)
+    token = _atual.set((ex, s))
+    try:
+        yield s
+    except BaseException as e:
+        s.erro = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duracao = time.perf_counter() - s.inicio
+        _atual.reset(token)
+
+
+def registrar(nome: str, duracao: float, **atributos):
+    """Span já medido em outro lugar (ex.: uma página de OCR num processo de trabalho)."""
+    atual = _atual.get()
+    if atual is None:
+        return
+    ex, pai = atual
+    fim = time.perf_counter()
+    ex._anexar(pai, Span(nome, fim - duracao, atributos, duracao=duracao, thread=threading.current_thread().name))
+
+
+def atual() -> Span | _SpanNulo:
+    """Span corrente (para acrescentar atributos de dentro de uma função decorada com `rastrear`)."""
+    corrente = _atual.get()
+    return corrente[1] if corrente is not None else _NULO
+
+
+def rastrear(nome: str):
+    """Decorador: cada chamada da função vira um span `nome`."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
@@ -0,0 +1,207 @@
+"""Repositório local e versionado das tabelas de preços dos contratos.
+
+Um contrato extraído uma vez é gravado aqui e reaproveitado em todas as conciliações
+seguintes, sem nova extração. Cada gravação cria uma versão com vigência (início e fim
+opcionais). A tabela normalizada completa vai para Parquet e os metadados das versões
+ficam em SQLite. A conciliação usa o catálogo inteiro (correspondência exata e aproximada),
+então os catálogos já carregados ficam em memória (LRU) e são reaproveitados entre conciliações.
+"""
+import datetime as dt
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from assinaturas import assinatura_dataframe
+from catalogo_contrato import CatalogoContrato
+
+ARQUIVO_BANCO = "contratos.sqlite3"
+
+
+@dataclass(frozen=True)
+class VersaoContrato:
+    contrato: str
+    versao: int
+    vigencia_inicio: str | None  # "AAAA-MM-DD"; None = desde sempre
+    vigencia_fim: str | None  # None = sem término
+    linhas: int
+    assinatura: str
+    origem: str
+    arquivo: str
+    criado_em: float
+
+    @property
+    def rotulo(self) -> str:
+        vigencia = f"{self.vigencia_inicio or '…'} a {self.vigencia_fim or '…'}"
+        return f"{self.contrato} v{self.versao} ({vigencia}, {self.linhas} itens)"
+
+    def vigente_em(self, data: str) -> bool:
+        return (self.vigencia_inicio or "") <= data and (self.vigencia_fim is None or data <= self.vigencia_fim)
+
+
+def data_iso(data) -> str | None:
+    """date/datetime/"AAAA-MM-DD" -> "AAAA-MM-DD" (None e "" -> None)."""
+    if data is None or data == "":
+        return None
+    if isinstance(data, dt.datetime):
+        return data.date().isoformat()
+    if isinstance(data, dt.date):
+        return data.isoformat()
+    return dt.date.fromisoformat(str(data).strip()).isoformat()
+
+
+class RepositorioContratos:
+    """Tabelas de preços por contrato e versão (Parquet + metadados em SQLite), com catálogos em memória."""
+
+    def __init__(self, diretorio: str | Path, max_catalogos: int = 8):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.caminho = self.diretorio / ARQUIVO_BANCO
+        self.max_catalogos = int(max_catalogos)
+        self.carregamentos = 0
+        self.reaproveitados = 0
+        self._catalogos: OrderedDict[tuple[str, int], CatalogoContrato] = OrderedDict()
+        self._lock = threading.Lock()
+        with self._conectar() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS versoes (
+                    contrato TEXT NOT NULL,
+                    versao INTEGER NOT NULL,
+                    vigencia_inicio TEXT,
+                    vigencia_fim TEXT,
+                    linhas INTEGER NOT NULL,
+                    assinatura TEXT NOT NULL,
+                    origem TEXT NOT NULL,
+                    arquivo TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    PRIMARY KEY (contrato, versao)
+                )
+                """
+            )
+            # índice chave -> preços de versões anteriores, sem consulta que o use
+            con.execute("DROP TABLE IF EXISTS itens")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:  # commit/rollback
+                yield con
+        finally:
+            con.close()
+
+    # -------------------------
+    # VERSÕES
+    # -------------------------
+
+    def versoes(self, contrato: str | None = None) -> list[VersaoContrato]:
+        """Versões de `contrato` (ou de todos), da mais recente para a mais antiga."""
+        sql = "SELECT * FROM versoes" + (" WHERE contrato = ?" if contrato is not None else "")
+        with self._conectar() as con:
+            linhas = con.execute(sql + " ORDER BY contrato, versao DESC", (() if contrato is None else (contrato,))).fetchall()
+        return [VersaoContrato(*linha) for linha in linhas]
+
+    def contratos(self) -> list[str]:
+        with self._conectar() as con:
+            return [c for (c,) in con.execute("SELECT DISTINCT contrato FROM versoes ORDER BY contrato")]
+
+    def versao(self, contrato: str, versao: int | None = None, data=None) -> VersaoContrato | None:
+        """Versão pedida; sem `versao`, a mais recente vigente em `data` (padrão: hoje)."""
+        versoes = self.versoes(contrato)
+        if versao is not None:
+            return next((v for v in versoes if v.versao == int(versao)), None)
+        data = data_iso(data) or dt.date.today().isoformat()
+        return next((v for v in versoes if v.vigente_em(data)), None)
+
+    def salvar(self, contrato: str, df_contrato: pd.DataFrame, vigencia_inicio=None, vigencia_fim=None, origem: str = "") -> VersaoContrato:
+        """Grava a tabela normalizada como nova versão de `contrato`.
+
+        Se a versão mais recente já tem o mesmo conteúdo e a mesma vigência, ela é devolvida sem gravar outra.
+        """
+        contrato = str(contrato).strip()
+        if not contrato:
+            raise ValueError("Informe o nome do contrato.")
+        inicio, fim = data_iso(vigencia_inicio), data_iso(vigencia_fim)
+        if inicio and fim and fim < inicio:
+            raise ValueError(f"Fim da vigência ({fim}) anterior ao início ({inicio}).")
+        assinatura = assinatura_dataframe(df_contrato)
+        with self._lock:
+            ultima = next(iter(self.versoes(contrato)), None)
+            if ultima is not None and (ultima.assinatura, ultima.vigencia_inicio, ultima.vigencia_fim) == (assinatura, inicio, fim):
+                return ultima
+            numero = (ultima.versao if ultima else 0) + 1
+            arquivo = f"{hashlib.sha1(contrato.encode('utf-8')).hexdigest()[:16]}_v{numero}.parquet"
+            tabela = df_contrato.copy(deep=False)
+            tabela.columns = [str(c) for c in tabela.columns]
+            tmp = self.diretorio / f".{arquivo}.tmp"
+            tabela.to_parquet(tmp, index=False, compression="zstd")
+            os.replace(tmp, self.diretorio / arquivo)
+
+            registro = VersaoContrato(contrato, numero, inicio, fim, len(tabela), assinatura, origem, arquivo, time.time())
+            with self._conectar() as con:
+                con.execute("INSERT INTO versoes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                    registro.contrato, registro.versao, registro.vigencia_inicio, registro.vigencia_fim,
+                    registro.linhas, registro.assinatura, registro.origem, registro.arquivo, registro.criado_em,
+                ))
+        return registro
+
+    def remover(self, contrato: str, versao: int):
+        """Apaga uma versão (tabela, metadados e catálogo em memória)."""
+        registro = self.versao(contrato, versao)
+        if registro is None:
+            return
+        with self._lock:
+            with self._conectar() as con:
+                con.execute("DELETE FROM versoes WHERE contrato = ? AND versao = ?", (contrato, registro.versao))
+            self._catalogos.pop((contrato, registro.versao), None)
+            (self.diretorio / registro.arquivo).unlink(missing_ok=True)
+
+    # -------------------------
+    # CONSULTAS
+    # -------------------------
+
+    def carregar(self, registro: VersaoContrato) -> pd.DataFrame:
+        return pd.read_parquet(self.diretorio / registro.arquivo)
+
+    def catalogo(self, contrato: str, versao: int | None = None, data=None) -> tuple[VersaoContrato, CatalogoContrato]:
+        """(versão, catálogo) da versão pedida ou da vigente em `data`; o catálogo fica em memória para as próximas consultas."""
+        registro = self.versao(contrato, versao, data)
+        if registro is None:
+            alvo = f"v{versao}" if versao is not None else f"vigente em {data_iso(data) or 'hoje'}"
+            raise KeyError(f"Contrato '{contrato}' sem versão {alvo} no repositório.")
+        chave = (registro.contrato, registro.versao)
+        with self._lock:
+            catalogo = self._catalogos.get(chave)
+            if catalogo is not None:
+                self._catalogos.move_to_end(chave)
+                self.reaproveitados += 1
+                return registro, catalogo
+        catalogo = CatalogoContrato(self.carregar(registro))
+        with self._lock:
+            self.carregamentos += 1
+            self._catalogos[chave] = catalogo
+            while len(self._catalogos) > self.max_catalogos:
+                self._catalogos.popitem(last=False)
+        return registro, catalogo
+
+    def estatisticas(self) -> dict:
+        with self._conectar() as con:
+            contratos, versoes = con.execute("SELECT COUNT(DISTINCT contrato), COUNT(*) FROM versoes").fetchone()
+        with self._lock:
+            em_memoria = len(self._catalogos)
+        return {
+            "contratos": contratos,
+            "versoes": versoes,
+            "catalogos_em_memoria": em_memoria,
+            "carregamentos": self.carregamentos,
+            "reaproveitados": self.reaproveitados,
+        }
@@ -0,0 +1,114 @@
+import pytest
+
+import agendador
+from agendador import Agendador, BaldeTokens, ConfigBackend
+
+
+class RelogioFalso:
+    """`time.monotonic`/`time.sleep` de mentira: dormir só avança o relógio."""
+
+    def __init__(self):
+        self.agora = 1000.0
+        self.dormidas: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.agora
+
+    def sleep(self, segundos: float):
+        self.dormidas.append(segundos)
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(agendador.time, "monotonic", relogio.monotonic)
+    monkeypatch.setattr(agendador.time, "sleep", relogio.sleep)
+    return relogio
+
+
+class Transitorio(Exception):
+    pass
+
+
+def test_balde_libera_a_rajada_e_depois_espera_pela_taxa(relogio):
+    balde = BaldeTokens(taxa=2.0, capacidade=3)
+    assert [balde.adquirir() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert balde.adquirir() == pytest.approx(0.5)
+    assert relogio.dormidas == [pytest.approx(0.5)]
+
+
+def test_balde_nao_acumula_alem_da_capacidade(relogio):
+    balde = BaldeTokens(taxa=1.0, capacidade=2)
+    balde.adquirir(), balde.adquirir()
+    relogio.agora += 60  # parado por um minuto: volta só à capacidade
+    assert [balde.adquirir() for _ in range(2)] == [0.0, 0.0]
+    assert balde.adquirir() == pytest.approx(1.0)
+
+
+def agendador_com(**config) -> Agendador:
+    ag = Agendador()
+    ag.registrar("api", ConfigBackend(erros_retentaveis=(Transitorio,), **config))
+    return ag
+
+
+def falha_vezes(n: int):
+    chamadas = []
+
+    def funcao(valor):
+        chamadas.append(valor)
+        if len(chamadas) <= n:
+            raise Transitorio(f"tentativa {len(chamadas)}")
+        return valor * 2
+
+    return funcao, chamadas
+
+
+def test_erro_transitorio_e_refeito_com_backoff(relogio, monkeypatch):
+    monkeypatch.setattr(agendador.random, "uniform", lambda a, b: b)  # jitter no teto
+    ag = agendador_com(requisicoes_por_minuto=6000, rajada=10, tentativas=4, backoff_base=1.0, backoff_max=3.0)
+    funcao, chamadas = falha_vezes(3)
+    assert ag.executar("api", funcao, 21) == 42
+    assert chamadas == [21] * 4
+    # backoff exponencial limitado: 1, 2, min(3, 4)
+    assert relogio.dormidas == [1.0, 2.0, 3.0]
+    m = ag.metricas()["api"]
+    assert (m["chamadas"], m["retentativas"], m["sucessos"], m["falhas"]) == (4, 3, 1, 0)
+    assert m["espera_backoff_s"] == 6.0
+    assert m["fila"] == m["em_execucao"] == 0
+
+
+def test_cada_tentativa_passa_pelo_balde(relogio, monkeypatch):
+    monkeypatch.setattr(agendador.random, "uniform", lambda a, b: 0.0)
+    ag = agendador_com(requisicoes_por_minuto=60, rajada=1, tentativas=3)
+    funcao, _ = falha_vezes(2)
+    assert ag.executar("api", funcao, 1) == 2
+    # 1 requisição/s sem rajada: a 2ª e a 3ª tentativas esperam 1 s cada pelo token
+    assert ag.metricas()["api"]["espera_limite_s"] == pytest.approx(2.0)
+
+
+def test_tentativas_esgotadas_repassam_o_erro(relogio):
+    ag = agendador_com(requisicoes_por_minuto=6000, rajada=10, tentativas=3)
+    funcao, chamadas = falha_vezes(10)
+    with pytest.raises(Transitorio, match="tentativa 3"):
+        ag.executar("api", funcao, 1)
+    assert len(chamadas) == 3
+    m = ag.metricas()["api"]
+    assert (m["retentativas"], m["falhas"]) == (2, 1)
+    assert len(relogio.dormidas) == 2  # sem backoff depois da última
+
+
+def test_erro_nao_retentavel_nao_e_refeito(relogio):
+    ag = agendador_com(tentativas=5)
+    chamadas = []
+
+    def funcao():
+        chamadas.append(1)
+        raise ValueError("definitivo")
+
+    with pytest.raises(ValueError):
+        ag.executar("api", funcao)
+    assert len(chamadas) == 1
+    assert ag.metricas()["api"]["falhas"] == 1
+    with pytest.raises(KeyError):
+        ag.executar("outra", funcao)
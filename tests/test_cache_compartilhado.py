@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_compartilhado import CacheCompartilhado
+
+N = 8
+
+
+def esperar_ate(condicao, limite: float = 10.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "condição não atingida"
+        time.sleep(0.001)
+
+
+def concorrentes(cache: CacheCompartilhado, calcular, **kwargs) -> list:
+    """`N` threads pedem a mesma chave ao mesmo tempo."""
+    largada = threading.Barrier(N)
+
+    def pedir(_):
+        largada.wait()
+        return cache.obter_ou_calcular("chave", calcular, **kwargs)
+
+    with ThreadPoolExecutor(N) as pool:
+        return list(pool.map(pedir, range(N)))
+
+
+def test_calcula_uma_vez_com_chamadas_simultaneas():
+    cache = CacheCompartilhado()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(threading.get_ident())
+        # segura o cálculo até todos os outros estarem esperando por ele
+        esperar_ate(lambda: cache.esperas == N - 1)
+        return b"resultado"
+
+    resultados = concorrentes(cache, calcular)
+    assert len(chamadas) == 1
+    assert [valor for valor, _ in resultados] == [b"resultado"] * N
+    assert sorted(reaproveitado for _, reaproveitado in resultados) == [False] + [True] * (N - 1)
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["falhas"], estatisticas["esperas"], estatisticas["acertos"]) == (1, N - 1, N - 1)
+    assert cache.obter_ou_calcular("chave", calcular) == (b"resultado", True)
+    assert len(chamadas) == 1
+
+
+def test_valor_nao_guardado_e_calculado_por_quem_esperava():
+    cache = CacheCompartilhado()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        if len(chamadas) == 1:
+            esperar_ate(lambda: cache.esperas == N - 1)
+        return b""
+
+    resultados = concorrentes(cache, calcular, guardar=bool)
+    assert len(chamadas) == N
+    assert not any(reaproveitado for _, reaproveitado in resultados)
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_descarte_lru_por_bytes():
+    cache = CacheCompartilhado(limite_bytes=250)
+    for chave in "abc":
+        cache.obter_ou_calcular(chave, lambda: bytes(100))
+    # "a" e "b" não cabem juntas com "c": sai a menos usada
+    assert cache.obter("a") is None
+    assert cache.obter("b") is not None
+    cache.obter_ou_calcular("d", lambda: bytes(100))
+    assert cache.obter("c") is None
+    assert cache.obter("b") is not None
+    assert cache.estatisticas()["bytes"] == 200
+    # maior que o limite: devolvido, mas não guardado
+    assert cache.obter_ou_calcular("e", lambda: bytes(300)) == (bytes(300), False)
+    assert cache.obter("e") is None
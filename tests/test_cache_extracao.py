@@ -0,0 +1,72 @@
+import io
+
+import fitz
+import pandas as pd
+
+from cache_extracao import CacheExtracao, chave_extracao
+from ingestao import CacheDocumentos, envolver_upload, recortar_pdf
+
+
+def pdf_de_teste(paginas: int = 5) -> bytes:
+    with fitz.open() as doc:
+        for i in range(paginas):
+            doc.new_page().insert_text((72, 72), f"Página {i + 1}")
+        return doc.tobytes()
+
+
+def test_mesmo_recorte_gera_a_mesma_chave():
+    pdf = pdf_de_teste()
+    a, b = recortar_pdf(pdf, [(2, 3)]), recortar_pdf(pdf, [(2, 3)])
+    assert a == b
+    assert chave_extracao(a, "proc") == chave_extracao(b, "proc")
+    # por envios diferentes (e pelo cache de documentos abertos) o recorte também é o mesmo
+    cache = CacheDocumentos()
+    c = cache.recortar(envolver_upload(io.BytesIO(pdf)), [(2, 2), (3, 3)])
+    assert chave_extracao(bytes(c), "proc") == chave_extracao(a, "proc")
+
+
+def test_chave_depende_do_recorte_do_processor_e_da_versao():
+    pdf = pdf_de_teste()
+    recorte = recortar_pdf(pdf, [(2, 3)])
+    chave = chave_extracao(recorte, "proc")
+    assert chave != chave_extracao(recortar_pdf(pdf, [(2, 4)]), "proc")
+    assert chave != chave_extracao(recorte, "outro")
+    assert chave != chave_extracao(recorte, "proc", versao="outra")
+
+
+def tabela(linhas: int) -> pd.DataFrame:
+    return pd.DataFrame({"descricao": [f"item {i:06d}" for i in range(linhas)], "valor": range(linhas)})
+
+
+def test_grava_e_le_as_tabelas(tmp_path):
+    cache = CacheExtracao(tmp_path)
+    assert cache.obter("k") is None
+    assert cache.gravar("k", [tabela(3), tabela(1)])
+    lidas = cache.obter("k")
+    pd.testing.assert_frame_equal(lidas[0], tabela(3))
+    assert len(lidas) == 2
+    assert (cache.acertos, cache.falhas) == (1, 1)
+
+
+def test_descarte_lru_por_tamanho(tmp_path, monkeypatch):
+    relogio = iter(range(1000, 2000))
+    monkeypatch.setattr("cache_extracao.time.time", lambda: next(relogio))
+    cache = CacheExtracao(tmp_path, limite_bytes=10**9)
+    for chave in "abc":
+        assert cache.gravar(chave, [tabela(2000)])
+    tamanho = cache.estatisticas()["bytes"] // 3
+    # "a" é a mais antiga, mas foi lida por último: quem sai é "b"
+    assert cache.obter("a") is not None
+    cache.limite_bytes = 3 * tamanho + tamanho // 2
+    assert cache.gravar("d", [tabela(2000)])
+    assert cache.obter("b") is None
+    assert all(cache.obter(chave) is not None for chave in "acd")
+    assert cache.estatisticas()["bytes"] <= cache.limite_bytes
+    assert cache.descartes == 1
+
+
+def test_entrada_maior_que_o_limite_nao_fica(tmp_path):
+    cache = CacheExtracao(tmp_path, limite_bytes=1)
+    cache.gravar("grande", [tabela(100)])
+    assert cache.obter("grande") is None
+    assert cache.estatisticas()["entradas"] == 0
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from catalogo_contrato import CatalogoContrato, chave_conciliacao, normalizar_chave
+
+
+@pytest.fixture
+def contrato():
+    return pd.DataFrame({
+        "descricao": ["PROFISSIONAL", "PROFISSIONAL", "MOB/DESMOB"],
+        "descricao_completa": ["Diária de operador", "DIÁRIA DE SUPERVISOR ", "Mobilização"],
+        "unidade": ["diária", "DIÁRIA", "EVENTO"],
+        "valor_unitario": [1672.0, 1995.0, 1850.0],
+        "valor_standby": [1337.6, 1596.0, 1850.0],
+    })
+
+
+@pytest.fixture
+def boletim():
+    df = pd.DataFrame({
+        "descricao": ["DIÁRIA DE SUPERVISOR", "item inexistente", "diária de operador", "MOBILIZAÇÃO", None],
+        "unidade": ["diária", "UN", "DIÁRIA", "evento", None],
+        "qtd_total": [5, 1, 10, 1, 2],
+    }, index=[7, 3, 9, 1, 4])
+    df["chave_conciliacao"] = chave_conciliacao(df, "descricao", "unidade")
+    return df
+
+
+def merge_esperado(boletim: pd.DataFrame, catalogo: CatalogoContrato) -> pd.DataFrame:
+    return boletim.merge(catalogo.tabela, on="chave_conciliacao", how="left", suffixes=("", "_contrato"))
+
+
+def test_juntar_equivale_a_merge(contrato, boletim):
+    catalogo = CatalogoContrato(contrato)
+    assert catalogo.chaves_unicas
+    juntado = catalogo.juntar(boletim)
+    pd.testing.assert_frame_equal(juntado, merge_esperado(boletim, catalogo))
+    assert juntado["valor_unitario"].isna().tolist() == [False, True, False, False, True]
+
+
+def test_juntar_com_chaves_repetidas_equivale_a_merge(contrato, boletim):
+    catalogo = CatalogoContrato(pd.concat([contrato, contrato.iloc[[0]]], ignore_index=True))
+    assert not catalogo.chaves_unicas
+    pd.testing.assert_frame_equal(catalogo.juntar(boletim), merge_esperado(boletim, catalogo))
+
+
+def test_juntar_com_texto_arrow_e_categorias(contrato, boletim):
+    contrato = contrato.astype({"descricao": "category", "descricao_completa": pd.StringDtype("pyarrow")})
+    boletim = boletim.astype({"descricao": "category", "unidade": pd.StringDtype("pyarrow")})
+    catalogo = CatalogoContrato(contrato)
+    pd.testing.assert_frame_equal(catalogo.juntar(boletim), merge_esperado(boletim, catalogo))
+
+
+def test_buscar_usa_a_mesma_chave(contrato):
+    catalogo = CatalogoContrato(contrato)
+    assert normalizar_chave(" diária de supervisor", "diária") == "DIÁRIA DE SUPERVISOR - DIÁRIA"
+    assert catalogo.buscar("diária de supervisor", "Diária")["valor_unitario"] == 1995.0
+    assert catalogo.buscar("inexistente", "UN") is None
@@ -0,0 +1,45 @@
+import pytest
+
+from catalogo_local import DicionarioCategorias, classificar_linhas, classificar_por_regras
+from correspondencia_aproximada import normalizar_texto
+
+MISTAS = [
+    "DIÁRIA DE OPERADOR DE GUINDASTE",
+    "MOTORISTA DE CAMINHÃO",
+    "TÉCNICO DE GERADOR",
+    "LOCAÇÃO DE MÃO DE OBRA",
+    "MOBILIZAÇÃO DE EQUIPAMENTO",
+]
+
+
+@pytest.mark.parametrize("descricao", MISTAS)
+def test_descricao_com_mais_de_uma_categoria_fica_sem_regra(descricao):
+    assert classificar_por_regras(normalizar_texto(descricao)) is None
+
+
+@pytest.mark.parametrize("descricao, categoria", [
+    ("DIÁRIA DE SUPERVISOR", "PROFISSIONAL"),
+    ("Locação de compressor", "EQUIPAMENTO"),
+    ("DESMOBILIZAÇÃO", "MOB/DESMOB"),
+    ("ÓLEO DIESEL", "INSUMO"),
+    ("SERVIÇOS DIVERSOS", None),
+])
+def test_descricao_de_uma_categoria(descricao, categoria):
+    assert classificar_por_regras(normalizar_texto(descricao)) == categoria
+
+
+def test_ambiguas_vao_para_o_llm(tmp_path):
+    dicionario = DicionarioCategorias(tmp_path / "categorias.json")
+    enviadas = []
+
+    def classificar_lote(lote):
+        enviadas.extend(lote)
+        return ["PROFISSIONAL"] * len(lote)
+
+    categorias, contagem = classificar_linhas(["DIÁRIA DE SUPERVISOR", *MISTAS], dicionario, classificar_lote)
+    assert enviadas == MISTAS
+    assert categorias == ["PROFISSIONAL"] * (len(MISTAS) + 1)
+    assert contagem == {"dicionario": 0, "regras": 1, "llm": len(MISTAS), "sem_classificacao": 0}
+    # respostas memorizadas: na próxima vez vêm do dicionário
+    _, contagem = classificar_linhas(MISTAS, dicionario, classificar_lote)
+    assert contagem["dicionario"] == len(MISTAS)
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from correspondencia_aproximada import IndiceAproximado, normalizar_texto, similaridade
+
+CONTRATO = pd.DataFrame({
+    "descricao": ["Operador de Guindaste", "Soldador", "Caminhão Munck 12t", "Caminhão Munck 12t", "Técnico de Segurança"],
+    "unidade": ["H", "H", "DIA", "MES", "Mês"],
+})
+
+
+def indice() -> IndiceAproximado:
+    return IndiceAproximado(CONTRATO["descricao"], CONTRATO["unidade"])
+
+
+def test_normalizar_texto_ignora_acento_caixa_pontuacao_e_espacos():
+    assert normalizar_texto("  Técnico   de  segurança. ") == "TECNICO DE SEGURANCA"
+    assert normalizar_texto("CAMINHÃO-MUNCK (12t)") == "CAMINHAO MUNCK 12T"
+    assert normalizar_texto(None) == normalizar_texto(float("nan")) == ""
+
+
+def test_variantes_de_acento_e_espaco_casam_por_inteiro():
+    descricoes = pd.Series(["OPERADOR  DE GUINDASTÊ", "tecnico de seguranca", " soldador "])
+    unidades = pd.Series(["h", "MÊS", "H"])
+    resultado = indice().corresponder(descricoes, unidades)
+    assert resultado["posicao"].tolist() == [0, 4, 1]
+    assert resultado["similaridade"].tolist() == [1.0, 1.0, 1.0]
+
+
+def test_blocagem_por_unidade_escolhe_o_item_da_mesma_unidade():
+    descricoes = pd.Series(["Caminhao Munck 12 t"] * 2, index=[10, 20])
+    resultado = indice().corresponder(descricoes, pd.Series(["dia", "mês"], index=[10, 20]))
+    assert resultado.index.tolist() == [10, 20]
+    assert resultado["posicao"].tolist() == [2, 3]
+    assert (resultado["similaridade"] > 0.85).all()
+
+
+def test_unidade_ausente_procura_em_todo_o_contrato():
+    pos, score = indice().melhor_correspondencia("Soldador", "KG")
+    assert (pos, score) == (1, 1.0)
+    # com candidato no bloco da unidade, os itens de outras unidades não concorrem
+    pos, score = indice().melhor_correspondencia("Operador de Munck", "DIA")
+    assert pos == 2 and score < similaridade(normalizar_texto("Operador de Munck"), "OPERADOR DE GUINDASTE")
+
+
+def test_sem_candidato_e_descricao_vazia():
+    resultado = indice().corresponder(pd.Series(["", "xyz"]), pd.Series(["H", None]))
+    assert resultado["posicao"].tolist() == [-1, -1]
+    assert resultado["similaridade"].tolist() == [0.0, 0.0]
+    assert similaridade("", "SOLDADOR") == 0.0
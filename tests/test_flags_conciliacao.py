@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from flags_conciliacao import (
+    BITS,
+    COLUNA_FLAGS,
+    FLAGS,
+    INFORMATIVAS,
+    POSICOES,
+    REQUER_COLUNA,
+    contar_flags,
+    desmarcar,
+    expandir_flags,
+    marcar,
+    mascara_flags,
+)
+
+
+def test_bits_seguem_a_ordem_de_flags():
+    assert list(POSICOES) == list(FLAGS)
+    assert [BITS[nome] for nome in FLAGS] == [1 << i for i in range(len(FLAGS))]
+    # a coluna é uint8: no máximo 8 flags
+    assert len(FLAGS) <= 8
+
+
+def test_marcar_liga_o_bit_da_flag():
+    df = pd.DataFrame({"x": range(3)})
+    for nome in FLAGS:
+        marcar(df, nome, [True, False, np.nan])
+    assert df[COLUNA_FLAGS].dtype == np.uint8
+    assert df[COLUNA_FLAGS].tolist() == [sum(BITS.values()), 0, 0]
+
+
+def test_mascara_e_contagem_por_flag():
+    nomes = list(FLAGS)
+    df = pd.DataFrame({"x": range(len(nomes) + 1)})
+    # linha i marcada só com a i-ésima flag; a última sem flag
+    for i, nome in enumerate(nomes):
+        marcar(df, nome, df["x"] == i)
+    for coluna in REQUER_COLUNA.values():
+        df[coluna] = 0
+    for i, nome in enumerate(nomes):
+        assert np.flatnonzero(mascara_flags(df, [nome])).tolist() == [i]
+    assert mascara_flags(df).tolist() == [nome not in INFORMATIVAS for nome in nomes] + [False]
+    assert not mascara_flags(df, nomes[:2], todas=True).any()
+    assert contar_flags(df) == {**{nome: 1 for nome in nomes}, "qualquer": len(nomes) - len(INFORMATIVAS)}
+
+
+def test_sem_correspondencia_e_informativa():
+    df = pd.DataFrame({"x": [0, 1, 2]})
+    marcar(df, "flag_sem_correspondencia_contrato", [True, True, False])
+    marcar(df, "flag_valor_divergente", [False, True, False])
+    # fora de "qualquer" e das divergências, mas ainda filtrável pelo nome
+    assert mascara_flags(df).tolist() == [False, True, False]
+    assert contar_flags(df)["qualquer"] == 1
+    assert contar_flags(df)["flag_sem_correspondencia_contrato"] == 2
+    assert mascara_flags(df, ["flag_sem_correspondencia_contrato"]).tolist() == [True, True, False]
+
+
+def test_flags_que_dependem_de_coluna_so_sao_contadas_com_ela():
+    df = pd.DataFrame({"x": [0, 1]})
+    marcar(df, "flag_valor_divergente", [True, False])
+    contagem = contar_flags(df)
+    assert set(contagem) == set(FLAGS) - set(REQUER_COLUNA) | {"qualquer"}
+
+
+def test_expandir_flags_no_lugar_da_coluna():
+    df = pd.DataFrame({"a": [1, 2], "b": [3, 4]})
+    marcar(df, "flag_descricao_duplicada", [False, True])
+    df = df[["a", COLUNA_FLAGS, "b"]]
+    expandido = expandir_flags(df)
+    avaliadas = [n for n in FLAGS if n not in REQUER_COLUNA]
+    assert list(expandido.columns) == ["a", *avaliadas, "b"]
+    assert expandido["flag_descricao_duplicada"].astype(str).tolist() == ["Não", "Sim"]
+    assert expandir_flags(df, rotulos=None)["flag_descricao_duplicada"].tolist() == [False, True]
+
+
+def test_desmarcar_preserva_as_outras_flags():
+    df = pd.DataFrame({"x": [0, 1]})
+    marcar(df, "flag_valor_divergente", [True, True])
+    marcar(df, "flag_cobranca_repetida_historico", [True, False])
+    desmarcar(df, "flag_cobranca_repetida_historico")
+    assert df[COLUNA_FLAGS].tolist() == [BITS["flag_valor_divergente"]] * 2
+    assert df[COLUNA_FLAGS].dtype == np.uint8
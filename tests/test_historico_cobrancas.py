@@ -0,0 +1,81 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+import historico_cobrancas
+from historico_cobrancas import COLUNA_BOLETIM_DUPLICADO, COLUNA_DUPLICADO_EM, HistoricoCobrancas, competencia
+
+
+def boletim(**mudancas) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "descricao": ["DIÁRIA DE OPERADOR TÉCNICO", "DIÁRIA DE SUPERVISOR", "MOBILIZAÇÃO"],
+        "descricao_completa": ["", "", ""],
+        "unidade": ["DIÁRIA", "DIÁRIA", "EVENTO"],
+        "total_cobrado": [16720.0, 9975.0, 1850.0],
+    })
+    for coluna, valores in mudancas.items():
+        df[coluna] = valores
+    return df
+
+
+@pytest.fixture
+def historico(tmp_path):
+    return HistoricoCobrancas(tmp_path / "historico.sqlite3")
+
+
+def registrar_em(monkeypatch, historico, df, id_boletim, periodo, quando: dt.datetime):
+    monkeypatch.setattr(historico_cobrancas.time, "time", lambda: quando.timestamp())
+    historico.registrar(df, id_boletim, periodo)
+    monkeypatch.undo()
+
+
+def test_acerta_outro_boletim_com_texto_normalizado(historico):
+    historico.registrar(boletim(), "BM-01", "2024-03")
+    novo = boletim(descricao=["diaria de operador tecnico", "Diária de supervisor", "MOBILIZAÇÃO"])
+    novo["total_cobrado"] = [16720.0, 9975.0, 1900.0]  # último com valor diferente
+    resultado = historico.verificar(novo, "BM-02", "2024-03")
+    assert resultado[COLUNA_BOLETIM_DUPLICADO].tolist()[:2] == ["BM-01", "BM-01"]
+    assert pd.isna(resultado[COLUNA_BOLETIM_DUPLICADO].iloc[2])
+    assert resultado.index.equals(novo.index)
+
+
+def test_nao_acerta_o_proprio_boletim_nem_outra_competencia(historico):
+    historico.registrar(boletim(), "BM-01", "2024-03")
+    assert historico.verificar(boletim(), "BM-01", "2024-03")[COLUNA_BOLETIM_DUPLICADO].isna().all()
+    assert historico.verificar(boletim(), "BM-02", "2024-04")[COLUNA_BOLETIM_DUPLICADO].isna().all()
+
+
+def test_informa_o_boletim_mais_antigo(monkeypatch, historico):
+    # gravados fora de ordem: o mais recente primeiro
+    registrar_em(monkeypatch, historico, boletim(), "BM-RECENTE", "2024-03", dt.datetime(2024, 5, 2))
+    registrar_em(monkeypatch, historico, boletim(), "BM-ANTIGO", "2024-03", dt.datetime(2024, 4, 1))
+    resultado = historico.verificar(boletim(), "BM-ATUAL", "2024-03")
+    assert resultado[COLUNA_BOLETIM_DUPLICADO].tolist() == ["BM-ANTIGO"] * 3
+    assert resultado[COLUNA_DUPLICADO_EM].tolist() == ["2024-04-01"] * 3
+
+
+def test_registrar_de_novo_substitui_o_boletim(historico):
+    assert historico.registrar(boletim(), "BM-01", "2024-03") == 3
+    assert historico.registrar(boletim().iloc[:1], "BM-01", "2024-03") == 1
+    assert historico.estatisticas()["linhas"] == 1
+    resultado = historico.verificar(boletim(), "BM-02", "2024-03")
+    assert resultado[COLUNA_BOLETIM_DUPLICADO].notna().tolist() == [True, False, False]
+
+
+def test_linhas_sem_descricao_ou_valor_nao_entram(historico):
+    df = boletim(total_cobrado=[16720.0, None, 1850.0])
+    df.loc[2, "descricao"] = None
+    assert historico.registrar(df, "BM-01", "2024-03") == 1
+    assert historico.verificar(df, "BM-02", "2024-03")[COLUNA_BOLETIM_DUPLICADO].notna().tolist() == [True, False, False]
+
+
+@pytest.mark.parametrize("valor", ["2024-03", "2024-3", "03/2024", "2024-03-15", dt.date(2024, 3, 31)])
+def test_competencia(valor):
+    assert competencia(valor) == "2024-03"
+
+
+@pytest.mark.parametrize("valor", ["2024-13", "março", ""])
+def test_competencia_invalida(valor):
+    with pytest.raises(ValueError):
+        competencia(valor)
@@ -0,0 +1,40 @@
+import pytest
+
+from ingestao import formatar_intervalos, interpretar_intervalos, normalizar_intervalos
+
+
+@pytest.mark.parametrize("spec, intervalos", [
+    ("1-3, 7, 10-12", [(1, 3), (7, 7), (10, 12)]),
+    (" 2 - 4 ;5", [(2, 4), (5, 5)]),
+    ("", []),
+    ("Todas", []),
+    (None, []),
+])
+def test_interpretar_intervalos(spec, intervalos):
+    assert interpretar_intervalos(spec) == intervalos
+
+
+@pytest.mark.parametrize("spec", ["0-2", "5-3", "a", "1-2-3"])
+def test_intervalo_invalido(spec):
+    with pytest.raises(ValueError):
+        interpretar_intervalos(spec)
+
+
+@pytest.mark.parametrize("intervalos", [[], [(1, 3)], [(1, 3), (7, 7), (10, 12)], [(4, 4)]])
+def test_formatar_e_interpretar_sao_inversas(intervalos):
+    assert interpretar_intervalos(formatar_intervalos(intervalos)) == intervalos
+
+
+def test_normalizar_ordena_funde_e_corta():
+    assert normalizar_intervalos([(7, 9), (1, 3), (2, 5), (6, 6), (20, 30)], 8) == [(1, 8)]
+    assert normalizar_intervalos([(5, 6), (1, 2)], 10) == [(1, 2), (5, 6)]
+    assert normalizar_intervalos([], 4) == [(1, 4)]
+    assert normalizar_intervalos([], 0) == []
+    assert normalizar_intervalos([(5, 6)], 4) == []
+
+
+@pytest.mark.parametrize("spec", ["3, 1-2", "1-3, 2-6, 9", "todas", "8-8, 8, 7-10"])
+def test_normalizar_e_idempotente_e_volta_pelo_texto(spec):
+    normalizados = normalizar_intervalos(interpretar_intervalos(spec), 9)
+    assert normalizar_intervalos(normalizados, 9) == normalizados
+    assert normalizar_intervalos(interpretar_intervalos(formatar_intervalos(normalizados)), 9) == normalizados
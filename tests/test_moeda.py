@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from moeda import converter_moeda_serie, limpar_moeda
+
+
+def esperado(serie: pd.Series) -> np.ndarray:
+    return serie.apply(limpar_moeda).astype("float64").to_numpy()
+
+
+VALORES = [
+    "R$ 1.672,00", "1672.00", "1.337,6", "-12,5", "", "   ", None, "abc", "12", "0,01",
+    "1,234,567.89", "1.234.567,89", "R$ -0,50", "1.", ",5", "12345678901234567890,12",
+]
+
+
+def test_textos_equivalem_a_limpar_moeda():
+    serie = pd.Series(VALORES, dtype=object)
+    np.testing.assert_array_equal(converter_moeda_serie(serie).to_numpy(), esperado(serie))
+
+
+def test_sinal_e_vazios():
+    resultado = converter_moeda_serie(pd.Series(["-12,5", "", None]))
+    assert resultado.iloc[0] == 12.5
+    assert resultado.iloc[1:].isna().all()
+
+
+@pytest.mark.parametrize("dtype", [object, "string", pd.StringDtype("pyarrow")])
+def test_dtypes_de_texto(dtype):
+    serie = pd.Series(VALORES, dtype=dtype)
+    np.testing.assert_array_equal(converter_moeda_serie(serie).to_numpy(), esperado(serie.astype(object)))
+
+
+def test_numericos_e_mistos():
+    numerica = pd.Series([1.5, -2.0, np.nan, np.inf])
+    np.testing.assert_array_equal(converter_moeda_serie(numerica).to_numpy(), esperado(numerica))
+    mista = pd.Series([10, "1.000,5", None, 3.25], dtype=object)
+    np.testing.assert_array_equal(converter_moeda_serie(mista).to_numpy(), esperado(mista))
+
+
+def test_preserva_indice_e_nome():
+    serie = pd.Series(["1,5", "2"], index=[10, 20], name="total_cobrado")
+    resultado = converter_moeda_serie(serie)
+    assert list(resultado.index) == [10, 20]
+    assert resultado.name == "total_cobrado"
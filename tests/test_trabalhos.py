@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from trabalhos import FilaTrabalhos
+
+
+def esperar(fila: FilaTrabalhos, id_trabalho: str, dono: str = "sessao"):
+    limite = time.monotonic() + 10
+    while not fila.obter(id_trabalho, dono).terminado:
+        assert time.monotonic() < limite, "trabalho não terminou"
+        time.sleep(0.01)
+
+
+def submeter(fila: FilaTrabalhos, valor: int) -> str:
+    id_trabalho = fila.submeter([valor], lambda item, avisar: [item], [(f"doc{valor}.pdf", "boletim")], dono="sessao")
+    esperar(fila, id_trabalho)
+    return id_trabalho
+
+
+@pytest.fixture
+def fila(tmp_path):
+    return FilaTrabalhos(tmp_path / "trabalhos", max_simultaneos=1, reter=2)
+
+
+def test_trabalho_nao_coletado_nunca_e_descartado(fila):
+    ids = [submeter(fila, i) for i in range(4)]
+    # acima de `reter`, mas nenhum foi coletado: todos continuam, com resultados e JSON
+    for i, id_trabalho in enumerate(ids):
+        assert [r.valor for r in fila.coletar(id_trabalho, "sessao")] == [[i]]
+    assert {p.stem for p in fila.diretorio.glob("*.json")} >= set(ids)
+
+
+def test_coletados_saem_primeiro(fila):
+    antigo, coletado = submeter(fila, 0), submeter(fila, 1)
+    assert fila.coletar(coletado, "sessao") is not None
+    novo = submeter(fila, 2)
+    assert fila.obter(coletado, "sessao") is None
+    assert not (fila.diretorio / f"{coletado}.json").exists()
+    assert fila.coletar(antigo, "sessao") is not None
+    assert fila.obter(novo, "sessao") is not None
+
+
+def test_coletar_uma_vez_e_so_pelo_dono(fila):
+    id_trabalho = submeter(fila, 7)
+    assert fila.coletar(id_trabalho, "outra") is None
+    assert [r.valor for r in fila.coletar(id_trabalho, "sessao")] == [[7]]
+    assert fila.coletar(id_trabalho, "sessao") is None
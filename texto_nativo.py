@@ -0,0 +1,121 @@
+"""Caminho rápido para PDFs "nascidos digitais" (exportados de ERP, com camada de texto).
+
+Páginas que já possuem texto extraível pelo PyMuPDF não precisam de Document AI nem
+de OCR: as palavras e suas coordenadas bastam para reconstruir linhas e colunas da
+tabela. As linhas são devolvidas no formato `;`-separado aceito por
+`normalizar_linhas_para_dataframe`.
+"""
+from dataclasses import dataclass, field
+from statistics import median
+
+import fitz
+
+# Mínimo de caracteres e palavras úteis para considerar a página como texto nativo
+MIN_CARACTERES = 80
+MIN_PALAVRAS = 15
+# Fração mínima de caracteres "imprimíveis" (evita fontes sem ToUnicode, que geram lixo)
+MIN_FRACAO_LEGIVEL = 0.85
+
+
+@dataclass
+class ClassificacaoPaginas:
+    nativas: list[int] = field(default_factory=list)  # índices 0-based
+    digitalizadas: list[int] = field(default_factory=list)
+
+
+def pagina_tem_texto(pagina: fitz.Page) -> bool:
+    """True se a página tem camada de texto suficiente e legível."""
+    texto = pagina.get_text("text")
+    sem_espacos = "".join(texto.split())
+    if len(sem_espacos) < MIN_CARACTERES:
+        return False
+    legiveis = sum(1 for c in sem_espacos if c.isprintable() and c != "�")
+    if legiveis / len(sem_espacos) < MIN_FRACAO_LEGIVEL:
+        return False
+    return len(pagina.get_text("words")) >= MIN_PALAVRAS
+
+
+def classificar_paginas(doc: fitz.Document) -> ClassificacaoPaginas:
+    classif = ClassificacaoPaginas()
+    for i, pagina in enumerate(doc):
+        (classif.nativas if pagina_tem_texto(pagina) else classif.digitalizadas).append(i)
+    return classif
+
+
+def _agrupar_linhas(palavras: list[tuple]) -> list[list[tuple]]:
+    """Agrupa palavras em linhas visuais pelo centro vertical."""
+    if not palavras:
+        return []
+    altura = median(p[3] - p[1] for p in palavras) or 1.0
+    tolerancia = altura * 0.5
+    ordenadas = sorted(palavras, key=lambda p: ((p[1] + p[3]) / 2, p[0]))
+    linhas, atual, centro_atual = [], [], None
+    for p in ordenadas:
+        centro = (p[1] + p[3]) / 2
+        if centro_atual is not None and abs(centro - centro_atual) > tolerancia:
+            linhas.append(sorted(atual, key=lambda w: w[0]))
+            atual = []
+        atual.append(p)
+        centro_atual = sum((w[1] + w[3]) / 2 for w in atual) / len(atual)
+    linhas.append(sorted(atual, key=lambda w: w[0]))
+    return linhas
+
+
+def _celulas(linha: list[tuple], distancia_min: float) -> list[tuple[float, float, str]]:
+    """Une palavras próximas da mesma linha em células (x0, x1, texto)."""
+    celulas = []
+    x0, x1, textos = linha[0][0], linha[0][2], [linha[0][4]]
+    for p in linha[1:]:
+        if p[0] - x1 > distancia_min:
+            celulas.append((x0, x1, " ".join(textos)))
+            x0, textos = p[0], []
+        textos.append(p[4])
+        x1 = max(x1, p[2])
+    celulas.append((x0, x1, " ".join(textos)))
+    return celulas
+
+
+def _faixas_colunas(linhas_celulas: list[list[tuple[float, float, str]]]) -> list[tuple[float, float]]:
+    """Faixas horizontais ocupadas por texto; os vãos comuns a todas as linhas separam as colunas."""
+    intervalos = sorted((c[0], c[1]) for celulas in linhas_celulas for c in celulas)
+    faixas = []
+    for x0, x1 in intervalos:
+        if faixas and x0 <= faixas[-1][1]:
+            faixas[-1] = (faixas[-1][0], max(faixas[-1][1], x1))
+        else:
+            faixas.append((x0, x1))
+    return faixas
+
+
+def extrair_linhas_pagina(pagina: fitz.Page, min_celulas: int = 3) -> list[str]:
+    """Reconstrói as linhas da tabela da página como strings `;`-separadas, alinhadas por coluna."""
+    palavras = pagina.get_text("words")
+    if not palavras:
+        return []
+    largura_char = median((p[2] - p[0]) / max(len(p[4]), 1) for p in palavras)
+    linhas = [_celulas(l, distancia_min=largura_char * 1.5) for l in _agrupar_linhas(palavras)]
+
+    # só linhas com cara de tabela definem as colunas (títulos e rodapés ficariam sobre várias colunas)
+    tabulares = [c for c in linhas if len(c) >= min_celulas]
+    if not tabulares:
+        return []
+    faixas = _faixas_colunas(tabulares)
+
+    saida = []
+    for celulas in tabulares:
+        valores = [""] * len(faixas)
+        for x0, x1, texto in celulas:
+            meio = (x0 + x1) / 2
+            idx = next((i for i, (f0, f1) in enumerate(faixas) if f0 <= meio <= f1), None)
+            if idx is None:
+                idx = min(range(len(faixas)), key=lambda i: abs((faixas[i][0] + faixas[i][1]) / 2 - meio))
+            valores[idx] = f"{valores[idx]} {texto}".strip()
+        saida.append(";".join(v.replace(";", ",") for v in valores))
+    return saida
+
+
+def extrair_linhas_documento(doc: fitz.Document, paginas: list[int]) -> list[str]:
+    linhas = []
+    for i in paginas:
+        linhas.extend(extrair_linhas_pagina(doc[i]))
+    return linhas
@@ -0,0 +1,272 @@
+"""Fila de trabalhos em segundo plano (ex.: extração de um lote de documentos enviado pela interface).
+
+Um lote submetido recebe um id e roda em threads do processo, fora da thread do script do
+Streamlit. Por isso uma navegação ou um rerun não interrompe nem refaz o trabalho. O
+progresso de cada documento é gravado em JSON a cada mudança. Os resultados ficam em
+memória até serem coletados pela sessão dona do trabalho, e um trabalho não coletado nunca é
+descartado. Trabalhos em andamento quando o servidor parou ficam gravados como "interrompido".
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from executor_lote import ResultadoTarefa, executar_em_lote
+from rastreamento import Execucao, execucao, span
+
+ESTADOS_TERMINAIS = ("concluido", "cancelado", "falhou", "interrompido")
+
+
+class TrabalhoCancelado(Exception):
+    pass
+
+
+@dataclass
+class ProgressoDocumento:
+    nome: str
+    tipo: str
+    estado: str = "pendente"  # pendente | processando | ok | erro | cancelado
+    tabelas: int = 0
+    erro: str = ""
+    avisos: list[str] = field(default_factory=list)
+    segundos: float | None = None
+
+
+@dataclass
+class Trabalho:
+    id: str
+    dono: str
+    descricao: str
+    documentos: list[ProgressoDocumento]
+    estado: str = "na_fila"  # na_fila | em_execucao | concluido | cancelado | falhou | interrompido
+    erro: str = ""
+    criado_em: float = field(default_factory=time.time)
+    iniciado_em: float | None = None
+    concluido_em: float | None = None
+    coletado: bool = False
+    resultados: list[ResultadoTarefa] | None = field(default=None, repr=False)
+    execucao: Execucao | None = field(default=None, repr=False)
+    cancelamento: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def total(self) -> int:
+        return len(self.documentos)
+
+    @property
+    def concluidos(self) -> int:
+        return sum(1 for d in self.documentos if d.estado in ("ok", "erro", "cancelado"))
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in ESTADOS_TERMINAIS
+
+    def para_dict(self) -> dict:
+        """Estado persistido (sem resultados nem rastreamento)."""
+        return {
+            "id": self.id,
+            "dono": self.dono,
+            "descricao": self.descricao,
+            "estado": self.estado,
+            "erro": self.erro,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "concluido_em": self.concluido_em,
+            "coletado": self.coletado,
+            "documentos": [asdict(d) for d in self.documentos],
+        }
+
+
+class FilaTrabalhos:
+    """Trabalhos por id, executados em até `max_simultaneos` threads, com progresso gravado em `diretorio`."""
+
+    def __init__(self, diretorio: str | Path, max_simultaneos: int = 2, reter: int = 50):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.reter = int(reter)
+        self._trabalhos: OrderedDict[str, Trabalho] = OrderedDict()
+        self._lock = threading.Lock()
+        self._lock_gravacao = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_simultaneos)), thread_name_prefix="trabalho")
+        self._marcar_interrompidos()
+
+    # -------------------------
+    # PERSISTÊNCIA
+    # -------------------------
+
+    def _arquivo(self, id_trabalho: str) -> Path:
+        return self.diretorio / f"{id_trabalho}.json"
+
+    def _persistir(self, trabalho: Trabalho):
+        destino = self._arquivo(trabalho.id)
+        tmp = destino.with_name(f".{destino.name}.tmp")
+        # gravações em série: um retrato mais antigo nunca sobrescreve um mais novo
+        with self._lock_gravacao:
+            try:
+                tmp.write_text(json.dumps(trabalho.para_dict(), ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, destino)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+
+    def _marcar_interrompidos(self):
+        """Trabalhos que estavam na fila ou em execução quando o processo anterior terminou."""
+        for caminho in self.diretorio.glob("*.json"):
+            try:
+                dados = json.loads(caminho.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                continue
+            if dados.get("estado") in ("na_fila", "em_execucao"):
+                dados["estado"] = "interrompido"
+                dados["erro"] = "o servidor foi reiniciado durante o processamento"
+                caminho.write_text(json.dumps(dados, ensure_ascii=False), encoding="utf-8")
+
+    def _descartar_antigos(self):
+        """Mantém até `reter` trabalhos, descartando primeiro os já coletados (dos mais antigos aos mais novos).
+
+        Um trabalho ainda não coletado (na fila, em execução ou terminado à espera da sessão dona) nunca é
+        descartado, nem o JSON dele; arquivos de execuções anteriores do servidor (sem resultados em memória)
+        podem ser descartados.
+        """
+        with self._lock:
+            coletados = [t for t in self._trabalhos.values() if t.coletado]
+            for t in coletados[: max(0, len(self._trabalhos) - self.reter)]:
+                del self._trabalhos[t.id]
+            protegidos = {t.id for t in self._trabalhos.values() if not t.coletado}
+        arquivos = sorted(
+            (p for p in self.diretorio.glob("*.json") if p.stem not in protegidos),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for caminho in arquivos[: max(0, len(arquivos) + len(protegidos) - self.reter)]:
+            caminho.unlink(missing_ok=True)
+
+    # -------------------------
+    # SUBMISSÃO E EXECUÇÃO
+    # -------------------------
+
+    def submeter(
+        self,
+        itens: list[Any],
+        funcao: Callable[[Any, Callable[..., None]], list],
+        documentos: list[tuple[str, str]],
+        dono: str,
+        descricao: str = "processar_documentos",
+        max_concorrencia: int = 4,
+    ) -> str:
+        """Enfileira `funcao(item, avisar)` para cada item e devolve o id do trabalho.
+
+        `documentos` traz (nome, tipo) de cada item, na mesma ordem; os avisos de cada documento
+        ficam no progresso do trabalho (nada é escrito na página a partir das threads).
+        """
+        trabalho = Trabalho(
+            id=uuid.uuid4().hex[:12],
+            dono=dono,
+            descricao=descricao,
+            documentos=[ProgressoDocumento(nome, tipo) for nome, tipo in documentos],
+        )
+        with self._lock:
+            self._trabalhos[trabalho.id] = trabalho
+        self._persistir(trabalho)
+        self._descartar_antigos()
+        # roda no contexto de quem submeteu (ex.: sessão do cache compartilhado)
+        contexto = contextvars.copy_context()
+        self._pool.submit(contexto.run, self._executar, trabalho, list(itens), funcao, max_concorrencia)
+        return trabalho.id
+
+    def _executar(self, trabalho: Trabalho, itens: list, funcao: Callable, max_concorrencia: int):
+        if trabalho.cancelamento.is_set():
+            self._finalizar(trabalho, "cancelado")
+            return
+        trabalho.estado, trabalho.iniciado_em = "em_execucao", time.time()
+        self._persistir(trabalho)
+
+        def rodar(entrada):
+            indice, item = entrada
+            doc = trabalho.documentos[indice]
+            if trabalho.cancelamento.is_set():
+                raise TrabalhoCancelado("trabalho cancelado")
+            doc.estado = "processando"
+            self._persistir(trabalho)
+
+            def avisar(mensagem: str, nivel: str = "warning"):
+                doc.avisos.append(mensagem)
+
+            inicio = time.perf_counter()
+            with span("arquivo", documento=doc.nome, tipo=doc.tipo):
+                try:
+                    return funcao(item, avisar)
+                finally:
+                    doc.segundos = round(time.perf_counter() - inicio, 3)
+
+        def ao_concluir(resultado: ResultadoTarefa, concluidos: int, total: int):
+            doc = trabalho.documentos[resultado.indice]
+            if isinstance(resultado.erro, TrabalhoCancelado):
+                doc.estado = "cancelado"
+            elif resultado.ok:
+                doc.estado, doc.tabelas = "ok", len(resultado.valor or [])
+            else:
+                doc.estado, doc.erro = "erro", f"{type(resultado.erro).__name__}: {resultado.erro}"
+            self._persistir(trabalho)
+
+        try:
+            with execucao(trabalho.descricao, documentos=len(itens), trabalho=trabalho.id) as ex:
+                trabalho.execucao = ex
+                resultados = executar_em_lote(
+                    list(enumerate(itens)), rodar, max_concorrencia=max_concorrencia, ao_concluir=ao_concluir
+                )
+        except Exception as e:
+            trabalho.erro = f"{type(e).__name__}: {e}"
+            self._finalizar(trabalho, "falhou")
+            return
+        # os itens (que podem segurar os bytes dos PDFs) não ficam presos aos resultados
+        for resultado in resultados:
+            resultado.item = resultado.indice
+        trabalho.resultados = resultados
+        self._finalizar(trabalho, "cancelado" if trabalho.cancelamento.is_set() else "concluido")
+
+    def _finalizar(self, trabalho: Trabalho, estado: str):
+        if estado == "cancelado":
+            for doc in trabalho.documentos:
+                if doc.estado == "pendente":
+                    doc.estado = "cancelado"
+        trabalho.estado, trabalho.concluido_em = estado, time.time()
+        self._persistir(trabalho)
+
+    # -------------------------
+    # CONSULTA
+    # -------------------------
+
+    def obter(self, id_trabalho: str, dono: str) -> Trabalho | None:
+        """Trabalho em memória, só para o próprio dono."""
+        with self._lock:
+            trabalho = self._trabalhos.get(id_trabalho)
+        return trabalho if trabalho is not None and trabalho.dono == dono else None
+
+    def cancelar(self, id_trabalho: str, dono: str) -> bool:
+        """Documentos ainda não iniciados são pulados; os que já estão em processamento terminam."""
+        trabalho = self.obter(id_trabalho, dono)
+        if trabalho is None or trabalho.terminado:
+            return False
+        trabalho.cancelamento.set()
+        return True
+
+    def coletar(self, id_trabalho: str, dono: str) -> list[ResultadoTarefa] | None:
+        """Resultados de um trabalho terminado (uma única vez); a memória deles é liberada."""
+        trabalho = self.obter(id_trabalho, dono)
+        if trabalho is None or not trabalho.terminado or trabalho.coletado:
+            return None
+        resultados, trabalho.resultados = trabalho.resultados or [], None
+        trabalho.coletado = True
+        self._persistir(trabalho)
+        return resultados
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            estados = [t.estado for t in self._trabalhos.values()]
+        return {estado: estados.count(estado) for estado in ("na_fila", "em_execucao", *ESTADOS_TERMINAIS)}